@@ -1,25 +1,18 @@
 """Flow adapter for Meeting Prep CrewAI agent."""
 
-import sys
+import os
+import time
 import asyncio
-from pathlib import Path
 from datetime import date
-from dotenv import load_dotenv, find_dotenv
 
-# Load environment variables
-load_dotenv(find_dotenv())
-
-# Add the meeting_prep src to path
-current_dir = Path(__file__).parent
-src_dir = current_dir / "src"
-if str(src_dir) not in sys.path:
-    sys.path.append(str(src_dir))
-
-from meeting_prep.crew import MeetingPrepCrew
-from meeting_prep.schemas import MeetingBriefing
+from backend.app.agents.meeting_prep.src.meeting_prep.crew import crew_factory
+from backend.app.agents.meeting_prep.src.meeting_prep.schemas import MeetingBriefing
 from backend.app.core.utils import save_markdown_report, convert_to_html
+from backend.app.core.events import publish
+from backend.app.core.metrics import instrument_flow
 
 
+@instrument_flow("meeting_prep")
 async def run_meeting_prep(topic: str) -> str:
     """
     Run the Meeting Prep CrewAI workflow.
@@ -30,7 +23,7 @@ async def run_meeting_prep(topic: str) -> str:
     Returns:
         Markdown-formatted meeting briefing
     """
-    print(f"\n=== MEETING PREP: {topic} ===\n")
+    publish("flow_started", f"\n=== MEETING PREP: {topic} ===\n", flow="meeting_prep", topic=topic)
     
     # Dynamic date injection
     current_year = date.today().year
@@ -42,27 +35,35 @@ async def run_meeting_prep(topic: str) -> str:
     }
 
     from backend.app.core.config import crew_llm, budget_crew_llm
-    
-    current_llm = crew_llm
-    
+    from backend.app.core.resilience import RetryPolicy, call_with_resilience, model_key
+    from backend.app.core.metrics import current_run, record_stage
+
+    async def kickoff(llm):
+        crew_instance = crew_factory.crew(llm)
+        if (run := current_run()) is not None:
+            run.mark()  # Task latencies are measured from here
+        started = time.perf_counter()
+        result = await crew_instance.kickoff_async(inputs=inputs)
+
+        usage = getattr(result, "token_usage", None)
+        record_stage(
+            "crew",
+            time.perf_counter() - started,
+            model=model_key(llm),
+            input_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            output_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            cached_input_tokens=getattr(usage, "cached_prompt_tokens", 0) or 0,
+        )
+        return result
+
     try:
-        retries = 3
-        delay = 5
-        for i in range(retries):
-            try:
-                crew_instance = MeetingPrepCrew(llm=current_llm).crew()
-                result = await crew_instance.kickoff_async(inputs=inputs)
-                break
-            except Exception as e:
-                error_msg = str(e)
-                # Check for rate limit or resource exhaustion
-                if ("429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg) and i < retries - 1:
-                    wait_time = delay * (i + 1)
-                    print(f"--- CrewAI Rate Limit hit (429). Switching to budget model and retrying in {wait_time}s... ---")
-                    current_llm = budget_crew_llm  # Switch to budget model for retry
-                    await asyncio.sleep(wait_time)
-                    continue
-                raise e
+        # Whole crew is one unit: retried with backoff, falling back to the budget LLM on 429s.
+        # kickoff_async runs the crew in a thread that a timeout cannot stop, so a timed-out
+        # crew is not retried (a second crew would run, and spend, beside it)
+        result = await call_with_resilience(
+            kickoff, [crew_llm, budget_crew_llm], "Meeting Prep Crew",
+            RetryPolicy(timeout=float(os.getenv("CREW_TIMEOUT", 600)), retry_timeouts=False),
+        )
         
         # With output_pydantic, result.pydantic gives us the structured data
         if hasattr(result, 'pydantic') and result.pydantic:
@@ -72,15 +73,21 @@ async def run_meeting_prep(topic: str) -> str:
             # Fallback: use raw output if pydantic parsing failed
             clean_output = str(result)
         
-        print("\n=== MEETING PREP COMPLETE ===\n")
+        publish("flow_completed", "\n=== MEETING PREP COMPLETE ===\n", flow="meeting_prep")
         return clean_output
 
         
     except Exception as e:
-        print(f"Error in Meeting Prep Flow: {e}")
+        publish("flow_failed", f"Error in Meeting Prep Flow: {e}", flow="meeting_prep", error=str(e))
         raise
 
 
+def warm_up():
+    """Build the crew templates for the primary and fallback LLMs."""
+    from backend.app.core.config import crew_llm, budget_crew_llm
+    crew_factory.warm([crew_llm, budget_crew_llm])
+
+
 if __name__ == "__main__":
     import dotenv
     dotenv.load_dotenv()
@@ -1,8 +1,13 @@
+import threading
+from typing import Dict, Sequence
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai_tools import TavilySearchTool
-from meeting_prep.schemas import MeetingBriefing
+from .schemas import MeetingBriefing
 from backend.app.core.config import crew_llm
+from backend.app.core.events import on_crew_task_complete
+from backend.app.core.search import tavily
+from backend.app.core.resilience import model_key
 
 @CrewBase
 class MeetingPrepCrew():
@@ -14,12 +19,18 @@ class MeetingPrepCrew():
     def __init__(self, llm=None):
         self.llm = llm or crew_llm
 
+    def _search_tool(self) -> TavilySearchTool:
+        """Tavily tool backed by the shared, cached client (honours TAVILY_BASE_URL)."""
+        tool = TavilySearchTool()
+        tool.client = tavily
+        return tool
+
     @agent
     def lead_researcher(self) -> Agent:
         return Agent(
             config=self.agents_config['lead_researcher'],
             verbose=True,
-            tools=[TavilySearchTool()],
+            tools=[self._search_tool()],
             llm=self.llm
         )
 
@@ -66,4 +77,42 @@ class MeetingPrepCrew():
             process=Process.sequential,
             verbose=True,
             memory=False, # DISABLED for Render Free Tier (saves RAM)
+            task_callback=on_crew_task_complete,  # Progress events for streaming clients
         )
+
+
+class CrewFactory:
+    """
+    Builds the crew once per LLM and hands out copies.
+
+    Building a MeetingPrepCrew parses the YAML configs and instantiates the
+    agents, tasks, search tool and Crew. That template is cached per model;
+    each kickoff gets `Crew.copy()` (the same per-run cloning CrewAI's
+    kickoff_for_each uses), so task outputs and agent executors are never
+    shared between concurrent runs while the config, tools and LLM clients are.
+    """
+
+    def __init__(self):
+        self._templates: Dict[str, Crew] = {}
+        self._lock = threading.Lock()
+
+    def template(self, llm=None) -> Crew:
+        llm = llm or crew_llm
+        key = model_key(llm)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is None:
+                template = self._templates[key] = MeetingPrepCrew(llm=llm).crew()
+        return template
+
+    def crew(self, llm=None) -> Crew:
+        """Fresh crew for one kickoff."""
+        return self.template(llm).copy()
+
+    def warm(self, llms: Sequence):
+        """Build templates ahead of the first request (e.g. at startup)."""
+        for llm in llms:
+            self.template(llm)
+
+
+crew_factory = CrewFactory()
@@ -0,0 +1,233 @@
+"""
+Token-budget compaction of the research data given to the writer.
+
+The writer's input is the fact table (facts.py): one "- fact [n] (date)"
+line per fact under a header per search, or, above the condense threshold,
+the condenser's themed notes. Its size still follows the number of searches
+and facts, so when it is over the token budget it is fitted before the
+writer runs:
+
+1. Deduplicate: FactTable already drops repeated sentences and repeated
+   (value, source) pairs; here a fact is only dropped when it cites the
+   same source with the same figures (dates and years aside) and mostly
+   the same words as a kept one, e.g. a statistic both analysts reworded
+   slightly
+2. Rank: facts with statistics rank first, then facts with other numbers
+   or dates; uncited lines (only in condenser notes) rank last; earlier
+   facts (analysts list the most important first) break ties
+3. Allocate: each search gets a share of the budget proportional to its
+   size; what a small search does not use goes to the larger ones
+4. Select: each search keeps its best facts that fit, in their original
+   order. Fact lines are kept or dropped whole; a multi-sentence note line
+   that does not fit is cut to its most informative sentences
+5. Headers in the notes stay only if something under them does
+
+The flow lists only the sources the compacted data still cites, so the
+source list shrinks with the facts. Its size before compaction is
+reserved outside the findings budget, so every kept citation keeps its
+title. Tokens are counted with tiktoken when it is installed and its
+encoding is available, otherwise estimated from characters.
+
+Configuration (env):
+    RESEARCH_WRITER_BUDGET    Tokens of research data for the writer (default: 6000)
+    RESEARCH_WRITER_BUDGETS   Per-model budgets, e.g. '{"meta-llama/llama-3.3-70b-instruct": 4000}'
+    RESEARCH_TOKENIZER        tiktoken encoding used for counting (default: cl100k_base)
+"""
+
+import functools
+import json
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+from backend.app.core.sources import CHARS_PER_TOKEN
+
+WRITER_BUDGET = int(os.getenv("RESEARCH_WRITER_BUDGET") or 6000)
+WRITER_BUDGETS: Dict[str, int] = {k: int(v) for k, v in json.loads(os.getenv("RESEARCH_WRITER_BUDGETS") or "{}").items()}
+TOKENIZER = os.getenv("RESEARCH_TOKENIZER") or "cl100k_base"
+
+# Shortest remainder worth cutting a line down to
+MIN_TRUNCATE_TOKENS = 16
+
+CITATION = re.compile(r"\[(\d+)\]")
+FACT_LINE = re.compile(r"^\s*-\s.*\[\d+\]")
+STATISTIC = re.compile(r"\d+(?:[.,]\d+)?\s*(?:%|percent|x\b|[kmb]n?\b|million|billion|€|\$)|[$€£]\s?\d", re.IGNORECASE)
+NUMBER = re.compile(r"\d")
+YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+HEADER = re.compile(r"^\s*(?:#{1,6}\s|\*\*[^*]+\*\*:?\s*$|[A-Z][^.!?]{0,60}:\s*$)")
+SENTENCE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\[(])")
+# FactTable's "(date)" after the citation
+DATE_SUFFIX = re.compile(r"(\[\d+\])\s*\([^()]*\)\s*$")
+FIGURE = re.compile(r"\d+(?:[.,]\d+)?")
+WORD = re.compile(r"[a-z]{3,}")
+
+# Share of the shorter fact's words the other must contain to be a duplicate
+DUPLICATE_OVERLAP = 0.6
+
+
+def writer_budget(model: str) -> int:
+    return WRITER_BUDGETS.get(model, WRITER_BUDGET)
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER)
+    except Exception as e:
+        # Not installed, or the encoding file cannot be downloaded (offline)
+        print(f"[compaction] tiktoken unavailable ({type(e).__name__}), estimating tokens from characters")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if (encoding := _encoding()) is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def tokenizer_name() -> str:
+    return TOKENIZER if _encoding() is not None else f"~{CHARS_PER_TOKEN} chars/token"
+
+
+def _rank(line: str, position: int) -> float:
+    score = 0.0
+    score += 3 if STATISTIC.search(line) else (1 if NUMBER.search(line) else 0)
+    score += 2 if CITATION.search(line) else 0
+    score += 1 if YEAR.search(line) else 0
+    return score - position * 0.01
+
+
+def _normalized(line: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"^[\s*\-•\d.)]+", "", line)).strip().lower()
+
+
+class _Seen:
+    """Lines kept so far across all searches, for duplicate checks."""
+
+    def __init__(self):
+        self.lines: set = set()
+        self.facts: List[Tuple[frozenset, frozenset, set]] = []
+
+    def add(self, line: str) -> bool:
+        """Remember `line`; False if it repeats a line already kept."""
+        normalized = _normalized(line)
+        if normalized in self.lines:
+            return False
+        text = DATE_SUFFIX.sub(r"\1", line)
+        citations = frozenset(CITATION.findall(text))
+        figures = frozenset(FIGURE.findall(YEAR.sub("", CITATION.sub("", text))))
+        words = set(WORD.findall(CITATION.sub("", text).lower()))
+        if citations and figures and words:
+            for cited, numbers, other in self.facts:
+                if cited == citations and numbers == figures \
+                        and len(words & other) >= DUPLICATE_OVERLAP * min(len(words), len(other)):
+                    return False
+            self.facts.append((citations, figures, words))
+        self.lines.add(normalized)
+        return True
+
+
+def _truncate(line: str, allowance: int) -> str:
+    """Cut a line to `allowance` tokens, keeping its most informative sentences in order."""
+    sentences = SENTENCE.split(line)
+    ranked = sorted(range(len(sentences)), key=lambda i: -_rank(sentences[i], i))
+    kept, used = set(), 0
+    for i in ranked:
+        cost = count_tokens(sentences[i]) + 1
+        if used + cost <= allowance:
+            kept.add(i)
+            used += cost
+    if kept:
+        return " ".join(sentences[i] for i in sorted(kept))
+    # One long sentence: cut on a word boundary
+    words, out = line.split(), []
+    for word in words:
+        if count_tokens(" ".join(out + [word])) > allowance:
+            break
+        out.append(word)
+    return " ".join(out) + " …" if out else ""
+
+
+def _fit(lines: List[str], allowance: int, seen: _Seen, stats: Dict[str, int]) -> List[str]:
+    """The best lines of one search that fit in `allowance` tokens, in their original order."""
+    candidates = []
+    for position, line in enumerate(lines):
+        if not _normalized(line):
+            continue
+        if not HEADER.match(line) and not seen.add(line):
+            stats["duplicates_dropped"] += 1
+            continue
+        candidates.append((position, line))
+
+    # Headers are cheap structure; they stay if anything under them does
+    body = [(p, l) for p, l in candidates if not HEADER.match(l)]
+    kept: Dict[int, str] = {}
+    used = 0
+    for position, line in sorted(body, key=lambda item: -_rank(item[1], item[0])):
+        cost = count_tokens(line) + 1
+        if used + cost <= allowance:
+            kept[position] = line
+            used += cost
+        elif not FACT_LINE.match(line) and allowance - used >= MIN_TRUNCATE_TOKENS:
+            if cut := _truncate(line, allowance - used - 1):
+                kept[position] = cut
+                used += count_tokens(cut) + 1
+                stats["lines_truncated"] += 1
+        else:
+            stats["facts_dropped"] += 1
+
+    out = []
+    for i, (position, line) in enumerate(candidates):
+        if position in kept:
+            out.append(kept[position])
+        elif HEADER.match(line):
+            following = [p for p, l in candidates[i + 1:] if not HEADER.match(l)]
+            next_header = next((p for p, l in candidates[i + 1:] if HEADER.match(l)), None)
+            if any(p in kept and (next_header is None or p < next_header) for p in following):
+                out.append(line)
+    return out
+
+
+def compact_findings(sections: List[Tuple[str, str]], budget: int) -> Tuple[str, Dict[str, Any]]:
+    """
+    Fit [(header, fact lines or notes), ...] into `budget` tokens.
+
+    Returns the research data (sections joined like the flow always did) and
+    stats with the token counts before and after.
+    """
+    joined = lambda parts: "\n\n---\n\n".join(f"{h}\n{b}" if h else b for h, b in parts)
+    original = joined(sections)
+    stats: Dict[str, Any] = {
+        "tokens_before": count_tokens(original), "budget": budget, "tokenizer": tokenizer_name(),
+        "facts_dropped": 0, "duplicates_dropped": 0, "lines_truncated": 0,
+    }
+    if stats["tokens_before"] <= budget:
+        stats["tokens_after"] = stats["tokens_before"]
+        return original, stats
+
+    # 1. Fixed cost: headers and separators
+    overhead = count_tokens(joined([(h, "") for h, _ in sections]))
+    available = max(0, budget - overhead)
+
+    # 2. Proportional shares; surplus from small sections flows to the larger ones
+    sizes = [count_tokens(body) for _, body in sections]
+    allowances = [0] * len(sections)
+    remaining, remaining_size = available, sum(sizes)
+    for i in sorted(range(len(sections)), key=lambda i: sizes[i]):
+        share = remaining * sizes[i] // remaining_size if remaining_size else 0
+        allowances[i] = min(sizes[i], share)
+        remaining -= allowances[i]
+        remaining_size -= sizes[i]
+
+    # 3. Trim, rank and truncate per section
+    seen = _Seen()
+    compacted = [
+        (header, "\n".join(_fit(body.splitlines(), allowance, seen, stats)))
+        for (header, body), allowance in zip(sections, allowances)
+    ]
+    result = joined(compacted)
+    stats["tokens_after"] = count_tokens(result)
+    return result, stats
@@ -0,0 +1,99 @@
+"""
+Fact table: the Search Analysts' structured findings merged for the writer.
+
+Each analyst returns AnalystFindings (squad.py): facts with their value,
+source title, URL and date. The flow merges them into one table:
+
+1. Each fact's citation number comes from the run's source index (by URL,
+   else the LÄHDE [n] number the analyst quoted); facts whose source is not
+   in the index are dropped, so the writer can only cite retrieved pages
+2. Repeated facts are dropped: the same sentence, or the same value from the
+   same source, found by another search
+3. Each search renders as compact lines, "- fact [n] (date)", so the writer
+   reads the facts without prose, titles or URLs
+
+The writer cites [n] only; the source list at the end of the report is
+rendered here from the index, for the numbers the report actually cites.
+"""
+
+import re
+from typing import Any, List, Optional, Set, Tuple
+
+from backend.app.core.sources import SourceIndex, normalize_url
+
+CITATION = re.compile(r"\[(\d+)\]")
+# A trailing source list the writer added anyway (it is rendered by the flow)
+SOURCES_SECTION = re.compile(r"\n#{0,3}\s*\**(?:sources|references|lähteet)\**:?\s*\n(?:\s*(?:\d+\.|[-*]|\[\d+\]).*\n?)+\s*$",
+                             re.IGNORECASE)
+
+
+def _key(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+class FactTable:
+    """Deduplicated facts of one research run, one section per search."""
+
+    def __init__(self, index: SourceIndex):
+        self.index = index
+        self.searches: List[Tuple[str, List[str]]] = []
+        self._seen: Set[str] = set()
+        self.stats = {"facts": 0, "duplicates": 0, "unsourced": 0}
+
+    def _number(self, fact: Any) -> Optional[int]:
+        if (source := self.index.by_url.get(normalize_url(fact.url or ""))) is not None:
+            return source.number
+        if 1 <= fact.source <= len(self.index.sources):
+            return fact.source
+        return None
+
+    def add(self, query: str, findings: Any) -> List[str]:
+        """Merge one analyst's AnalystFindings; returns the lines added for its search."""
+        lines = []
+        for fact in findings.facts:
+            number = self._number(fact)
+            if number is None:
+                self.stats["unsourced"] += 1
+                continue
+            text = fact.fact.strip().rstrip(".")
+            keys = {_key(text)} | ({f"{number}:{_key(fact.value)}"} if _key(fact.value) else set())
+            if keys & self._seen:
+                self.stats["duplicates"] += 1
+                continue
+            self._seen |= keys
+            if fact.value and _key(fact.value) not in _key(text):
+                text = f"{text} ({fact.value.strip()})"
+            line = f"- {text} [{number}]"
+            if fact.date and _key(fact.date) not in _key(text):
+                line += f" ({fact.date.strip()})"
+            lines.append(line)
+        self.stats["facts"] += len(lines)
+        self.searches.append((query, lines))
+        return lines
+
+    @staticmethod
+    def render(index: int, query: str, lines: List[str]) -> Tuple[str, str]:
+        """(header, body) of one search, as the writer and the compaction stage take it."""
+        return f"SEARCH {index}: {query}\nFACTS:", "\n".join(lines) or "(no facts found)"
+
+    def sections(self) -> List[Tuple[str, str]]:
+        return [self.render(i, query, lines) for i, (query, lines) in enumerate(self.searches, 1)]
+
+    def cited(self, text: str) -> List[int]:
+        """Source numbers cited in `text` that exist in the index, in number order."""
+        return sorted({int(n) for n in CITATION.findall(text) if 1 <= int(n) <= len(self.index.sources)})
+
+    def source_titles(self, numbers: List[int]) -> str:
+        """Source list for the writer: number and title only."""
+        return "\n".join(f"[{n}] {self.index.sources[n - 1].title}" for n in numbers)
+
+    def source_list(self, numbers: List[int]) -> str:
+        """Numbered source list for the end of the report."""
+        return "\n".join(f"{n}. {self.index.sources[n - 1].title} ({self.index.sources[n - 1].url})" for n in numbers)
+
+    def finish_report(self, report: str) -> str:
+        """Replace any source list the writer wrote with the one rendered from its citations."""
+        report = SOURCES_SECTION.sub("", report.rstrip() + "\n").rstrip()
+        if numbers := self.cited(report):
+            report += f"\n\n## Sources\n{self.source_list(numbers)}"
+        return report
@@ -1,54 +1,159 @@
 import asyncio
+import os
+import time
 from datetime import date
 from agents import Runner
-from backend.app.agents.research.squad import planner_agent, search_agent, writer_agent
+from backend.app.agents.research.squad import (
+    planner_agent, search_agent, condenser_agent, writer_agent, RESEARCH_SEARCHES
+)
+from backend.app.agents.research.compaction import compact_findings, count_tokens, writer_budget
+from backend.app.agents.research.facts import FactTable
 from backend.app.core.utils import save_markdown_report, convert_to_html, agent_run_with_retry
+from backend.app.core.events import publish
+from backend.app.core.metrics import instrument_flow, record_stage, record_stats, SOURCE_TOKENS_SAVED, COMPACTION_TOKENS_SAVED
+from backend.app.core.resilience import model_key
+from backend.app.core.sources import collect_sources, current_index
 
-async def run_deep_research(topic: str):
-    print(f"\n=== TUTKIMUS: {topic} ===\n")
+# Above this many searches, findings are condensed incrementally instead of
+# being concatenated, so the writer prompt stays bounded whatever the fan-out
+CONDENSE_THRESHOLD = int(os.getenv("RESEARCH_CONDENSE_THRESHOLD", 3))
+# Findings merged per condenser call and the word budget of the notes
+CONDENSE_BATCH = int(os.getenv("RESEARCH_CONDENSE_BATCH", 3))
+NOTES_WORDS = int(os.getenv("RESEARCH_NOTES_WORDS", 800))
+
+async def condense_findings(topic: str, findings: asyncio.Queue, total: int) -> str:
+    """
+    Reduce step: fold findings into running notes as searches complete.
+
+    Each condenser call merges whatever findings arrived while the previous
+    call was running (up to CONDENSE_BATCH), so reducing overlaps with the
+    searches still in flight. Failed searches arrive as None.
+    """
+    notes = ""
+    received = 0
+    while received < total:
+        batch = [await findings.get()]
+        while len(batch) < CONDENSE_BATCH and not findings.empty():
+            batch.append(findings.get_nowait())
+        received += len(batch)
+
+        new_findings = "\n".join(item for item in batch if item is not None)
+        if not new_findings:
+            continue
+        result = await agent_run_with_retry(Runner, condenser_agent, f"""Word limit: {NOTES_WORDS}
+Topic: {topic}
+
+CURRENT NOTES:
+{notes or "(none yet)"}
+
+NEW FINDINGS:
+{new_findings}""")
+        notes = result.final_output
+        publish("condense_completed", stage="condense", merged=received, total=total)
+
+    if not notes:
+        raise RuntimeError("All searches failed")
+    return notes
+
+@instrument_flow("research")
+@collect_sources
+async def run_deep_research(topic: str, searches: int = None):
+    searches = searches or RESEARCH_SEARCHES
+    publish("flow_started", f"\n=== TUTKIMUS: {topic} ===\n", flow="research", topic=topic)
 
     # Step 1: PLANNER creates search strategy
-    print(">> Agent 1: Research Planner creating strategy...")
-    plan_result = await agent_run_with_retry(Runner, planner_agent, f"Topic: {topic}")
+    publish("stage_started", ">> Agent 1: Research Planner creating strategy...", stage="planner")
+    plan_result = await agent_run_with_retry(Runner, planner_agent, f"Searches: {searches}\nTopic: {topic}")
     plan = plan_result.final_output
+    plan_searches = plan.searches[:searches]
+    publish("stage_completed", stage="planner", searches=[item.query for item in plan_searches])
 
-    # Step 2: SEARCH ANALYSTS run in PARALLEL with staggered starts
-    print(">> Agent 2: Search Analysts executing parallel searches...")
-    
-    async def staggered_search(query, index):
-        # Stagger starts to avoid hitting 15 RPM limit instantly
-        if index > 0:
-            await asyncio.sleep(index * 3) 
-        return await agent_run_with_retry(Runner, search_agent, f"Search and analyze: {query}")
+    # Step 2: SEARCH ANALYSTS run in PARALLEL (pacing is handled by the LLM scheduler)
+    publish("stage_started", ">> Agent 2: Search Analysts executing parallel searches...", stage="search")
+    # Analysts return structured facts; they are merged and deduplicated across searches
+    facts = FactTable(current_index())
 
-    search_results = await asyncio.gather(*[
-        staggered_search(item.query, i)
-        for i, item in enumerate(plan.searches)
-    ])
+    async def run_search(query, index):
+        result = await agent_run_with_retry(Runner, search_agent, f"Search and analyze: {query}")
+        publish("search_completed", stage="search", index=index, query=query)
+        return result
 
-    
-    # Combine all analyst findings
-    combined_data = "\n\n---\n\n".join([
-        f"SEARCH {i+1}: {item.query}\nFINDINGS:\n{result.final_output}"
-        for i, (item, result) in enumerate(zip(plan.searches, search_results))
-    ])
+    if len(plan_searches) <= CONDENSE_THRESHOLD:
+        search_results = await asyncio.gather(*[
+            run_search(item.query, i)
+            for i, item in enumerate(plan_searches)
+        ])
+
+        # All analyst facts, one section per search
+        for item, result in zip(plan_searches, search_results):
+            facts.add(item.query, result.final_output)
+        sections = facts.sections()
+    else:
+        # Map-reduce: each search hands its findings to the condenser as soon as it finishes
+        publish("stage_started", f">> Condensing findings from {len(plan_searches)} searches...", stage="condense")
+        findings: asyncio.Queue = asyncio.Queue()
+
+        async def map_search(query, index):
+            try:
+                result = await run_search(query, index)
+                header, body = FactTable.render(index + 1, query, facts.add(query, result.final_output))
+                findings.put_nowait(f"{header}\n{body}\n---")
+            except Exception as e:
+                publish("search_failed", f"Search '{query}' failed: {e}", stage="search", index=index, query=query)
+                findings.put_nowait(None)
+
+        reducer = asyncio.create_task(condense_findings(topic, findings, len(plan_searches)))
+        try:
+            await asyncio.gather(*[map_search(item.query, i) for i, item in enumerate(plan_searches)])
+            sections = [("", str(await reducer))]
+        finally:
+            reducer.cancel()
+
+    record_stats("fact_table", **facts.stats)
+
+    # Fit the findings to the writer's token budget; the titles of the cited sources are kept whole
+    sources = current_index()
+    writer_model = model_key(writer_agent.model)
+    budget = writer_budget(writer_model)
+    reserved = count_tokens(facts.source_titles(facts.cited("\n".join(body for _, body in sections))))
+    started = time.perf_counter()
+    combined_data, compaction = await asyncio.to_thread(compact_findings, sections, max(0, budget - reserved))
+    record_stage("compaction", time.perf_counter() - started, **compaction)
+    saved = compaction["tokens_before"] - compaction["tokens_after"]
+    COMPACTION_TOKENS_SAVED.inc(saved, model=writer_model)
+    print(f"[compaction] Writer findings {compaction['tokens_before']} -> {compaction['tokens_after']} tokens "
+          f"(budget {budget} for {writer_model}, {compaction['tokenizer']})")
+    if saved:
+        publish("findings_compacted", f">> Findings compacted to {compaction['tokens_after']} tokens",
+                stage="compaction", **compaction)
+    if cited := facts.cited(combined_data):
+        combined_data += f"\n\n---\n\nSOURCES:\n{facts.source_titles(cited)}"
+    stats = sources.stats()
+    record_stats("source_index", **stats)
+    SOURCE_TOKENS_SAVED.inc(stats["tokens_saved"], flow="research")
+    publish(
+        "sources_indexed",
+        f">> {stats['unique_sources']} unique sources from {stats['results']} results "
+        f"(~{stats['tokens_saved']} tokens saved)",
+        stage="sources", **stats,
+    )
 
     # Step 3: WRITER synthesizes into final report
-    print(">> Agent 3: Research Writer synthesizing report...")
+    publish("stage_started", ">> Agent 3: Research Writer synthesizing report...", stage="writer")
     writer_result = await agent_run_with_retry(
         Runner,
         writer_agent, 
-        f"Topic: {topic}\n\nResearch Data:\n{combined_data}"
+        f"Topic: {topic}\n\nResearch Data:\n{combined_data}",
+        stream=True
     )
-    final_report = writer_result.final_output
-
-
+    # Source list rendered from the citations in the report, not generated
+    final_report = facts.finish_report(str(writer_result.final_output))
 
     # Add date header
     today = date.today().strftime("%B %d, %Y")
     final_report = f"# Research Report: {topic}\n*Report generated: {today}*\n\n{final_report}"
 
-    print("\n=== VALMIS ===\n")
+    publish("flow_completed", "\n=== VALMIS ===\n", flow="research")
     
     # Local saving disabled for cloud deployment
     # if md_file := save_markdown_report(final_report, topic):
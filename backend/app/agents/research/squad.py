@@ -1,3 +1,4 @@
+import os
 from typing import List
 from datetime import date
 from pydantic import BaseModel, Field
@@ -11,7 +12,21 @@ class WebSearchItem(BaseModel):
     query: str = Field(description="The optimized search query.")
 
 class WebSearchPlan(BaseModel):
-    searches: List[WebSearchItem] = Field(description="3 optimized web searches.")
+    searches: List[WebSearchItem] = Field(description="Optimized web searches.")
+
+class Fact(BaseModel):
+    fact: str = Field(description="One specific finding in a single sentence.")
+    value: str = Field(description="Its key number, statistic or name (e.g. '40%', '$2.1B'), or empty.")
+    source: int = Field(description="The LÄHDE [n] number of the result it comes from.")
+    source_title: str = Field(description="Title of that result.")
+    url: str = Field(description="URL of that result.")
+    date: str = Field(description="Date the fact or its source refers to (e.g. 'March 2025'), or empty.")
+
+class AnalystFindings(BaseModel):
+    facts: List[Fact] = Field(description="Key facts from the search, most important first.")
+
+# Number of searches the planner fans out to (see flow.py for how findings are reduced)
+RESEARCH_SEARCHES = int(os.getenv("RESEARCH_SEARCHES", 3))
 
 # --- Helper to get current date ---
 def get_current_date_str():
@@ -20,9 +35,10 @@ def get_current_date_str():
 def get_current_year():
     return date.today().year
 
-# --- 3 RESEARCH AGENTS ---
+# --- RESEARCH AGENTS ---
 
 # Agent 1: The Planner (with dynamic date)
+# The search count comes with the topic in the task, so the instructions stay a cacheable static prefix
 def create_planner_agent():
     current_date = get_current_date_str()
     current_year = get_current_year()
@@ -31,7 +47,7 @@ def create_planner_agent():
         instructions=f"""You are a Research Strategist.
 TODAY'S DATE: {current_date}. Always search for CURRENT information.
 
-Break down the topic into 3 surgical search queries.
+Break down the topic into the requested number of surgical search queries, each covering a different angle.
 Target technical terms, benchmarks, and recent developments from {current_year-1}-{current_year}.
 IMPORTANT: Add "{current_year-1}" or "{current_year}" to queries when searching for current data.""",
         model=default_model,
@@ -47,10 +63,29 @@ search_agent = Agent(
     instructions="""You are a Research Analyst with a web search tool.
 1. Execute the search using web_search tool
 2. Analyze the results
-3. Extract key facts, statistics, and source URLs
-4. Return a structured summary of findings""",
+3. Extract the key facts: statistics, figures, dates, names and findings
+4. Return each fact once, as one sentence, with the result it comes from
+Results are numbered LÄHDE [n]; give that number as the fact's source.
+A result marked as already retrieved was covered by another analyst - use it only if needed.
+Only return facts stated in the results.""",
     tools=[web_search],
     model=default_model,
+    output_type=AnalystFindings,
+)
+
+# Agent 2b: The Condenser (merges findings incrementally when the fan-out is large)
+condenser_agent = Agent(
+    name="Research Condenser",
+    instructions="""You maintain compact research notes for a report.
+You receive the CURRENT NOTES and NEW FINDINGS from one or more searches.
+Return updated notes that:
+1. Merge the new facts, statistics and dates into the existing notes
+2. Remove duplicates and repeated claims (keep the most specific version)
+3. Keep every fact attached to its source number [n] (or title and URL)
+4. Group notes by theme with short headers
+5. Stay within the word limit given - drop the least relevant facts first
+Return only the notes.""",
+    model=default_model,
 )
 
 # Agent 3: The Writer
@@ -63,22 +98,14 @@ STRUCTURE:
 2. Use clear H2/H3 headers for sections
 3. Use numbered citations like [1], [2], [3] for key facts
 
-SOURCE MATERIAL FORMAT (CRITICAL):
-At the end, create a numbered list matching your citations:
-1. [Source Name/Title] - Brief description (URL)
-2. [Source Name/Title] - Brief description (URL)
-
-EXAMPLE:
-"AI adoption increased 40% in 2024 [1]..."
-
-Sources:
-1. McKinsey AI Report - 2024 Global Survey (https://mckinsey.com/...)
-2. Gartner Analysis - Enterprise Trends (https://gartner.com/...)
+CITATIONS (CRITICAL):
+Each fact in the data ends with its source number, e.g. "- AI adoption reached 40% [1] (2024)".
+Cite it with that same number: "AI adoption increased 40% in 2024 [1]..."
+The SOURCES list at the end of the data gives each number's title.
+Do NOT write a sources or references list - it is added to the report automatically.
 
 RULES:
-- Match citation numbers to source numbers
-- Use the article TITLE as source name, not raw URL
-- Keep URLs short if possible (main domain + path)
+- Only use source numbers that appear in the data
 - Only state facts found in the provided data""",
     model=default_model,
 )
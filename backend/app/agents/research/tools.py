@@ -1,24 +1,38 @@
-import os
-from tavily import TavilyClient
 from agents import function_tool
+from backend.app.core.events import publish
+from backend.app.core.sources import current_index
 
-# Tavily Client
-tavily = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+# Async Tavily client (shared, cached, pooled - see core/search.py)
+from backend.app.core.search import async_tavily
 
 @function_tool
-def web_search(query: str) -> str:
+async def web_search(query: str) -> str:
     """ Etsii tietoa netistä Tavilylla (AI-optimoitu haku). """
-    print(f"--- Suoritetaan ammattilais-haku: {query} ---")
+    publish("search_started", f"--- Suoritetaan ammattilais-haku: {query} ---", query=query)
     try:
         # Hakee ja tiivistää sisällön automaattisesti
-        response = tavily.search(query=query, search_depth="advanced", max_results=5)
+        response = await async_tavily.search(query=query, search_depth="advanced", max_results=5)
         
+        index = current_index()
         combined_results = ""
         for i, r in enumerate(response['results'], 1):
-            combined_results += f"TULOS {i}:\nOtsikko: {r['title']}\nLinkki: {r['url']}\nSisältö: {r['content']}\n\n"
+            if index is None:
+                combined_results += f"TULOS {i}:\nOtsikko: {r['title']}\nLinkki: {r['url']}\nSisältö: {r['content']}\n\n"
+                continue
+            # Run-wide source index: stable citation numbers, repeats sent only once
+            source, is_new = index.add(r, query)
+            if is_new:
+                combined_results += f"LÄHDE [{source.number}]:\nOtsikko: {r['title']}\nLinkki: {r['url']}\nSisältö: {r['content']}\n\n"
+            else:
+                combined_results += f"LÄHDE [{source.number}]: {source.title} (sisältö jo haettu aiemmin)\n\n"
         
-        print(f"--- Tavily löysi {len(response['results'])} laadukasta lähdettä ---")
+        publish(
+            "search_results",
+            f"--- Tavily löysi {len(response['results'])} laadukasta lähdettä ---",
+            query=query,
+            sources=[{"title": r["title"], "url": r["url"]} for r in response["results"]],
+        )
         return combined_results
     except Exception as e:
-        print(f"Tavily-virhe: {e}")
+        publish("search_failed", f"Tavily-virhe: {e}", query=query, error=str(e))
         return f"Hakua ei voitu suorittaa: {e}"
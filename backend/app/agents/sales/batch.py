@@ -0,0 +1,82 @@
+"""
+Batch sales drafting: many prospects in one request.
+
+Prospects are drafted with bounded concurrency and each result is yielded
+as soon as its flow finishes, so callers can stream them back as JSONL.
+
+Accepted inputs (see parse_prospects):
+    application/json      [{...}, ...] or {"prospects": [{...}, ...]}
+    application/x-ndjson  one prospect object per line (also .jsonl)
+    text/csv              header row with SalesRequest field names
+
+Configuration (env):
+    BATCH_MAX_ITEMS     Prospects allowed per batch (default: 50; the agent rate limit
+                        may allow fewer, see RateLimiter.max_batch_items)
+    BATCH_CONCURRENCY   Flows running at once per batch (default: 3)
+"""
+
+import asyncio
+import csv
+import io
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 50))
+CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 3))
+
+JSONL_TYPES = ("application/x-ndjson", "application/jsonl", "application/x-jsonlines")
+
+
+def parse_prospects(body: bytes, content_type: str) -> List[Dict[str, Any]]:
+    """Parse a JSON, JSONL or CSV body into a list of prospect dicts."""
+    media_type = (content_type or "application/json").split(";")[0].strip().lower()
+    text = body.decode("utf-8-sig")
+
+    if media_type in ("text/csv", "application/csv"):
+        # Empty cells mean "not provided" so model defaults apply
+        return [
+            {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+            for row in csv.DictReader(io.StringIO(text))
+        ]
+
+    if media_type in JSONL_TYPES:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("prospects")
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of prospects or {\"prospects\": [...]}")
+    return data
+
+
+async def run_sales_batch(prospects: List[Dict[str, Any]], run_flow: Callable[..., Awaitable[Any]],
+                          concurrency: int = CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run `run_flow` (the sales flow) for each prospect, at most `concurrency` at a time.
+
+    Yields one result per prospect in completion order:
+        {"index": i, "prospect_email": ..., "status": "success", "draft": {...}}
+        {"index": i, "prospect_email": ..., "status": "error", "error": "..."}
+    If the consumer stops iterating, unfinished flows are cancelled.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def draft(index: int, prospect: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            line = {"index": index, "prospect_email": prospect.get("prospect_email")}
+            try:
+                line.update(status="success", draft=await run_flow(**prospect))
+            except Exception as e:
+                print(f"Batch item {index} failed: {e}")
+                line.update(status="error", error=str(e))
+            return line
+
+    tasks = [asyncio.create_task(draft(i, p)) for i, p in enumerate(prospects)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -4,8 +4,38 @@ from backend.app.agents.sales.personas import (
     persona_agents, sales_manager, subject_writer, html_formatter, EmailDraft
 )
 from backend.app.core.utils import agent_run_with_retry
+from backend.app.core.events import publish
+from backend.app.core.metrics import instrument_flow
+from backend.app.agents.sales.renderer import render_email_html
+from backend.app.agents.sales.tournament import run_tournament, QUORUM, DRAFT_DEADLINE
+from backend.app.agents.sales.scoring import prescore, best_scored, PRESCORE
+
+PIPELINE_MODES = ("sequential", "parallel", "deterministic")
+
+@instrument_flow("sales")
+async def run_sales_flow(contact_name: str, company_name: str, sender_name: str, product_description: str, prospect_email: str,
+                         pipeline: str = "parallel", quorum: int = None, draft_deadline: float = None,
+                         prescore_mode: str = None):
+    """
+    Run the sales drafting pipeline.
+
+    pipeline:
+        "sequential"    - subject line, then HTML formatter (original order)
+        "parallel"      - subject line and HTML formatter run concurrently
+        "deterministic" - subject line via LLM, HTML rendered locally (one LLM call fewer)
+
+    quorum / draft_deadline (tournament mode, see tournament.py): the manager
+    judges the drafts in once `quorum` personas have finished or `draft_deadline`
+    seconds have passed; stragglers are cancelled and the outcome is returned
+    under "tournament".
+
+    prescore_mode (see scoring.py): "prune" drops drafts that break the persona
+    rules before the manager sees them, "pick" also skips the manager when one
+    draft clearly scores best, "off" sends every draft. Returned under "prescore".
+    """
+    if pipeline not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode: {pipeline}")
 
-async def run_sales_flow(contact_name: str, company_name: str, sender_name: str, product_description: str, prospect_email: str):
     # Build recipient string for AI
     if contact_name and company_name:
         recipient = f"{contact_name} at {company_name}"
@@ -19,7 +49,7 @@ async def run_sales_flow(contact_name: str, company_name: str, sender_name: str,
     else:
         raise ValueError("Must provide either contact_name or company_name")
 
-    print(f"\n>> Myyntiprosessi: {recipient} ({prospect_email})...")
+    publish("flow_started", f"\n>> Myyntiprosessi: {recipient} ({prospect_email})...", flow="sales", recipient=recipient)
     
     query = f"""Write a sales email.
 Product: {product_description}
@@ -27,76 +57,104 @@ Recipient: {recipient}
 Sender: {sender_name}
 GREETING: {greeting_hint}"""
 
-    # Step 1: 3 Personas generate drafts in PARALLEL with staggered starts
-    print(">> Step 1: 3 Personas generating competing drafts...")
+    # Step 1: 3 Personas generate drafts in PARALLEL (pacing is handled by the LLM scheduler)
+    publish("stage_started", ">> Step 1: 3 Personas generating competing drafts...", stage="personas")
     
-    async def staggered_draft(agent, q, index):
-        if index > 0:
-            await asyncio.sleep(index * 3)
-        return await agent_run_with_retry(Runner, agent, q)
+    async def run_draft(agent):
+        result = await agent_run_with_retry(Runner, agent, query)
+        publish("draft_completed", stage="personas", agent=agent.name, draft=result.final_output)
+        return result
 
-    draft_results = await asyncio.gather(*[
-        staggered_draft(agent, query, i) for i, agent in enumerate(persona_agents)
-    ])
+    quorum = quorum or QUORUM
+    draft_deadline = draft_deadline or DRAFT_DEADLINE
+    drafts, tournament = await run_tournament(persona_agents, run_draft, quorum, draft_deadline)
+    publish("stage_completed", stage="personas", **tournament)
+
+    # Step 2a: Local scoring prunes rule-breaking drafts (and may pick a clear winner)
+    drafts, winner, scoring = prescore(drafts, prescore_mode or PRESCORE, sender_name, greeting_hint)
+    if scoring["mode"] != "off":
+        publish("stage_completed", stage="prescore", **scoring)
+
+    # Step 2b: Sales Manager evaluates the remaining drafts and picks the best
+    if winner is None:
+        publish("stage_started", ">> Step 2: Sales Manager evaluating drafts...", stage="manager")
+        drafts_text = "\n\n---\n\n".join([
+            f"DRAFT {i+1} ({agent.name}):\n{result.final_output}"
+            for i, (agent, result) in enumerate(drafts)
+        ])
+        manager_result = await agent_run_with_retry(Runner, sales_manager, f"""Pick the BEST draft and return its number.
 
-    
-    drafts_text = "\n\n---\n\n".join([
-        f"DRAFT {i+1} ({agent.name}):\n{result.final_output}"
-        for i, (agent, result) in enumerate(zip(persona_agents, draft_results))
-    ])
-    
-    # Step 2: Sales Manager evaluates and picks best
-    print(">> Step 2: Sales Manager evaluating drafts...")
-    manager_result = await agent_run_with_retry(Runner, sales_manager, f"""
 Recipient: {recipient}
 Sender: {sender_name}
 
-{drafts_text}
+{drafts_text}""")
+        choice = manager_result.final_output.draft
+        winner = drafts[choice - 1] if 1 <= choice <= len(drafts) else best_scored(drafts, scoring)
+    else:
+        publish("stage_skipped", f">> Step 2: {winner[0].name} picked by local scoring ({scoring['picked']})",
+                stage="manager")
+
+    # The winner's own text: nothing for the manager to add or for us to strip
+    winning_draft = str(winner[1].final_output).strip()
+    publish("stage_completed", stage="manager", draft=winning_draft, agent=winner[0].name)
 
-Pick the BEST draft and return it.""")
-    
-    winning_draft = manager_result.final_output
-    
-    # Clean up: Remove any "Reason:" section if present
-    if "Reason:" in winning_draft:
-        winning_draft = winning_draft.split("Reason:")[0].strip()
-    
     # Step 3: Subject Writer creates subject line
-    print(">> Step 3: Subject Specialist writing subject line...")
-    subject_result = await agent_run_with_retry(Runner, subject_writer, f"""
+    async def write_subject():
+        publish("stage_started", ">> Step 3: Subject Specialist writing subject line...", stage="subject")
+        subject_result = await agent_run_with_retry(Runner, subject_writer, f"""
 Create a subject line for this email:
 
 {winning_draft}
 
 Product: {product_description}
 Company: {company_name}""")
-    
-    subject_line = subject_result.final_output.strip().strip('"').strip("'")
+        
+        subject_line = subject_result.final_output.strip().strip('"').strip("'")
+        publish("stage_completed", stage="subject", subject=subject_line)
+        return subject_line
     
     # Step 4: HTML Formatter converts to professional HTML
-    print(">> Step 4: HTML Formatter styling email...")
-    html_result = await agent_run_with_retry(Runner, html_formatter, f"""
+    async def format_html():
+        publish("stage_started", ">> Step 4: HTML Formatter styling email...", stage="html")
+        if pipeline == "deterministic":
+            # Local renderer with the formatter's inline styles - no LLM call
+            html_body = render_email_html(winning_draft)
+        else:
+            html_result = await agent_run_with_retry(Runner, html_formatter, f"""
 Convert this email to clean HTML:
 
-{winning_draft}""")
-    
-    html_body = html_result.final_output
+{winning_draft}""", stream=True)
+            
+            html_body = html_result.final_output
+            
+            # Clean up any code fences the AI might have added
+            html_body = html_body.replace("```html", "").replace("```", "")
+            html_body = html_body.replace("'''html", "").replace("'''", "")
+            html_body = html_body.replace("``", "").replace("''", "")
+            html_body = html_body.strip()
+        publish("stage_completed", stage="html")
+        return html_body
 
+    # Subject and HTML both depend only on the winning draft
+    if pipeline == "sequential":
+        subject_line = await write_subject()
+        html_body = await format_html()
+    else:
+        subject_line, html_body = await asyncio.gather(write_subject(), format_html())
     
-    # Clean up any code fences the AI might have added
-    html_body = html_body.replace("```html", "").replace("```", "")
-    html_body = html_body.replace("'''html", "").replace("'''", "")
-    html_body = html_body.replace("``", "").replace("''", "")
-    html_body = html_body.strip()
-    
-    print(f">> Valmis: {recipient}")
+    publish("flow_completed", f">> Valmis: {recipient}", flow="sales")
     
     # Return structured EmailDraft
-    return EmailDraft(
+    draft = EmailDraft(
         to_email=prospect_email,
         subject=subject_line,
         html_body=html_body
     ).model_dump()
+    if tournament["quorum"] < len(persona_agents) or tournament["deadline_s"] is not None:
+        draft["tournament"] = tournament
+    if scoring["mode"] != "off":
+        draft["prescore"] = {**scoring, "winner": winner[0].name}
+    return draft
 
 if __name__ == "__main__":
     from backend.app.core.config import setup_environment
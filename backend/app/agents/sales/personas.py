@@ -8,6 +8,9 @@ class EmailDraft(BaseModel):
     subject: str = Field(description="A catchy subject line")
     html_body: str = Field(description="Professional HTML email body")
 
+class DraftChoice(BaseModel):
+    draft: int = Field(description="Number of the winning draft (DRAFT n)")
+
 # --- 3 COMPETING PERSONAS ---
 professional_agent = Agent(
     name="Professional Sales Agent",
@@ -49,11 +52,12 @@ SIGNATURE: Use 'Best regards, {sender_name}'.""",
 # --- MANAGER (Evaluator) ---
 sales_manager = Agent(
     name="Sales Manager",
-    instructions="""You are given 3 email drafts from different writers.
+    instructions="""You are given numbered email drafts from different writers.
 
-TASK: Evaluate all 3 and pick the SINGLE BEST one for the prospect.
-OUTPUT: Return ONLY the winning email text. nothing else. No explanation, no reasoning, no "Reason:" section.""",
-    model=default_model
+TASK: Evaluate them and pick the SINGLE BEST one for the prospect.
+OUTPUT: The number of the winning draft.""",
+    model=default_model,
+    output_type=DraftChoice,
 )
 
 # --- SPECIALIST AGENTS ---
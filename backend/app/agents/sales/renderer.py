@@ -0,0 +1,24 @@
+"""Deterministic plain text/Markdown to email HTML renderer.
+
+Produces the same markup the HTML Formatter agent is instructed to write
+(see personas.py), without an LLM round trip.
+"""
+
+import html
+import re
+import markdown
+
+PARAGRAPH_STYLE = "line-height: 1.6; margin-bottom: 16px; font-family: sans-serif; color: #333;"
+STRONG_STYLE = "color: #000;"
+LIST_STYLE = "line-height: 1.6; margin-bottom: 16px; font-family: sans-serif; color: #333;"
+
+
+def render_email_html(text: str) -> str:
+    """Convert an email draft to clean HTML body content with inline styles."""
+    # Drafts are plain text; escape anything that looks like markup before rendering
+    body = markdown.markdown(html.escape(text.strip(), quote=False), extensions=["nl2br", "sane_lists"])
+
+    body = re.sub(r"<p>", f'<p style="{PARAGRAPH_STYLE}">', body)
+    body = re.sub(r"<strong>", f'<strong style="{STRONG_STYLE}">', body)
+    body = re.sub(r"<(ul|ol)>", lambda m: f'<{m.group(1)} style="{LIST_STYLE}">', body)
+    return body
@@ -0,0 +1,179 @@
+"""
+Deterministic pre-scoring of persona drafts, before the Sales Manager.
+
+Each draft is checked against the rules the personas are given (personas.py):
+    - placeholders such as [Brand Name], {company} or "Insert ..."   -> invalid
+    - framework labels such as "Problem:", "Attention:", "BLUF:"     -> invalid
+    - the persona's word limit (BLUF: under 75 words)                -> invalid
+    - overall length, greeting, "Best regards, <sender>" signature
+      and Flesch reading ease                                         -> score
+
+Invalid drafts are pruned so the manager reads less (if every draft is
+invalid, all are kept and the manager decides). With mode "pick" the best
+draft wins outright, without the manager call, when it leads the runner-up
+by at least SALES_PRESCORE_MARGIN points; a single remaining draft always
+wins outright.
+
+Configuration (env):
+    SALES_PRESCORE          off, prune or pick (default: prune)
+    SALES_PRESCORE_MARGIN   Score lead that makes "pick" skip the manager (default: 15)
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+PRESCORE_MODES = ("off", "prune", "pick")
+PRESCORE = os.getenv("SALES_PRESCORE") or "prune"
+PRESCORE_MARGIN = float(os.getenv("SALES_PRESCORE_MARGIN") or 15)
+
+# Body word limits from the persona instructions
+WORD_LIMITS = {"Busy Executive Agent": 75}
+MIN_WORDS = 30
+MAX_WORDS = 250
+
+PLACEHOLDER = re.compile(
+    r"\[[^\]\n]{2,40}\]"              # [Brand Name], [Link]
+    r"|\{[A-Za-z_ ]{2,30}\}"          # {company}, {sender_name}
+    r"|<(?:insert|your|company|name)[^>\n]{0,30}>"
+    r"|\binsert (?:info|name|link|company|details)\b"
+    r"|\bX{3,}\b",
+    re.IGNORECASE,
+)
+# Section labels of the personas' frameworks (PAS, AIDA, BLUF) left in the email
+LABEL = re.compile(
+    r"^\s*\**(problem|agitation|solution|attention|interest|desire|bluf)\**\s*:",
+    re.IGNORECASE | re.MULTILINE,
+)
+SUBJECT_LINE = re.compile(r"^\s*\**subject\**\s*:", re.IGNORECASE)
+GREETING = re.compile(r"^\s*(dear|hi|hello|to the team)\b", re.IGNORECASE)
+# A sign-off line: "Best," or "Kind regards" alone, not "Best-in-class results..."
+SIGN_OFF = re.compile(r"^\s*(best regards|kind regards|regards|best|sincerely)\s*(?:,|$)", re.IGNORECASE)
+WORD = re.compile(r"[A-Za-zÀ-ÿ0-9'’-]+")
+
+
+@dataclass
+class DraftScore:
+    agent: str
+    score: float = 100.0
+    valid: bool = True
+    words: int = 0
+    reading_ease: float = 0.0
+    issues: List[str] = field(default_factory=list)
+
+    def penalize(self, points: float, issue: str, invalid: bool = False):
+        self.score = max(0.0, self.score - points)
+        self.issues.append(issue)
+        if invalid:
+            self.valid = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"score": round(self.score, 1), "valid": self.valid, "words": self.words,
+                "reading_ease": round(self.reading_ease, 1), "issues": self.issues}
+
+
+def _syllables(word: str) -> int:
+    word = word.lower().strip("'’-")
+    groups = re.findall(r"[aeiouy]+", word)
+    count = len(groups) - (1 if word.endswith("e") and len(groups) > 1 else 0)
+    return max(1, count)
+
+
+def reading_ease(text: str) -> float:
+    """Flesch reading ease (higher is easier; business email is typically 40-70)."""
+    words = WORD.findall(text)
+    if not words:
+        return 0.0
+    sentences = max(1, len(re.findall(r"[.!?]+(?:\s|$)", text)))
+    syllables = sum(_syllables(w) for w in words)
+    return 206.835 - 1.015 * (len(words) / sentences) - 84.6 * (syllables / len(words))
+
+
+def split_email(text: str) -> Tuple[Optional[str], str, str]:
+    """(greeting line, body, sign-off and everything after it)."""
+    lines = [line for line in text.strip().splitlines()]
+    greeting = None
+    while lines and not lines[0].strip():
+        lines.pop(0)
+    if lines and GREETING.match(lines[0]):
+        greeting = lines.pop(0).strip()
+    for i, line in enumerate(lines):
+        if SIGN_OFF.match(line):
+            return greeting, "\n".join(lines[:i]), "\n".join(lines[i:])
+    return greeting, "\n".join(lines), ""
+
+
+def score_draft(agent: str, text: str, sender_name: str = "", greeting_hint: str = "") -> DraftScore:
+    result = DraftScore(agent=agent)
+    greeting, body, signature = split_email(text)
+    result.words = len(WORD.findall(body))
+    result.reading_ease = reading_ease(body)
+
+    # 1. Rule breaks the personas are told never to make
+    if placeholders := sorted(set(m.group(0) for m in PLACEHOLDER.finditer(text))):
+        result.penalize(50, f"placeholders: {', '.join(placeholders[:3])}", invalid=True)
+    if labels := sorted(set(m.group(1).capitalize() for m in LABEL.finditer(text))):
+        result.penalize(50, f"labels: {', '.join(labels)}", invalid=True)
+    limit = WORD_LIMITS.get(agent)
+    if limit and result.words >= limit:
+        result.penalize(40, f"{result.words} words (limit {limit})", invalid=True)
+
+    # 2. Quality signals
+    if SUBJECT_LINE.match(text):
+        result.penalize(10, "subject line in body")
+    if result.words < MIN_WORDS:
+        result.penalize(20, f"only {result.words} words")
+    elif result.words > MAX_WORDS:
+        result.penalize(15, f"{result.words} words")
+    # The hint is "Use 'Dear Alex'" or "Use 'To the team at Sony'"
+    expected = re.search(r"'([^']+)'", greeting_hint)
+    if greeting is None:
+        result.penalize(15, "no greeting")
+    elif expected and not greeting.lower().startswith(expected.group(1).lower()):
+        result.penalize(5, f"greeting is not '{expected.group(1)}'")
+    if not signature:
+        result.penalize(15, "no sign-off")
+    elif sender_name and sender_name.lower() not in signature.lower():
+        result.penalize(10, "sign-off without sender name")
+    if result.reading_ease < 30:
+        result.penalize(15, f"hard to read ({result.reading_ease:.0f})")
+    elif result.reading_ease < 50:
+        result.penalize(5, f"fairly hard to read ({result.reading_ease:.0f})")
+    return result
+
+
+def prescore(drafts: Sequence[Tuple[Any, Any]], mode: str = PRESCORE, sender_name: str = "", greeting_hint: str = "",
+             margin: float = PRESCORE_MARGIN) -> Tuple[List[Tuple[Any, Any]], Optional[Tuple[Any, Any]], Dict[str, Any]]:
+    """
+    Score [(agent, result), ...] drafts.
+
+    Returns (drafts for the manager, outright winner or None, report).
+    """
+    if mode not in PRESCORE_MODES:
+        raise ValueError(f"Unknown prescore mode: {mode}")
+    if mode == "off":
+        return list(drafts), None, {"mode": mode}
+
+    scores = [score_draft(agent.name, str(result.final_output), sender_name, greeting_hint) for agent, result in drafts]
+    kept = [(d, s) for d, s in zip(drafts, scores) if s.valid] or list(zip(drafts, scores))
+    report: Dict[str, Any] = {
+        "mode": mode,
+        "scores": {s.agent: s.to_dict() for s in scores},
+        "pruned": [s.agent for s in scores if s.agent not in {k.agent for _, k in kept}],
+        "picked": None,
+    }
+
+    ranked = sorted(kept, key=lambda item: -item[1].score)
+    winner = None
+    if len(ranked) == 1:
+        winner, report["picked"] = ranked[0][0], "only remaining draft"
+    elif mode == "pick" and ranked[0][1].valid and ranked[0][1].score - ranked[1][1].score >= margin:
+        winner, report["picked"] = ranked[0][0], f"leads by {ranked[0][1].score - ranked[1][1].score:.0f} points"
+    return [d for d, _ in kept], winner, report
+
+
+def best_scored(drafts: Sequence[Tuple[Any, Any]], report: Dict[str, Any]) -> Tuple[Any, Any]:
+    """Highest pre-scored draft (first one if scoring was off)."""
+    scores = report.get("scores") or {}
+    return max(drafts, key=lambda d: scores.get(d[0].name, {}).get("score", 0))
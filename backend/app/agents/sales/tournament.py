@@ -0,0 +1,208 @@
+"""
+Persona tournament: the Sales Manager judges the drafts that arrive in time.
+
+All personas start at once. The tournament stops waiting when `quorum`
+drafts are in, or when `deadline` seconds have passed and at least one
+draft is in; the remaining personas are cancelled. With the defaults
+(quorum = every persona, no deadline) it waits for all drafts like before
+and a failed persona fails the flow.
+
+Each persona's latency is tracked (EWMA; a cancelled straggler counts as
+at least as slow as its wait and its own average). In tournament mode a
+persona whose average is more than SALES_DEMOTE_FACTOR times the median
+persona's is demoted: it sits out for SALES_DEMOTE_COOLDOWN seconds, then
+runs again and is re-judged.
+Demotion never leaves fewer personas than the quorum.
+
+Configuration (env):
+    SALES_QUORUM               Drafts to wait for (default: all personas)
+    SALES_DRAFT_DEADLINE       Seconds before judging whatever has arrived (default: none)
+    SALES_DEMOTE_FACTOR        Slowness vs. the median persona that demotes (default: 2, 0 = never)
+    SALES_DEMOTE_MIN_SAMPLES   Drafts measured before a persona can be demoted (default: 5)
+    SALES_DEMOTE_COOLDOWN      Seconds a demoted persona sits out (default: 300)
+"""
+
+import asyncio
+import os
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from backend.app.core.events import publish
+from backend.app.core.metrics import registry
+
+QUORUM = int(os.getenv("SALES_QUORUM") or 0) or None
+DRAFT_DEADLINE = float(os.getenv("SALES_DRAFT_DEADLINE") or 0) or None
+DEMOTE_FACTOR = float(os.getenv("SALES_DEMOTE_FACTOR") or 2)
+DEMOTE_MIN_SAMPLES = int(os.getenv("SALES_DEMOTE_MIN_SAMPLES") or 5)
+DEMOTE_COOLDOWN = float(os.getenv("SALES_DEMOTE_COOLDOWN") or 300)
+
+EWMA_ALPHA = 0.3
+
+
+@dataclass
+class PersonaStats:
+    samples: int = 0
+    latency: float = 0.0  # EWMA seconds
+    drafts: int = 0
+    cancelled: int = 0
+    failed: int = 0
+    demoted_until: float = 0.0
+
+    def demoted(self, now: float) -> bool:
+        return now < self.demoted_until
+
+
+class PersonaLatency:
+    """Latency per persona, shared by all requests in the process."""
+
+    def __init__(self, factor: float = DEMOTE_FACTOR, min_samples: int = DEMOTE_MIN_SAMPLES,
+                 cooldown: float = DEMOTE_COOLDOWN):
+        self.factor = factor
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.personas: Dict[str, PersonaStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, outcome: str = "draft"):
+        """outcome: "draft", "cancelled" (seconds is a lower bound) or "failed" (no latency sample)."""
+        with self._lock:
+            stats = self.personas.setdefault(name, PersonaStats())
+            if outcome == "failed":
+                stats.failed += 1
+                return
+            if outcome == "cancelled":
+                # Censored: it would have taken at least this long, and at least its usual time
+                stats.cancelled += 1
+                seconds = max(seconds, stats.latency)
+            else:
+                stats.drafts += 1
+            stats.latency = seconds if not stats.samples else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * stats.latency
+            stats.samples += 1
+            self._judge(name, stats)
+
+    def _judge(self, name: str, stats: PersonaStats):
+        measured = [s.latency for s in self.personas.values() if s.samples >= self.min_samples]
+        if not self.factor or stats.samples < self.min_samples or len(measured) < 2:
+            return
+        median = statistics.median(measured)
+        now = time.monotonic()
+        if median and stats.latency > self.factor * median and not stats.demoted(now):
+            stats.demoted_until = now + self.cooldown
+            print(f"[tournament] Demoted {name}: {stats.latency:.1f}s average vs {median:.1f}s median "
+                  f"(sits out {self.cooldown:.0f}s)")
+
+    def lineup(self, agents: Sequence[Any], keep: int) -> Tuple[List[Any], List[Any]]:
+        """(agents to run, demoted agents sitting out), never running fewer than `keep`."""
+        now = time.monotonic()
+        with self._lock:
+            demoted = [a for a in agents if self.personas.get(a.name, PersonaStats()).demoted(now)]
+            # Bring back the least slow demoted personas if too few would run
+            demoted.sort(key=lambda a: self.personas[a.name].latency)
+            while demoted and len(agents) - len(demoted) < keep:
+                demoted.pop(0)
+        return [a for a in agents if a not in demoted], demoted
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    "latency_s": round(s.latency, 3),
+                    "samples": s.samples,
+                    "drafts": s.drafts,
+                    "cancelled": s.cancelled,
+                    "failed": s.failed,
+                    "demoted": s.demoted(now),
+                }
+                for name, s in self.personas.items()
+            }
+
+
+persona_latency = PersonaLatency()
+
+
+@registry.collector
+def _persona_metrics():
+    personas = sorted(persona_latency.snapshot().items())
+    return [
+        ("sales_persona_latency_seconds", "gauge", "Average draft latency per sales persona (EWMA)", ["persona"],
+         [((name, ), s["latency_s"]) for name, s in personas]),
+        ("sales_persona_cancelled_total", "counter", "Persona drafts cancelled as stragglers", ["persona"],
+         [((name, ), s["cancelled"]) for name, s in personas]),
+        ("sales_persona_demoted", "gauge", "1 while a persona is demoted for being slow", ["persona"],
+         [((name, ), int(s["demoted"])) for name, s in personas]),
+    ]
+
+
+async def run_tournament(agents: Sequence[Any], run_draft: Callable[[Any], Awaitable[Any]],
+                         quorum: Optional[int] = None, deadline: Optional[float] = None,
+                         latency: PersonaLatency = persona_latency) -> Tuple[List[Tuple[Any, Any]], Dict[str, Any]]:
+    """
+    Run `run_draft(agent)` for each persona and return ([(agent, result), ...], report).
+
+    Results keep the personas' order. The report says which personas drafted,
+    were cancelled, failed or sat out, and why the tournament stopped.
+    """
+    quorum = min(quorum or len(agents), len(agents))
+    tournament = quorum < len(agents) or deadline is not None
+    lineup, skipped = latency.lineup(agents, quorum) if tournament else (list(agents), [])
+
+    started = time.perf_counter()
+
+    async def timed(agent):
+        result = await run_draft(agent)
+        return result, time.perf_counter() - started
+
+    tasks = {asyncio.create_task(timed(agent)): agent for agent in lineup}
+    pending = set(tasks)
+    drafts: Dict[str, Tuple[Any, Any]] = {}
+    report: Dict[str, Any] = {
+        "quorum": quorum, "deadline_s": deadline, "stopped_by": "all",
+        "drafted": [], "cancelled": [], "failed": [], "demoted": [a.name for a in skipped], "latency_s": {},
+    }
+    try:
+        while pending and len(drafts) < quorum:
+            timeout = None
+            if deadline is not None and drafts:
+                timeout = started + deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                agent = tasks[task]
+                try:
+                    result, seconds = task.result()
+                except Exception as e:
+                    latency.record(agent.name, 0.0, "failed")
+                    if not tournament:
+                        raise
+                    report["failed"].append(agent.name)
+                    publish("draft_failed", f"{agent.name} failed: {e}", stage="personas", agent=agent.name)
+                    continue
+                latency.record(agent.name, seconds)
+                drafts[agent.name] = (agent, result)
+                report["drafted"].append(agent.name)
+                report["latency_s"][agent.name] = round(seconds, 3)
+        if pending:
+            report["stopped_by"] = "quorum" if len(drafts) >= quorum else "deadline"
+    finally:
+        # Stragglers (or everyone, if the flow itself was cancelled or failed)
+        waited = time.perf_counter() - started
+        for task in pending:
+            task.cancel()
+            latency.record(tasks[task].name, waited, "cancelled")
+            report["cancelled"].append(tasks[task].name)
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    if not drafts:
+        raise RuntimeError(f"No persona produced a draft ({', '.join(report['failed']) or 'none ran'} failed)")
+    report["waited_s"] = round(waited, 3)
+    if report["cancelled"]:
+        publish("drafts_cancelled", f">> Judging {len(drafts)} drafts, cancelled: {', '.join(report['cancelled'])}",
+                stage="personas", cancelled=report["cancelled"])
+    return [drafts[a.name] for a in agents if a.name in drafts], report
@@ -1,18 +1,110 @@
-from fastapi import FastAPI, HTTPException, Header, Depends
+from fastapi import FastAPI, HTTPException, Header, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from pydantic import BaseModel, Field, ValidationError
 import os
-from typing import Optional, Annotated
-from backend.app.agents.sales.flow import run_sales_flow
-from backend.app.agents.research.flow import run_deep_research
-from backend.app.agents.meeting_prep.flow import run_meeting_prep
-from backend.app.middleware.rate_limiter import rate_limit_middleware
+import json
+import asyncio
+from typing import Optional, Annotated, Literal, List
+from dotenv import load_dotenv
+
+# Load .env before the app modules below read their settings at import time
+# (the flows, and core/config.py with them, are only imported on first use)
+load_dotenv(override=True)
+
+from backend.app.agents.sales.batch import parse_prospects, run_sales_batch, MAX_ITEMS
+from backend.app.middleware.rate_limiter import rate_limit_middleware, rate_limiter, rate_limit_response
+from backend.app.core.jobs import job_queue
+from backend.app.core.events import sse_stream
+from backend.app.core.report_cache import report_cache
+from backend.app.core.outbox import outbox
+from backend.app.core.lazy import LazyFlow, warm_flows, warm_up
+from backend.app.core.loop_monitor import loop_monitor
 
 app = FastAPI(title="Agent Squad API", version="1.1.0")
 
 # Rate limiting middleware (applied first)
 app.middleware("http")(rate_limit_middleware)
 
+# Flow modules are imported on first use (or warmed with WARM_FLOWS) to keep cold start fast
+run_sales_flow = LazyFlow("backend.app.agents.sales.flow", "run_sales_flow")
+run_deep_research = LazyFlow("backend.app.agents.research.flow", "run_deep_research")
+run_meeting_prep = LazyFlow("backend.app.agents.meeting_prep.flow", "run_meeting_prep", warm="warm_up")
+FLOWS = {"sales": run_sales_flow, "research": run_deep_research, "meeting_prep": run_meeting_prep}
+
+# Report memoization for topic-based flows (see core/report_cache.py)
+REPORT_FLOWS = {"research": run_deep_research, "meeting_prep": run_meeting_prep}
+
+async def run_report(flow: str, topic: str, force_refresh: bool = False):
+    """Run a topic-based flow through the report cache. Returns (result, cached)."""
+    return await report_cache.run(flow, topic, lambda: REPORT_FLOWS[flow](topic), force_refresh)
+
+async def research_report(topic: str, force_refresh: bool = False) -> str:
+    result, _ = await run_report("research", topic, force_refresh)
+    return result
+
+async def meeting_prep_report(topic: str, force_refresh: bool = False) -> str:
+    result, _ = await run_report("meeting_prep", topic, force_refresh)
+    return result
+
+# Cached reports are served without spending the agent rate-limit budget
+REPORT_PATHS = {
+    "/api/research": "research",
+    "/api/research/stream": "research",
+    "/api/research/jobs": "research",
+    "/api/meeting-prep": "meeting_prep",
+    "/api/meeting-prep/stream": "meeting_prep",
+    "/api/meeting-prep/jobs": "meeting_prep",
+}
+
+@rate_limiter.exempt
+async def cached_report_request(request) -> bool:
+    flow = REPORT_PATHS.get(request.url.path)
+    if flow is None or request.method != "POST":
+        return False
+    try:
+        body = json.loads(await request.body())
+    except ValueError:
+        return False
+    if not isinstance(body, dict) or body.get("force_refresh") or not isinstance(body.get("topic"), str):
+        return False
+    return await report_cache.has(flow, body["topic"])
+
+# Batches charge the agent budget in the endpoint, once the batch size is known
+BATCH_PATH = "/api/sales/draft/batch"
+
+@rate_limiter.exempt
+async def batch_request(request) -> bool:
+    return request.url.path == BATCH_PATH
+
+# Background jobs: flow name -> (runner, default concurrency)
+job_queue.register("sales", run_sales_flow, concurrency=2)
+job_queue.register("research", research_report, concurrency=2)
+job_queue.register("meeting_prep", meeting_prep_report, concurrency=1)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    loop_monitor.start()
+    rate_limiter.start_sweeper()
+    await job_queue.start()
+    await outbox.start()
+    # Optional: load flows (and prebuild the meeting prep crew) before the first request
+    app.state.warm_up = None
+    if names := warm_flows(FLOWS):
+        app.state.warm_up = asyncio.create_task(warm_up(FLOWS, names))
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    if app.state.warm_up is not None:
+        app.state.warm_up.cancel()
+        await asyncio.gather(app.state.warm_up, return_exceptions=True)
+    await job_queue.stop()
+    await outbox.stop()
+    await rate_limiter.close()
+    from backend.app.core.search import async_tavily
+    await async_tavily.close()
+    await loop_monitor.stop()
+
 # CORS for frontend - supports both local and production
 allowed_origins = [
     "http://localhost:5173",  # Local development
@@ -56,17 +148,29 @@ class SalesRequest(BaseModel):
     prospect_email: str
     sender_name: str
     product_description: str
+    pipeline: Literal["sequential", "parallel", "deterministic"] = "parallel"
+    # Tournament mode: judge the drafts in after `quorum` personas or `draft_deadline` seconds
+    quorum: Optional[int] = Field(None, ge=1, le=3)
+    draft_deadline: Optional[float] = Field(None, gt=0, le=300)
+    # Local draft scoring before the manager (see agents/sales/scoring.py)
+    prescore_mode: Optional[Literal["off", "prune", "pick"]] = None
 
 class SendRequest(BaseModel):
     to_email: str
     subject: str
     html_body: str
+    idempotency_key: Optional[str] = None
+
+class SendBatchRequest(BaseModel):
+    messages: List[SendRequest]
 
 class ResearchRequest(BaseModel):
     topic: str
+    force_refresh: bool = False
 
 class MeetingPrepRequest(BaseModel):
     topic: str
+    force_refresh: bool = False
 
 class AuthRequest(BaseModel):
     pin: str
@@ -80,7 +184,11 @@ async def sales_endpoint(req: SalesRequest):
             req.company_name,
             req.sender_name,
             req.product_description,
-            req.prospect_email
+            req.prospect_email,
+            pipeline=req.pipeline,
+            quorum=req.quorum,
+            draft_deadline=req.draft_deadline,
+            prescore_mode=req.prescore_mode,
         )
         return {"status": "success", "draft": result}
     except Exception as e:
@@ -88,24 +196,95 @@ async def sales_endpoint(req: SalesRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post(BATCH_PATH, dependencies=[Depends(verify_pin_header)])
+async def sales_batch_endpoint(request: Request):
+    """
+    Draft emails for many prospects in one request.
+
+    Body: JSON list (or {"prospects": [...]}), JSONL or CSV of SalesRequest
+    fields. Results stream back as JSONL in completion order, followed by
+    a summary line.
+    """
+    try:
+        rows = parse_prospects(await request.body(), request.headers.get("content-type", ""))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse batch: {e}")
+    if not rows:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    # A batch costing more than the smallest agent limit would be rejected however long the client waits
+    largest = min(MAX_ITEMS, rate_limiter.max_batch_items() or MAX_ITEMS)
+    if len(rows) > largest:
+        raise HTTPException(status_code=400, detail=f"Batch too large: {len(rows)} prospects (max {largest})")
+
+    # Validate every row before spending any budget
+    prospects, errors = [], []
+    for index, row in enumerate(rows):
+        try:
+            prospects.append(SalesRequest(**row).model_dump())
+        except (ValidationError, TypeError) as e:
+            errors.append({"index": index, "error": str(e)})
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+
+    cost = rate_limiter.batch_cost(len(prospects))
+    allowed, message, remaining = await rate_limiter.hit(request.client.host, "agent", amount=cost)
+    if not allowed:
+        return rate_limit_response(message, "agent")
+
+    async def lines():
+        succeeded = 0
+        async for result in run_sales_batch(prospects, run_sales_flow):
+            succeeded += result["status"] == "success"
+            yield json.dumps(result) + "\n"
+        summary = {"total": len(prospects), "succeeded": succeeded, "failed": len(prospects) - succeeded, "charged": cost}
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={
+        "X-RateLimit-Remaining-15min": str(remaining["per_15min"]),
+        "X-RateLimit-Remaining-Day": str(remaining["per_day"]),
+    })
+
 @app.post("/api/sales/send", dependencies=[Depends(verify_pin_header)])
-async def send_endpoint(req: SendRequest):
+async def send_endpoint(req: SendRequest, idempotency_key: Annotated[Optional[str], Header(alias="Idempotency-Key")] = None):
     try:
-        from backend.app.agents.sales.tools import _send_email_raw
-        result = _send_email_raw(req.to_email, req.subject, req.html_body)
+        result = await outbox.send(req.to_email, req.subject, req.html_body, req.idempotency_key or idempotency_key)
         if result.get("status") == "error":
             raise HTTPException(status_code=400, detail=result.get("message"))
+        if result.get("status") == "queued":
+            # Still in the outbox; poll /api/outbox/{message_id}
+            return JSONResponse(status_code=202, content=result)
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/sales/send/batch", status_code=202, dependencies=[Depends(verify_pin_header)])
+async def send_batch_endpoint(req: SendBatchRequest, idempotency_key: Annotated[Optional[str], Header(alias="Idempotency-Key")] = None):
+    """Queue many emails at once. The dispatcher sends them through Resend's batch API."""
+    message_ids = await outbox.enqueue([m.model_dump() for m in req.messages], idempotency_key)
+    return {"status": "queued", "message_ids": message_ids}
+
+@app.get("/api/outbox/metrics", dependencies=[Depends(verify_pin_header)])
+async def outbox_metrics():
+    return await outbox.metrics()
+
+@app.get("/api/outbox/{message_id}", dependencies=[Depends(verify_pin_header)])
+async def outbox_status(message_id: str):
+    message = await outbox.get(message_id)
+    if message is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return {key: message[key] for key in (
+        "id", "to_email", "subject", "status", "attempts", "provider_id", "error", "created_at", "sent_at"
+    )}
+
 @app.post("/api/research", dependencies=[Depends(verify_pin_header)])
 async def research_endpoint(req: ResearchRequest):
     try:
-        result = await run_deep_research(req.topic)
-        return {"status": "success", "result": result}
+        result, cached = await run_report("research", req.topic, req.force_refresh)
+        return {"status": "success", "result": result, "cached": cached}
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -114,13 +293,90 @@ async def research_endpoint(req: ResearchRequest):
 @app.post("/api/meeting-prep", dependencies=[Depends(verify_pin_header)])
 async def meeting_prep_endpoint(req: MeetingPrepRequest):
     try:
-        result = await run_meeting_prep(req.topic)
-        return {"status": "success", "result": result}
+        result, cached = await run_report("meeting_prep", req.topic, req.force_refresh)
+        return {"status": "success", "result": result, "cached": cached}
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+# Streaming endpoints: Server-Sent Events with per-stage progress and writer tokens
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.post("/api/sales/draft/stream", dependencies=[Depends(verify_pin_header)])
+async def sales_stream_endpoint(req: SalesRequest):
+    return StreamingResponse(
+        sse_stream(lambda: run_sales_flow(**req.model_dump())),
+        media_type="text/event-stream", headers=SSE_HEADERS,
+    )
+
+@app.post("/api/research/stream", dependencies=[Depends(verify_pin_header)])
+async def research_stream_endpoint(req: ResearchRequest):
+    return StreamingResponse(
+        sse_stream(lambda: research_report(req.topic, req.force_refresh)),
+        media_type="text/event-stream", headers=SSE_HEADERS,
+    )
+
+@app.post("/api/meeting-prep/stream", dependencies=[Depends(verify_pin_header)])
+async def meeting_prep_stream_endpoint(req: MeetingPrepRequest):
+    return StreamingResponse(
+        sse_stream(lambda: meeting_prep_report(req.topic, req.force_refresh)),
+        media_type="text/event-stream", headers=SSE_HEADERS,
+    )
+
+# Background job endpoints: submit returns a job id immediately, poll /api/jobs/{id}
+@app.post("/api/sales/draft/jobs", status_code=202, dependencies=[Depends(verify_pin_header)])
+async def sales_job_endpoint(req: SalesRequest):
+    job_id = await job_queue.submit("sales", req.model_dump())
+    return {"status": "queued", "job_id": job_id}
+
+@app.post("/api/research/jobs", status_code=202, dependencies=[Depends(verify_pin_header)])
+async def research_job_endpoint(req: ResearchRequest):
+    job_id = await job_queue.submit("research", req.model_dump())
+    return {"status": "queued", "job_id": job_id}
+
+@app.post("/api/meeting-prep/jobs", status_code=202, dependencies=[Depends(verify_pin_header)])
+async def meeting_prep_job_endpoint(req: MeetingPrepRequest):
+    job_id = await job_queue.submit("meeting_prep", req.model_dump())
+    return {"status": "queued", "job_id": job_id}
+
+@app.get("/api/jobs/metrics", dependencies=[Depends(verify_pin_header)])
+async def job_metrics():
+    return await job_queue.metrics()
+
+@app.get("/api/jobs/{job_id}", dependencies=[Depends(verify_pin_header)])
+async def job_status(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job["id"],
+        "flow": job["flow"],
+        "status": job["status"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+@app.get("/api/cache/stats", dependencies=[Depends(verify_pin_header)])
+async def cache_stats():
+    from backend.app.core.cassette import cassette
+    from backend.app.core.search import search_cache
+    stats = {"search": search_cache.stats(), "reports": report_cache.cache.stats()}
+    if cassette.active:
+        stats["cassette"] = {"mode": cassette.mode, **cassette.stats}
+    return stats
+
+@app.get("/api/debug/loop", dependencies=[Depends(verify_pin_header)])
+async def loop_health(reset: bool = False):
+    """Event-loop lag and recent stalls with the stack that caused them (LOOP_MONITOR=1)."""
+    stats = loop_monitor.snapshot()
+    if reset:
+        loop_monitor.reset()
+    return stats
+
 @app.post("/api/auth/verify")
 async def verify_pin(req: AuthRequest):
     user_pin = os.getenv("APP_PIN", "0000")
@@ -142,6 +398,12 @@ async def is_auth_enabled():
 async def root():
     return {"message": "Smart Outreach Manager API", "version": "1.1"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: stage/flow latency, tokens, cost, retries, rate-limit rejections, event-loop lag."""
+    from backend.app.core.metrics import registry
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint for monitoring."""
@@ -0,0 +1,156 @@
+"""
+TTL + LRU cache with an optional SQLite tier.
+
+Values must be JSON-serializable. The in-memory tier is bounded by
+`max_size` (least recently used entries are evicted first); the optional
+on-disk tier lets entries survive restarts and is consulted on memory misses.
+
+Async callers use `aget`, `aset` and `acontains`: memory hits are served
+inline and SQLite reads and writes run in a worker thread, so the disk tier
+never blocks the event loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, collapse whitespace and drop surrounding punctuation."""
+    return re.sub(r"\s+", " ", text.lower()).strip(" \t\n.,;:!?\"'")
+
+
+def content_key(*parts: Any, **params: Any) -> str:
+    """Stable SHA-256 key for the given parts and keyword parameters."""
+    payload = json.dumps({"parts": parts, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, name: str, ttl: float, max_size: int = 512, db_path: Optional[str] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # key -> (expires_at, value)
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            with self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS cache (name TEXT, key TEXT, value TEXT, expires_at REAL, "
+                    "PRIMARY KEY (name, key))"
+                )
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM cache WHERE name = ? AND key = ?", (self.name, key)
+                ).fetchone()
+                if row and row[1] > now:
+                    value = json.loads(row[0])
+                    self._store_memory(key, value, row[1])
+                    self.counters["disk_hits"] += 1
+                    return value
+
+            self.counters["misses"] += 1
+            return None
+
+    def contains(self, key: str) -> bool:
+        """True if a fresh entry exists, without touching hit/miss counters or LRU order."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return True
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires_at FROM cache WHERE name = ? AND key = ?", (self.name, key)
+                ).fetchone()
+                return bool(row and row[0] > now)
+            return False
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+            if self._db is not None:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO cache (name, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                        (self.name, key, json.dumps(value), expires_at),
+                    )
+
+    def _in_memory(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.time()
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """`get` for async callers: only a memory miss goes to the SQLite tier, off the event loop."""
+        if self._db is None or self._in_memory(key):
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def acontains(self, key: str) -> bool:
+        if self._db is None or self._in_memory(key):
+            return self.contains(key)
+        return await asyncio.to_thread(self.contains, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        if self._db is None:
+            self.set(key, value, ttl)
+        else:
+            await asyncio.to_thread(self.set, key, value, ttl)
+
+    def _store_memory(self, key: str, value: Any, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def purge_expired(self) -> int:
+        """Drop expired entries from both tiers."""
+        now = time.time()
+        with self._lock:
+            expired = [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM cache WHERE name = ? AND expires_at <= ?", (self.name, now))
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "persistent": self._db is not None,
+        }
@@ -0,0 +1,346 @@
+"""
+Record/replay of LLM and search calls ("cassettes") for offline, repeatable runs.
+
+    CASSETTE_MODE=record   Calls go out as usual; every request/response pair is
+                           appended to CASSETTE_PATH (one JSON object per line)
+    CASSETTE_MODE=replay   Calls are answered from the cassette, nothing leaves the
+                           process. A request that changed since recording (e.g.
+                           today's date in a prompt, or citation numbers after
+                           parallel searches finished in another order) gets the
+                           next unused recording of the same agent (model and
+                           system prompt), else of the same endpoint; running out
+                           raises CassetteMiss
+    CASSETTE_MODE=auto     Replay exact matches, call and record everything else
+                           (keeps expensive demo runs cached)
+
+Hooks:
+    - the shared AsyncOpenAI client (core/config.py), i.e. every Agents SDK call
+    - LiteLLM's HTTP sessions, i.e. the CrewAI LLM objects
+    - both Tavily clients in core/search.py (the web_search tool and the
+      CrewAI TavilySearchTool)
+
+Only the method, endpoint and body of a request are stored, never headers,
+so API keys stay out of cassettes (any non-empty key works for replay).
+
+Configuration (env):
+    CASSETTE_MODE     off, record, replay or auto (default: off)
+    CASSETTE_PATH     Cassette file (default: cassettes/agents.jsonl)
+    CASSETTE_TIMING   "original" replays recorded latencies, "zero" answers at once (default: original)
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, AsyncIterator, List, Optional, Tuple
+
+import httpx
+
+from backend.app.core.cache import content_key
+
+MODES = ("off", "record", "replay", "auto")
+TIMINGS = ("original", "zero")
+
+# Rebuilt by httpx for the replayed body
+_DROPPED_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "connection"}
+
+
+class CassetteMiss(Exception):
+    """Replay found no recording for a request."""
+
+
+class Cassette:
+    """One cassette file and the recordings not yet replayed from it."""
+
+    def __init__(self, path: str, mode: str = "off", timing: str = "original"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode} (expected one of {', '.join(MODES)})")
+        if timing not in TIMINGS:
+            raise ValueError(f"Unknown cassette timing: {timing} (expected one of {', '.join(TIMINGS)})")
+        self.path = Path(path)
+        self.mode = mode
+        self.timing = timing
+        self.stats = {"recorded": 0, "replayed": 0, "out_of_order": 0, "missed": 0}
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._by_key: Dict[str, Deque[int]] = defaultdict(deque)
+        self._by_shape: Dict[str, Deque[int]] = defaultdict(deque)
+        self._by_kind: Dict[str, Deque[int]] = defaultdict(deque)
+        self._used: set = set()
+        if self.replaying and self.path.exists():
+            self._load()
+
+    @property
+    def active(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode in ("replay", "auto")
+
+    @property
+    def recording(self) -> bool:
+        return self.mode in ("record", "auto")
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    index = len(self._entries)
+                    self._entries.append(entry)
+                    self._by_key[entry["key"]].append(index)
+                    if entry.get("shape"):
+                        self._by_shape[entry["shape"]].append(index)
+                    self._by_kind[entry["kind"]].append(index)
+        print(f"[cassette] {len(self._entries)} recordings loaded from {self.path} ({self.mode})")
+
+    def _take(self, queue: Deque[int]) -> Optional[Dict[str, Any]]:
+        while queue:
+            index = queue.popleft()
+            if index not in self._used:
+                self._used.add(index)
+                return self._entries[index]
+        return None
+
+    def find(self, kind: str, key: str, shape: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The recording to replay for a request, or None if it should go out."""
+        if not self.replaying:
+            return None
+        with self._lock:
+            entry = self._take(self._by_key[key])
+            if entry is None and self.mode == "replay":
+                entry = (shape and self._take(self._by_shape[shape])) or self._take(self._by_kind[kind])
+                if entry is not None:
+                    self.stats["out_of_order"] += 1
+            if entry is not None:
+                self.stats["replayed"] += 1
+                return entry
+            if self.mode == "replay":
+                self.stats["missed"] += 1
+                raise CassetteMiss(f"No recording left for {kind} in {self.path}")
+        return None
+
+    def record(self, entry: Dict[str, Any]):
+        if not self.recording:
+            return
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+            self.stats["recorded"] += 1
+
+    def delay(self, seconds: float) -> float:
+        return max(0.0, seconds) if self.timing == "original" else 0.0
+
+    # --- Function-level calls (Tavily) ---
+
+    def call(self, kind: str, request: Dict[str, Any], fn: Callable[[], Any]) -> Any:
+        if not self.active:
+            return fn()
+        key = content_key(kind, **request)
+        if (entry := self.find(kind, key)) is not None:
+            time.sleep(self.delay(entry["elapsed"]))
+            return entry["response"]
+        started = time.perf_counter()
+        response = fn()
+        self.record({"kind": kind, "key": key, "request": request, "response": response,
+                     "elapsed": round(time.perf_counter() - started, 4)})
+        return response
+
+    async def acall(self, kind: str, request: Dict[str, Any], fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.active:
+            return await fn()
+        key = content_key(kind, **request)
+        if (entry := self.find(kind, key)) is not None:
+            await asyncio.sleep(self.delay(entry["elapsed"]))
+            return entry["response"]
+        started = time.perf_counter()
+        response = await fn()
+        self.record({"kind": kind, "key": key, "request": request, "response": response,
+                     "elapsed": round(time.perf_counter() - started, 4)})
+        return response
+
+
+# --- HTTP-level calls (OpenAI-compatible endpoints) ---
+
+def _describe(request: httpx.Request) -> Tuple[str, str, Optional[str], Dict[str, Any]]:
+    """(kind, key, shape, stored request) for an outgoing request; base URLs may differ between runs."""
+    endpoint = "/".join(request.url.path.strip("/").split("/")[-2:])
+    body = request.read()
+    try:
+        parsed = json.loads(body) if body else None
+    except ValueError:
+        parsed = body.decode("utf-8", errors="replace")
+    kind = f"llm:{endpoint}"
+    summary = {"method": request.method, "endpoint": endpoint, "body": parsed}
+    shape = None
+    if isinstance(parsed, dict) and parsed.get("messages"):
+        # Which agent is asking: its model and instructions
+        shape = content_key(kind, model=parsed.get("model"), system=parsed["messages"][0].get("content"))
+    return kind, content_key(kind, method=request.method, body=parsed), shape, summary
+
+
+def _entry(kind: str, key: str, shape: Optional[str], summary: Dict[str, Any], response: httpx.Response,
+           body: bytes, elapsed: float, duration: float) -> Dict[str, Any]:
+    return {
+        "kind": kind,
+        "key": key,
+        "shape": shape,
+        "request": summary,
+        "response": {
+            "status": response.status_code,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS},
+            "body": body.decode("utf-8", errors="replace"),
+        },
+        "elapsed": round(elapsed, 4),
+        "duration": round(duration, 4),
+    }
+
+
+class _AsyncTee(httpx.AsyncByteStream):
+    """Passes a response body through (streaming intact) and records it once complete."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_complete: Callable[[bytes], None]):
+        self.stream, self.on_complete = stream, on_complete
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        chunks = []
+        async for chunk in self.stream:
+            chunks.append(chunk)
+            yield chunk
+        self.on_complete(b"".join(chunks))
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+
+class _SyncTee(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, on_complete: Callable[[bytes], None]):
+        self.stream, self.on_complete = stream, on_complete
+
+    def __iter__(self) -> Iterator[bytes]:
+        chunks = []
+        for chunk in self.stream:
+            chunks.append(chunk)
+            yield chunk
+        self.on_complete(b"".join(chunks))
+
+    def close(self):
+        self.stream.close()
+
+
+class _AsyncReplay(httpx.AsyncByteStream):
+    def __init__(self, body: bytes, wait: float):
+        self.body, self.wait = body, wait
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        await asyncio.sleep(self.wait)
+        yield self.body
+
+
+class _SyncReplay(httpx.SyncByteStream):
+    def __init__(self, body: bytes, wait: float):
+        self.body, self.wait = body, wait
+
+    def __iter__(self) -> Iterator[bytes]:
+        time.sleep(self.wait)
+        yield self.body
+
+
+def _replayed(entry: Dict[str, Any], request: httpx.Request, stream) -> httpx.Response:
+    return httpx.Response(entry["response"]["status"], headers=entry["response"]["headers"],
+                          stream=stream, request=request)
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """Async httpx transport that records or replays through a Cassette."""
+
+    def __init__(self, cassette: Cassette, transport: httpx.AsyncBaseTransport):
+        self.cassette = cassette
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        kind, key, shape, summary = _describe(request)
+        if (entry := self.cassette.find(kind, key, shape)) is not None:
+            # Headers after the recorded time-to-first-byte, body after the rest
+            await asyncio.sleep(self.cassette.delay(entry["elapsed"]))
+            body = entry["response"]["body"].encode("utf-8")
+            return _replayed(entry, request, _AsyncReplay(body, self.cassette.delay(entry["duration"] - entry["elapsed"])))
+
+        if not self.cassette.recording:
+            return await self.transport.handle_async_request(request)
+        # Plain bodies keep cassettes readable
+        request.headers["Accept-Encoding"] = "identity"
+        started = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        elapsed = time.perf_counter() - started
+
+        def on_complete(body: bytes):
+            duration = time.perf_counter() - started
+            self.cassette.record(_entry(kind, key, shape, summary, response, body, elapsed, duration))
+
+        return httpx.Response(response.status_code, headers=response.headers, request=request,
+                              stream=_AsyncTee(response.stream, on_complete), extensions=response.extensions)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class CassetteSyncTransport(httpx.BaseTransport):
+    """Sync counterpart of CassetteTransport (LiteLLM calls from CrewAI worker threads)."""
+
+    def __init__(self, cassette: Cassette, transport: httpx.BaseTransport):
+        self.cassette = cassette
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        kind, key, shape, summary = _describe(request)
+        if (entry := self.cassette.find(kind, key, shape)) is not None:
+            time.sleep(self.cassette.delay(entry["elapsed"]))
+            body = entry["response"]["body"].encode("utf-8")
+            return _replayed(entry, request, _SyncReplay(body, self.cassette.delay(entry["duration"] - entry["elapsed"])))
+
+        if not self.cassette.recording:
+            return self.transport.handle_request(request)
+        request.headers["Accept-Encoding"] = "identity"
+        started = time.perf_counter()
+        response = self.transport.handle_request(request)
+        elapsed = time.perf_counter() - started
+
+        def on_complete(body: bytes):
+            duration = time.perf_counter() - started
+            self.cassette.record(_entry(kind, key, shape, summary, response, body, elapsed, duration))
+
+        return httpx.Response(response.status_code, headers=response.headers, request=request,
+                              stream=_SyncTee(response.stream, on_complete), extensions=response.extensions)
+
+    def close(self):
+        self.transport.close()
+
+
+# Process-wide cassette (off unless CASSETTE_MODE is set)
+cassette = Cassette(
+    path=os.getenv("CASSETTE_PATH") or "cassettes/agents.jsonl",
+    mode=os.getenv("CASSETTE_MODE") or "off",
+    timing=os.getenv("CASSETTE_TIMING") or "original",
+)
+
+
+def cassette_transport(transport: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+    """Wrap an async transport with the cassette when one is active."""
+    return CassetteTransport(cassette, transport) if cassette.active else transport
+
+
+def install_litellm_cassette():
+    """Route LiteLLM (CrewAI LLMs) through the cassette when one is active."""
+    if not cassette.active:
+        return
+    import litellm
+
+    timeout = httpx.Timeout(600.0, connect=10.0)
+    litellm.client_session = httpx.Client(transport=CassetteSyncTransport(cassette, httpx.HTTPTransport()), timeout=timeout)
+    litellm.aclient_session = httpx.AsyncClient(transport=CassetteTransport(cassette, httpx.AsyncHTTPTransport()), timeout=timeout)
@@ -1,7 +1,7 @@
 import os
 import logging
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from agents import OpenAIChatCompletionsModel
 from crewai import LLM
 
@@ -26,9 +26,19 @@ def setup_environment():
 setup_environment()
 
 # 2. Shared Client & Model
+# Every chat completion goes through the process-wide LLM scheduler (core/scheduler.py),
+# gets prompt-cache breakpoints on its static prefix (core/prompt_cache.py)
+# and, when CASSETTE_MODE is set, is recorded or replayed (core/cassette.py)
+from backend.app.core.scheduler import ScheduledTransport, llm_scheduler
+from backend.app.core.cassette import cassette_transport, install_litellm_cassette
+from backend.app.core.prompt_cache import prompt_cache_transport, litellm_cache_params
+
 client = AsyncOpenAI(
     base_url=os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1"),
-    api_key=os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
+    api_key=os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY"),
+    http_client=DefaultAsyncHttpxClient(
+        transport=prompt_cache_transport(cassette_transport(ScheduledTransport(llm_scheduler)))
+    )
 )
 
 # OpenAI-based models (OpenAI Agents SDK)
@@ -43,15 +53,19 @@ budget_model = OpenAIChatCompletionsModel(
     openai_client=client
 )
 
-# Litellm / CrewAI wrapper models
+# Litellm / CrewAI wrapper models (LiteLLM's HTTP sessions go through the cassette too)
+install_litellm_cassette()
 # Note: LiteLLM requires the "openai/" prefix when using custom base_url to pass the exact model string to OpenRouter
 crew_llm = LLM(
     model="openai/openai/gpt-4o",
     base_url=os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1"),
-    api_key=os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
+    api_key=os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY"),
+    **litellm_cache_params("openai/openai/gpt-4o")
 )
 
 budget_crew_llm = LLM(
+    model="openai/meta-llama/llama-3.3-70b-instruct",
     base_url=os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1"),
-    api_key=os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
+    api_key=os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY"),
+    **litellm_cache_params("openai/meta-llama/llama-3.3-70b-instruct")
 )
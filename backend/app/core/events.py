@@ -0,0 +1,130 @@
+"""
+Progress event bus for agent flows.
+
+Flows publish structured events (stage started, search finished, writer
+tokens, CrewAI task completed, ...) instead of printing. Every event goes
+to the global listeners (the console logger by default) and, when the flow
+runs inside `stream_run`, to that run's private channel so it can be sent
+to the client as Server-Sent Events.
+
+The active channel is carried in a ContextVar, so concurrent runs never see
+each other's events and worker threads started with asyncio.to_thread
+(e.g. CrewAI's kickoff_async) still publish to the right run.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+class EventChannel:
+    """Queue of events for a single streamed run, safe to publish from any thread."""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._thread_id = threading.get_ident()
+
+    def put(self, event: Dict[str, Any]):
+        if threading.get_ident() == self._thread_id:
+            self.queue.put_nowait(event)
+        else:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+
+_channel: ContextVar[Optional[EventChannel]] = ContextVar("event_channel", default=None)
+
+
+class EventBus:
+    def __init__(self):
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    def subscribe(self, listener: Callable[[Dict[str, Any]], None]):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[Dict[str, Any]], None]):
+        self._listeners.remove(listener)
+
+    def publish(self, event_type: str, message: str = "", **data):
+        """Publish an event to global listeners and the current run's channel."""
+        event = {"type": event_type, "ts": time.time(), "message": message, **data}
+        for listener in self._listeners:
+            listener(event)
+        if (channel := _channel.get()) is not None:
+            channel.put(event)
+
+    def streaming(self) -> bool:
+        """True when the current flow is being streamed to a client."""
+        return _channel.get() is not None
+
+
+def _console_listener(event: Dict[str, Any]):
+    """Keep the familiar console progress log."""
+    if event["message"]:
+        print(event["message"])
+
+
+bus = EventBus()
+bus.subscribe(_console_listener)
+publish = bus.publish
+
+
+_DONE = object()
+
+
+async def stream_run(run: Callable[[], Awaitable[Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run a flow and yield its events as they are published.
+
+    The last event is either {"type": "result", "result": ...} or
+    {"type": "error", "message": ...}. If the consumer stops iterating
+    (e.g. the client disconnected) the flow is cancelled.
+    """
+    channel = EventChannel()
+
+    async def runner():
+        token = _channel.set(channel)
+        try:
+            result = await run()
+            channel.put({"type": "result", "ts": time.time(), "result": result})
+        except Exception as e:
+            channel.put({"type": "error", "ts": time.time(), "message": str(e)})
+        finally:
+            _channel.reset(token)
+            channel.put(_DONE)
+
+    task = asyncio.create_task(runner())
+    try:
+        while True:
+            event = await channel.queue.get()
+            if event is _DONE:
+                break
+            yield event
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def sse_stream(run: Callable[[], Awaitable[Any]]) -> AsyncIterator[str]:
+    """Format `stream_run` events as a text/event-stream body."""
+    async for event in stream_run(run):
+        yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+def on_crew_task_complete(output):
+    """CrewAI task_callback: record the task's latency and publish its completion."""
+    from backend.app.core.metrics import current_run, record_stage
+
+    if (run := current_run()) is not None:
+        # Crew tasks run sequentially, so a task took the time since the previous mark
+        record_stage(f"task:{getattr(output, 'name', None) or 'task'}", run.mark(), agent=str(getattr(output, "agent", "")))
+    publish(
+        "task_completed",
+        f">> Task complete: {getattr(output, 'name', None) or 'task'} ({getattr(output, 'agent', '')})",
+        task=getattr(output, "name", None),
+        agent=getattr(output, "agent", None),
+        output=getattr(output, "raw", None),
+    )
@@ -0,0 +1,241 @@
+"""
+Background job queue for long-running agent flows.
+
+Submitting a job stores it in a SQLite table and returns its id at once;
+a bounded pool of workers per flow type executes it inside the app's event
+loop. Results are persisted, so they can still be fetched after a restart.
+
+Several worker processes can share the job table:
+- A job is claimed with a conditional UPDATE (queued -> running), so it
+  runs in exactly one process even if every process enqueued it
+- A process records itself as the owner of the jobs it runs and refreshes
+  their heartbeat; only running jobs whose heartbeat stopped (their process
+  died or was restarted) are marked as interrupted
+
+Configuration (env):
+    JOB_DB_PATH                  SQLite file (default: jobs.db)
+    JOB_CONCURRENCY_<FLOW>       Workers per flow, e.g. JOB_CONCURRENCY_RESEARCH=2
+    JOB_HEARTBEAT_INTERVAL       Seconds between heartbeats of running jobs (default: 10)
+    JOB_STALE_AFTER              Seconds without a heartbeat before a running job is
+                                 marked interrupted (default: 60)
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobStore:
+    """Thin thread-safe wrapper around the SQLite job table."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    flow TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    owner TEXT,
+                    heartbeat_at REAL
+                )"""
+            )
+            # Tables created before jobs had owners
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    def insert(self, job_id: str, flow: str, payload: dict):
+        self._execute(
+            "INSERT INTO jobs (id, flow, status, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, flow, QUEUED, json.dumps(payload), time.time()),
+        )
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """Move a queued job to running for `owner`. False if another worker or process got it first."""
+        now = time.time()
+        with self._lock, self._conn:
+            return self._conn.execute(
+                """UPDATE jobs SET status = ?, started_at = ?, owner = ?, heartbeat_at = ?
+                   WHERE id = ? AND status = ?""",
+                (RUNNING, now, owner, now, job_id, QUEUED),
+            ).rowcount == 1
+
+    def heartbeat(self, owner: str):
+        self._execute("UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = ?", (time.time(), owner, RUNNING))
+
+    def fail_stale(self, before: float) -> int:
+        """Mark running jobs whose heartbeat stopped before `before` as interrupted."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                """UPDATE jobs SET status = ?, error = ?, finished_at = ?
+                   WHERE status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)""",
+                (FAILED, "Interrupted by server restart", time.time(), RUNNING, before),
+            ).rowcount
+
+    def mark_finished(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+        )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        row = dict(rows[0])
+        row["payload"] = json.loads(row["payload"])
+        row["result"] = json.loads(row["result"]) if row["result"] is not None else None
+        return row
+
+    def queued(self) -> list:
+        """Jobs waiting for a worker (also those submitted to a process that stopped)."""
+        return self._execute("SELECT id, flow FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,))
+
+    def status_counts(self) -> Dict[str, Dict[str, int]]:
+        counts: Dict[str, Dict[str, int]] = {}
+        for flow, status, count in self._execute("SELECT flow, status, COUNT(*) FROM jobs GROUP BY flow, status"):
+            counts.setdefault(flow, {})[status] = count
+        return counts
+
+
+class JobQueue:
+    """Per-flow asyncio queues drained by a bounded number of workers."""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("JOB_DB_PATH", "jobs.db")
+        self.heartbeat_interval = float(os.getenv("JOB_HEARTBEAT_INTERVAL") or 10)
+        self.stale_after = float(os.getenv("JOB_STALE_AFTER") or 60)
+        # Identifies this process's running jobs to the other processes
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.store: Optional[JobStore] = None
+        self.handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self.concurrency: Dict[str, int] = {}
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.running: Dict[str, int] = {}
+        self._workers: list = []
+
+    def register(self, flow: str, handler: Callable[..., Awaitable[Any]], concurrency: int = 1):
+        """Register a flow. Concurrency can be overridden with JOB_CONCURRENCY_<FLOW>."""
+        env_name = "JOB_CONCURRENCY_" + flow.upper().replace("-", "_")
+        self.handlers[flow] = handler
+        self.concurrency[flow] = max(1, int(os.getenv(env_name, concurrency)))
+
+    async def start(self):
+        """Open the job table, start workers and re-enqueue unfinished jobs."""
+        self.store = await asyncio.to_thread(JobStore, self.db_path)
+        for flow, workers in self.concurrency.items():
+            self.queues[flow] = asyncio.Queue()
+            self.running[flow] = 0
+            for _ in range(workers):
+                self._workers.append(asyncio.create_task(self._worker(flow)))
+        self._workers.append(asyncio.create_task(self._heartbeat()))
+
+        # Do not silently re-spend on a run that may have died mid-way; jobs
+        # that live processes are running keep their heartbeat and are left alone
+        await self._fail_stale()
+        for row in await asyncio.to_thread(self.store.queued):
+            if row["flow"] in self.queues:
+                self.queues[row["flow"]].put_nowait(row["id"])
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def submit(self, flow: str, payload: dict) -> str:
+        if flow not in self.queues:
+            raise ValueError(f"Unknown job flow: {flow}")
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self.store.insert, job_id, flow, payload)
+        self.queues[flow].put_nowait(job_id)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _fail_stale(self):
+        if failed := await asyncio.to_thread(self.store.fail_stale, time.time() - self.stale_after):
+            print(f">> Marked {failed} interrupted job(s) as failed")
+
+    async def _heartbeat(self):
+        """Keep this process's running jobs alive and fail those of processes that died."""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await asyncio.to_thread(self.store.heartbeat, self.owner)
+                await self._fail_stale()
+            except Exception as e:
+                print(f"Job heartbeat error: {e}")
+
+    async def _worker(self, flow: str):
+        queue = self.queues[flow]
+        handler = self.handlers[flow]
+        while True:
+            job_id = await queue.get()
+            try:
+                # Another worker (or process) may already have claimed it
+                if not await asyncio.to_thread(self.store.claim, job_id, self.owner):
+                    continue
+                job = await asyncio.to_thread(self.store.get, job_id)
+                self.running[flow] += 1
+                print(f">> Job {job_id} ({flow}) started")
+                try:
+                    result = await handler(**job["payload"])
+                    await asyncio.to_thread(self.store.mark_finished, job_id, SUCCEEDED, result)
+                    print(f">> Job {job_id} ({flow}) finished")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    traceback.print_exc()
+                    await asyncio.to_thread(self.store.mark_finished, job_id, FAILED, None, str(e))
+                finally:
+                    self.running[flow] -= 1
+            finally:
+                queue.task_done()
+
+    async def metrics(self) -> dict:
+        """Queue depth, in-flight count and totals by status per flow."""
+        totals = await asyncio.to_thread(self.store.status_counts)
+        return {
+            flow: {
+                "queued": self.queues[flow].qsize(),
+                "running": self.running[flow],
+                "concurrency": self.concurrency[flow],
+                "totals": totals.get(flow, {}),
+            }
+            for flow in self.queues
+        }
+
+
+# Global job queue instance (flows are registered by the API)
+job_queue = JobQueue()
@@ -0,0 +1,83 @@
+"""
+Lazy loading of agent flows.
+
+Importing a flow pulls in its whole stack (Agents SDK, CrewAI, LiteLLM,
+Tavily, ...), which dominates cold start. The API registers flows as
+LazyFlow handles instead: the module is imported in a worker thread on the
+first call (so the event loop keeps serving /health and other requests),
+and the load time is logged.
+
+Flows can be loaded ahead of traffic with WARM_FLOWS, e.g.
+WARM_FLOWS=all or WARM_FLOWS=sales,research. Warm-up runs in the
+background after startup, so it never delays the first /health.
+"""
+
+import asyncio
+import importlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# The flows share most of their stack (openai, pydantic, litellm); importing
+# them from several threads at once races on half-initialized packages
+_import_lock = threading.Lock()
+
+
+class LazyFlow:
+    """Async callable that imports `module` and resolves `attr` on first use."""
+
+    def __init__(self, module: str, attr: str, warm: Optional[str] = None):
+        self.module = module
+        self.attr = attr
+        # Optional function in the module run once after import (e.g. prebuilding a crew)
+        self.warm = warm
+        self.load_seconds: Optional[float] = None
+        self._fn: Optional[Callable] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _import(self) -> Callable:
+        with _import_lock:
+            started = time.perf_counter()
+            module = importlib.import_module(self.module)
+            if self.warm:
+                getattr(module, self.warm)()
+            self.load_seconds = time.perf_counter() - started
+        print(f"[import] {self.module} loaded in {self.load_seconds:.2f}s")
+        return getattr(module, self.attr)
+
+    async def load(self) -> Callable:
+        if self._fn is None:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self._fn is None:
+                    self._fn = await asyncio.to_thread(self._import)
+        return self._fn
+
+    async def __call__(self, *args, **kwargs) -> Any:
+        fn = await self.load()
+        return await fn(*args, **kwargs)
+
+    @property
+    def loaded(self) -> bool:
+        return self._fn is not None
+
+
+def warm_flows(flows: Dict[str, LazyFlow], setting: Optional[str] = None) -> List[str]:
+    """Names of the flows selected by WARM_FLOWS ("all" or a comma-separated list)."""
+    setting = (setting if setting is not None else os.getenv("WARM_FLOWS", "")).strip()
+    if not setting:
+        return []
+    if setting == "all":
+        return list(flows)
+    return [name.strip() for name in setting.split(",") if name.strip() in flows]
+
+
+async def warm_up(flows: Dict[str, LazyFlow], names: List[str]):
+    """Load the given flows one after another."""
+    for name in names:
+        try:
+            await flows[name].load()
+        except Exception as e:
+            print(f"[import] Warm-up of {name} failed: {e}")
@@ -0,0 +1,240 @@
+"""
+Event-loop health: continuous lag measurement and stack samples of blocking callbacks.
+
+A heartbeat task sleeps for LOOP_MONITOR_INTERVAL_MS and records how late it
+wakes up (the loop lag). A watchdog thread checks the heartbeat; when the loop
+has not come back for longer than LOOP_MONITOR_THRESHOLD_MS it samples the
+loop thread's stack, so the stall is attributed to the function that was
+running (e.g. a synchronous HTTP call or file write inside an async handler).
+
+Exposed on /metrics (event_loop_lag_seconds, event_loop_stalls_total and
+event_loop_blocked_seconds_total per function) and on /api/debug/loop
+(recent stalls with their stacks and the worst offenders).
+
+When off, nothing is started and no metrics are registered.
+
+Configuration (env):
+    LOOP_MONITOR                Enable the monitor (1/true/yes, default: off)
+    LOOP_MONITOR_THRESHOLD_MS   Stall threshold in milliseconds (default: 100)
+    LOOP_MONITOR_INTERVAL_MS    Heartbeat interval in milliseconds (default: 50)
+    LOOP_MONITOR_STALLS         Recent stalls kept for the debug endpoint (default: 50)
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from backend.app.core.metrics import registry
+
+# Stack frames under this directory are our code; the offender is the innermost of them
+APP_ROOT = str(Path(__file__).resolve().parents[1])
+PROJECT_ROOT = str(Path(__file__).resolve().parents[3])
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MAX_FRAMES = 25
+
+
+def _enabled(value: Optional[str]) -> bool:
+    return (value or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _where(frame: traceback.FrameSummary) -> str:
+    path = frame.filename
+    if path.startswith(PROJECT_ROOT):
+        path = os.path.relpath(path, PROJECT_ROOT)
+    return f"{path}:{frame.lineno} in {frame.name}"
+
+
+def _callback_stack(frame) -> List[traceback.FrameSummary]:
+    """The running callback's frames: everything above asyncio's Handle._run."""
+    stack = traceback.extract_stack(frame)
+    for i in range(len(stack) - 1, -1, -1):
+        if stack[i].name == "_run" and stack[i].filename.endswith(os.path.join("asyncio", "events.py")):
+            stack = stack[i + 1:]
+            break
+    return stack[-MAX_FRAMES:]
+
+
+def _offender(stack: List[traceback.FrameSummary]) -> str:
+    """Innermost frame in our code (the caller of the blocking library), else the innermost frame."""
+    for frame in reversed(stack):
+        if frame.filename.startswith(APP_ROOT):
+            return f"{os.path.relpath(frame.filename, PROJECT_ROOT)}:{frame.name}"
+    if stack:
+        return f"{Path(stack[-1].filename).name}:{stack[-1].name}"
+    return "unknown"
+
+
+class LoopMonitor:
+    """Measures event-loop lag and attributes stalls to the function holding the loop."""
+
+    def __init__(self, enabled: bool = False, threshold: float = 0.1, interval: float = 0.05, keep: int = 50):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.interval = interval
+        self.check_interval = max(0.005, min(interval, threshold) / 2)
+        self.recent: deque = deque(maxlen=keep)
+        self.lags: deque = deque(maxlen=10_000)
+        self.offenders: Dict[str, List[float]] = {}  # function -> [stalls, blocked seconds]
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._loop_thread: Optional[int] = None
+        self._beat = 0
+        self._beat_at = time.perf_counter()
+        self._pending: Optional[Dict[str, Any]] = None
+        self._lag_histogram = None
+        self.reset()
+
+    @classmethod
+    def from_env(cls) -> "LoopMonitor":
+        return cls(
+            enabled=_enabled(os.getenv("LOOP_MONITOR")),
+            threshold=float(os.getenv("LOOP_MONITOR_THRESHOLD_MS") or 100) / 1000,
+            interval=float(os.getenv("LOOP_MONITOR_INTERVAL_MS") or 50) / 1000,
+            keep=int(os.getenv("LOOP_MONITOR_STALLS") or 50),
+        )
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self.recent.clear()
+            self.lags.clear()
+            self.offenders.clear()
+            self.stalls = 0
+            self.blocked = 0.0
+
+    # --- Lifecycle (call from the app's startup/shutdown hooks) ---
+
+    def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        if self._lag_histogram is None:
+            self._lag_histogram = registry.histogram(
+                "event_loop_lag_seconds", "How late the event loop woke up from the monitor's heartbeat",
+                buckets=LAG_BUCKETS,
+            )
+            registry.collector(self._collect)
+        self.reset()
+        self._loop_thread = threading.get_ident()
+        self._beat_at = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name="loop-monitor", daemon=True).start()
+        print(f"[loop-monitor] On: stalls over {self.threshold * 1000:.0f} ms are sampled "
+              f"(heartbeat every {self.interval * 1000:.0f} ms)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    # --- Measurement ---
+
+    async def _heartbeat(self):
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - before - self.interval)
+            with self._lock:
+                self._beat += 1
+                self._beat_at = now
+                pending, self._pending = self._pending, None
+                self.lags.append(lag)
+                if lag > self.threshold:
+                    self._add_stall(lag, pending)
+            self._lag_histogram.observe(lag)
+
+    def _watchdog(self):
+        """Runs in its own thread: samples the loop thread's stack while the heartbeat is overdue."""
+        while not self._stop.wait(self.check_interval):
+            with self._lock:
+                overdue = time.perf_counter() - self._beat_at - self.interval
+                if overdue <= self.threshold or (self._pending and self._pending["beat"] == self._beat):
+                    continue
+                beat = self._beat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = _callback_stack(frame)
+            del frame
+            with self._lock:
+                # The loop may have caught up while the stack was taken
+                if beat == self._beat:
+                    self._pending = {"beat": beat, "stack": stack}
+
+    def _add_stall(self, lag: float, pending: Optional[Dict[str, Any]]):
+        stack = pending["stack"] if pending else []
+        function = _offender(stack) if pending else "unsampled"
+        self.stalls += 1
+        self.blocked += lag
+        totals = self.offenders.setdefault(function, [0, 0.0])
+        totals[0] += 1
+        totals[1] += lag
+        self.recent.append({
+            "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "duration_ms": round(lag * 1000, 1),
+            "function": function,
+            "stack": [_where(frame) for frame in stack],
+        })
+        print(f"[loop-monitor] Event loop blocked {lag * 1000:.0f} ms in {function}")
+
+    # --- Reporting ---
+
+    def _collect(self):
+        with self._lock:
+            offenders = sorted(self.offenders.items())
+        return [
+            ("event_loop_stalls_total", "counter",
+             "Event-loop stalls over the monitor threshold per blocking function", ["function"],
+             [((function,), count) for function, (count, _) in offenders]),
+            ("event_loop_blocked_seconds_total", "counter",
+             "Seconds the event loop was blocked per blocking function", ["function"],
+             [((function,), round(seconds, 6)) for function, (_, seconds) in offenders]),
+        ]
+
+    def snapshot(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            lags = sorted(self.lags)
+            offenders = sorted(self.offenders.items(), key=lambda item: -item[1][1])
+            recent = list(self.recent)
+            stalls, blocked = self.stalls, self.blocked
+
+        def pick(p: float) -> float:
+            return round(lags[min(len(lags) - 1, int(len(lags) * p))] * 1000, 2) if lags else 0.0
+
+        return {
+            "enabled": True,
+            "threshold_ms": self.threshold * 1000,
+            "interval_ms": self.interval * 1000,
+            "window_s": round(time.perf_counter() - self.started, 3),
+            "lag_p50_ms": pick(0.5),
+            "lag_p99_ms": pick(0.99),
+            "lag_max_ms": pick(1.0),
+            "stalls": stalls,
+            "blocked_s": round(blocked, 3),
+            "offenders": [
+                {"function": function, "stalls": count, "blocked_s": round(seconds, 3)}
+                for function, (count, seconds) in offenders
+            ],
+            "recent": recent[::-1],
+        }
+
+
+loop_monitor = LoopMonitor.from_env()
@@ -0,0 +1,296 @@
+"""
+Hot-path instrumentation and Prometheus text exposition.
+
+- Latency per agent stage (each agent run, each CrewAI task) and per flow
+- Token usage (including cached input tokens) and estimated cost per model
+- Retries/fallbacks (from core/resilience.py) and rate-limit rejections
+- Prompt tokens saved by deduplicating search sources (core/sources.py)
+
+Each flow run also collects its own timings (carried in a ContextVar, so
+parallel stages and CrewAI worker threads add to the right run) and prints
+a one-line JSON summary when it finishes.
+
+Model prices (USD per 1M input/output tokens, optionally cached input) can be
+overridden with LLM_PRICES='{"model": [input, output, cached_input], ...}'.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self.values: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            state = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, state in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, state):
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {state[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(round(state[-2], 6))}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {state[-1]}")
+        return lines
+
+
+# Collector: () -> [(name, type, help, label_names, [(label_values, value), ...]), ...]
+Collector = Callable[[], List[Tuple[str, str, str, Sequence[str], List[Tuple[Sequence[str], float]]]]]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+        self.collectors: List[Collector] = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Collector) -> Collector:
+        """Register a callback producing metrics at scrape time (usable as a decorator)."""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for collect in self.collectors:
+            for name, kind, help, label_names, samples in collect():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_labels(label_names, values)} {_number(value)}" for values, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+FLOW_LATENCY = registry.histogram("agent_flow_duration_seconds", "End-to-end flow latency", ["flow", "status"])
+STAGE_LATENCY = registry.histogram("agent_stage_duration_seconds", "Latency per agent stage", ["flow", "stage"])
+LLM_TOKENS = registry.counter("llm_tokens_total", "LLM tokens used", ["model", "kind"])
+LLM_COST = registry.counter("llm_cost_usd_total", "Estimated LLM cost in USD", ["model"])
+RATE_LIMIT_REJECTIONS = registry.counter("rate_limit_rejections_total", "Requests rejected by the API rate limiter", ["type"])
+SOURCE_TOKENS_SAVED = registry.counter("source_dedup_tokens_saved_total", "Estimated prompt tokens saved by source deduplication", ["flow"])
+COMPACTION_TOKENS_SAVED = registry.counter("research_compaction_tokens_saved_total", "Writer prompt tokens removed by research compaction", ["model"])
+
+
+# USD per 1M tokens (input, output[, cached input]); without a cached price cached tokens cost full input
+PRICES: Dict[str, Tuple[float, ...]] = {
+    "anthropic/claude-3.5-sonnet": (3.0, 15.0, 0.30),
+    "meta-llama/llama-3.3-70b-instruct": (0.13, 0.40),
+    "openai/meta-llama/llama-3.3-70b-instruct": (0.13, 0.40),
+    "openai/openai/gpt-4o": (2.5, 10.0, 1.25),
+    "openai/gpt-4o": (2.5, 10.0, 1.25),
+}
+PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int, cached_input_tokens: int = 0) -> float:
+    """Input tokens include the cached ones (as providers report them)."""
+    price_in, price_out, *cached = PRICES.get(model, (0.0, 0.0))
+    price_cached = cached[0] if cached else price_in
+    uncached = max(0, input_tokens - cached_input_tokens)
+    return (uncached * price_in + cached_input_tokens * price_cached + output_tokens * price_out) / 1_000_000
+
+
+# --- Per-run timings ---
+
+class RunTimings:
+    """Timings collected for one flow run."""
+
+    def __init__(self, flow: str):
+        self.flow = flow
+        self.started = time.perf_counter()
+        self.last_mark = self.started
+        self.stages: List[Dict[str, Any]] = []
+        # Counts from steps too cheap to time (e.g. fact table size), by step name
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, entry: Dict[str, Any]):
+        with self._lock:
+            self.stages.append(entry)
+
+    def note(self, name: str, **stats):
+        with self._lock:
+            self.stats[name] = stats
+
+    def mark(self) -> float:
+        """Seconds since the previous mark (used to time sequential CrewAI tasks)."""
+        with self._lock:
+            now = time.perf_counter()
+            elapsed, self.last_mark = now - self.last_mark, now
+            return elapsed
+
+    def summary(self, status: str) -> Dict[str, Any]:
+        return {
+            "flow": self.flow,
+            "status": status,
+            "total_s": round(time.perf_counter() - self.started, 3),
+            "stages": self.stages,
+            "stats": self.stats,
+            "input_tokens": sum(s.get("input_tokens", 0) for s in self.stages),
+            "output_tokens": sum(s.get("output_tokens", 0) for s in self.stages),
+            "cached_input_tokens": sum(s.get("cached_input_tokens", 0) for s in self.stages),
+            "cost_usd": round(sum(s.get("cost_usd", 0.0) for s in self.stages), 6),
+        }
+
+
+_current_run: ContextVar[Optional[RunTimings]] = ContextVar("run_timings", default=None)
+
+
+def current_run() -> Optional[RunTimings]:
+    return _current_run.get()
+
+
+def record_stage(stage: str, seconds: float, model: Optional[str] = None,
+                 input_tokens: int = 0, output_tokens: int = 0, cached_input_tokens: int = 0, **extra):
+    """Record one stage's latency and token usage for metrics and the run summary.
+
+    cached_input_tokens is the part of input_tokens served from the provider's prompt cache.
+    """
+    run = _current_run.get()
+    flow = run.flow if run else "unknown"
+    STAGE_LATENCY.observe(seconds, flow=flow, stage=stage)
+
+    entry: Dict[str, Any] = {"stage": stage, "seconds": round(seconds, 3), **extra}
+    if model:
+        entry["model"] = model
+        cost = estimate_cost(model, input_tokens, output_tokens, cached_input_tokens)
+        if input_tokens or output_tokens:
+            LLM_TOKENS.inc(input_tokens, model=model, kind="input")
+            LLM_TOKENS.inc(output_tokens, model=model, kind="output")
+            LLM_TOKENS.inc(cached_input_tokens, model=model, kind="cached_input")
+            LLM_COST.inc(cost, model=model)
+            entry.update(input_tokens=input_tokens, cached_input_tokens=cached_input_tokens,
+                         output_tokens=output_tokens, cost_usd=round(cost, 6))
+    if run:
+        run.add(entry)
+
+
+def record_stats(name: str, **stats):
+    """Add a step's counts to the run summary without observing a latency."""
+    if (run := _current_run.get()) is not None:
+        run.note(name, **stats)
+
+
+def instrument_flow(flow: str):
+    """Decorator for flow entry points: times the run and logs its summary."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            run = RunTimings(flow)
+            token = _current_run.set(run)
+            status = "error"
+            try:
+                result = await fn(*args, **kwargs)
+                status = "success"
+                return result
+            finally:
+                _current_run.reset(token)
+                summary = run.summary(status)
+                FLOW_LATENCY.observe(summary["total_s"], flow=flow, status=status)
+                print(f"[timing] {json.dumps(summary)}")
+        return wrapper
+    return decorator
+
+
+@registry.collector
+def _resilience_metrics():
+    from backend.app.core import resilience
+
+    stats = resilience.stats()
+    samples: Dict[str, List] = {}
+    for model, values in stats["models"].items():
+        for kind, value in values.items():
+            samples.setdefault(kind, []).append(((model,), value))
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    breakers = stats["breakers"].items()
+    return [
+        (f"llm_{kind}_total", "counter", f"LLM {kind.replace('_', ' ')} per model", ["model"], values)
+        for kind, values in sorted(samples.items())
+    ] + [
+        ("llm_circuit_state", "gauge", "Circuit per model: 0 closed, 1 half-open, 2 open", ["model"],
+         [((model,), states[b["state"]]) for model, b in breakers]),
+        ("llm_circuit_failures", "gauge", "Consecutive failures per model", ["model"],
+         [((model,), b["failures"]) for model, b in breakers]),
+    ]
+
+
+@registry.collector
+def _scheduler_metrics():
+    from backend.app.core.scheduler import llm_scheduler
+
+    buckets = llm_scheduler.stats().items()
+    return [
+        (f"llm_scheduler_{field}", "gauge", help, ["model"], [((model,), b[field]) for model, b in buckets])
+        for field, help in (
+            ("tokens", "Requests the model's bucket allows right now"),
+            ("rpm", "Requests per minute currently allowed per model"),
+            ("waiting", "LLM calls waiting for a slot per model"),
+            ("paused_for", "Seconds the model stays paused after a 429"),
+        )
+    ]
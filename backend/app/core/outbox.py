@@ -0,0 +1,481 @@
+"""
+Durable email outbox.
+
+Sending an email stores it in a SQLite table under an idempotency key and
+returns at once; a background dispatcher delivers queued messages through
+Resend's HTTP API:
+
+- One pooled httpx.AsyncClient, nothing blocks the event loop
+- Up to 100 messages per request via the batch endpoint
+- A token bucket per recipient domain
+- Retries with backoff. A batch keeps its Idempotency-Key (and its exact
+  set of messages) across retries and restarts, so Resend deduplicates a
+  retry of a request that actually went through and nothing is sent twice.
+  Enqueuing the same idempotency key again returns the existing message,
+  unless that message failed. A message Resend rejected outright (a 4xx
+  such as an invalid address) is queued again under a new batch; one that
+  failed ambiguously (timeouts or 5xx after every attempt, so it may have
+  been delivered) is queued again under its old batch key, so Resend
+  answers with the earlier result instead of sending it twice.
+  Without an explicit key the key is a hash of recipient, subject and body,
+  so deliberately sending an identical email again is a silent no-op; pass
+  a new idempotency key to send it again.
+- Messages are claimed with a conditional UPDATE, so with several worker
+  processes sharing the outbox each message is sent by only one of them.
+  A claim records its dispatcher and time; a message still sending after
+  OUTBOX_STALE_AFTER (its dispatcher died mid-send) is queued again with
+  its batch key, while messages live dispatchers are sending are left alone.
+
+Configuration (env):
+    RESEND_API_KEY          API key
+    RESEND_BASE_URL         API root (default: https://api.resend.com); point at a
+                            local stand-in for testing
+    SENDER_EMAIL            From address (default: Agent Squad <onboarding@resend.dev>)
+    OUTBOX_DB_PATH          SQLite file (default: outbox.db)
+    OUTBOX_DOMAIN_RPM       Sends per minute per recipient domain (default: 30)
+    OUTBOX_MAX_ATTEMPTS     Attempts before a message is marked failed (default: 5)
+    OUTBOX_SEND_TIMEOUT     HTTP timeout in seconds (default: 30)
+    OUTBOX_SEND_WAIT        Seconds `Outbox.send` waits for delivery (default: 30)
+    OUTBOX_STALE_AFTER      Seconds a message may stay sending before it is requeued
+                            (default: 120, at least twice OUTBOX_SEND_TIMEOUT)
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+from backend.app.core.cache import content_key
+from backend.app.core.resilience import RetryPolicy
+from backend.app.core.scheduler import ModelBucket
+
+# Message states
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+BATCH_LIMIT = 100  # Resend batch endpoint maximum
+
+
+class SendError(Exception):
+    """A provider request failed. `retryable` is False for client errors."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = True,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class ResendClient:
+    """Async Resend API client sharing one connection pool."""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 timeout: Optional[float] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.api_key = api_key or os.getenv("RESEND_API_KEY", "")
+        self.base_url = (base_url or os.getenv("RESEND_BASE_URL") or "https://api.resend.com").rstrip("/")
+        self.timeout = timeout or float(os.getenv("OUTBOX_SEND_TIMEOUT", 30))
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+                transport=self.transport,
+            )
+        return self._client
+
+    async def _post(self, path: str, body: Any, idempotency_key: str) -> Any:
+        try:
+            response = await self._http().post(path, json=body, headers={"Idempotency-Key": idempotency_key})
+        except httpx.TransportError as e:
+            raise SendError(f"Resend connection error: {e}") from e
+
+        if response.status_code >= 400:
+            try:
+                message = response.json().get("message") or response.text
+            except ValueError:
+                message = response.text
+            if response.status_code == 401:
+                message = "Resend API Error: Check your API key."
+            try:
+                retry_after = float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = None
+            raise SendError(
+                message,
+                status=response.status_code,
+                retryable=response.status_code == 429 or response.status_code >= 500,
+                retry_after=retry_after,
+            )
+        return response.json()
+
+    async def send(self, message: Dict[str, Any], idempotency_key: str) -> str:
+        """Send one email. Returns the provider's message id."""
+        data = await self._post("/emails", message, idempotency_key)
+        return data["id"]
+
+    async def send_batch(self, messages: Sequence[Dict[str, Any]], idempotency_key: str) -> List[str]:
+        """Send up to BATCH_LIMIT emails in one request. Returns ids in order."""
+        data = await self._post("/emails/batch", list(messages), idempotency_key)
+        return [item["id"] for item in data["data"]]
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class OutboxStore:
+    """Thin thread-safe wrapper around the SQLite outbox table."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS outbox (
+                    id TEXT PRIMARY KEY,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    to_email TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    html TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    batch_key TEXT,
+                    provider_id TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    next_attempt_at REAL NOT NULL,
+                    sent_at REAL,
+                    claimed_by TEXT,
+                    claimed_at REAL,
+                    error_status INTEGER
+                )"""
+            )
+            # Tables created before claims and failure statuses were recorded
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+            for column, kind in (("claimed_by", "TEXT"), ("claimed_at", "REAL"), ("error_status", "INTEGER")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE outbox ADD COLUMN {column} {kind}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _execute_many(self, sql: str, params: List[tuple]):
+        with self._lock, self._conn:
+            self._conn.executemany(sql, params)
+
+    def insert(self, messages: List[Dict[str, str]]) -> List[str]:
+        """Insert messages, skipping known idempotency keys unless they failed. Returns ids in order."""
+        now = time.time()
+        with self._lock, self._conn:
+            ids = []
+            for m in messages:
+                domain = m["to_email"].rsplit("@", 1)[-1].lower()
+                # Rejected by the provider (4xx), so never delivered: send again as a new batch
+                self._conn.execute(
+                    """UPDATE outbox SET to_email = ?, domain = ?, subject = ?, html = ?, status = ?, attempts = 0,
+                              batch_key = NULL, provider_id = NULL, error = NULL, error_status = NULL,
+                              created_at = ?, next_attempt_at = ?
+                       WHERE idempotency_key = ? AND status = ? AND error_status BETWEEN 400 AND 499""",
+                    (m["to_email"], domain, m["subject"], m["html"], QUEUED, now, now, m["idempotency_key"], FAILED),
+                )
+                # Maybe delivered (timeouts, 5xx): retry the same request under the same batch key,
+                # so the provider returns the earlier result instead of sending again
+                self._conn.execute(
+                    """UPDATE outbox SET status = ?, attempts = 0, error = NULL, error_status = NULL, next_attempt_at = ?
+                       WHERE idempotency_key = ? AND status = ?""",
+                    (QUEUED, now, m["idempotency_key"], FAILED),
+                )
+                self._conn.execute(
+                    """INSERT OR IGNORE INTO outbox
+                       (id, idempotency_key, to_email, domain, subject, html, status, created_at, next_attempt_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (uuid.uuid4().hex, m["idempotency_key"], m["to_email"],
+                     domain, m["subject"], m["html"], QUEUED, now, now),
+                )
+                row = self._conn.execute(
+                    "SELECT id FROM outbox WHERE idempotency_key = ?", (m["idempotency_key"],)
+                ).fetchone()
+                ids.append(row["id"])
+            return ids
+
+    def recover(self, before: float) -> int:
+        """
+        Requeue messages claimed before `before` and still sending (batch keys are kept).
+
+        Their dispatcher stopped mid-send; a send lasts at most the HTTP
+        timeout, so messages a live dispatcher is sending are never this old.
+        """
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE outbox SET status = ? WHERE status = ? AND (claimed_at IS NULL OR claimed_at < ?)",
+                (QUEUED, SENDING, before),
+            ).rowcount
+
+    def due(self, now: float, limit: int) -> list:
+        """Queued messages ready to send: every retried batch plus up to `limit` new messages."""
+        retries = self._execute(
+            "SELECT * FROM outbox WHERE status = ? AND batch_key IS NOT NULL AND next_attempt_at <= ?",
+            (QUEUED, now),
+        )
+        fresh = self._execute(
+            """SELECT * FROM outbox WHERE status = ? AND batch_key IS NULL AND next_attempt_at <= ?
+               ORDER BY created_at LIMIT ?""",
+            (QUEUED, now, limit),
+        )
+        return retries + fresh
+
+    def claim(self, ids: List[str], batch_key: str, owner: str) -> List[str]:
+        """
+        Move queued messages to sending under `batch_key` for `owner`, in one transaction.
+
+        Only rows still queued are updated, so when another worker process
+        selected the same rows only one of them claims each. Returns the ids
+        claimed here.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            return [
+                i for i in ids
+                if self._conn.execute(
+                    """UPDATE outbox SET status = ?, batch_key = ?, attempts = attempts + 1, claimed_by = ?, claimed_at = ?
+                       WHERE id = ? AND status = ?""",
+                    (SENDING, batch_key, owner, now, i, QUEUED),
+                ).rowcount
+            ]
+
+    def mark_sent(self, ids: List[str], provider_ids: List[str]):
+        now = time.time()
+        self._execute_many(
+            "UPDATE outbox SET status = ?, provider_id = ?, error = NULL, sent_at = ? WHERE id = ?",
+            [(SENT, provider_id, now, i) for i, provider_id in zip(ids, provider_ids)],
+        )
+
+    def mark_retry(self, ids: List[str], error: str, next_attempt_at: float):
+        self._execute_many(
+            "UPDATE outbox SET status = ?, error = ?, next_attempt_at = ? WHERE id = ?",
+            [(QUEUED, error, next_attempt_at, i) for i in ids],
+        )
+
+    def mark_failed(self, ids: List[str], error: str, status: Optional[int] = None):
+        """Give up on messages; `status` is the provider's HTTP status, None if it never answered."""
+        self._execute_many(
+            "UPDATE outbox SET status = ?, error = ?, error_status = ? WHERE id = ?",
+            [(FAILED, error, status, i) for i in ids],
+        )
+
+    def get(self, message_id: str) -> Optional[dict]:
+        rows = self._execute("SELECT * FROM outbox WHERE id = ?", (message_id,))
+        return dict(rows[0]) if rows else None
+
+    def status_counts(self) -> Dict[str, int]:
+        return {status: count for status, count in self._execute("SELECT status, COUNT(*) FROM outbox GROUP BY status")}
+
+
+class Outbox:
+    """Enqueues messages durably and delivers them from a background dispatcher."""
+
+    def __init__(self, client: Optional[ResendClient] = None, db_path: Optional[str] = None,
+                 domain_rpm: Optional[float] = None, max_attempts: Optional[int] = None,
+                 poll_interval: float = 1.0):
+        self.client = client or ResendClient()
+        self.db_path = db_path or os.getenv("OUTBOX_DB_PATH", "outbox.db")
+        self.domain_rpm = domain_rpm or float(os.getenv("OUTBOX_DOMAIN_RPM", 30))
+        self.retry_policy = RetryPolicy(
+            retries=max_attempts or int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5)),
+            base_delay=5, max_delay=300, timeout=None,
+        )
+        self.poll_interval = poll_interval
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.stale_after = max(float(os.getenv("OUTBOX_STALE_AFTER") or 120), 2 * self.client.timeout)
+        self.sender = os.getenv("SENDER_EMAIL") or "Agent Squad <onboarding@resend.dev>"
+        self.store: Optional[OutboxStore] = None
+        self.domains: Dict[str, ModelBucket] = {}
+        self._wake = asyncio.Event()
+        self._changed = asyncio.Condition()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Open the outbox table, requeue stale in-flight messages and start the dispatcher."""
+        self.store = await asyncio.to_thread(OutboxStore, self.db_path)
+        await self._recover()
+        self._dispatcher = asyncio.create_task(self._run())
+
+    async def _recover(self):
+        if recovered := await asyncio.to_thread(self.store.recover, time.time() - self.stale_after):
+            print(f"Outbox: requeued {recovered} stale in-flight messages")
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        await self.client.close()
+
+    async def enqueue(self, messages: List[Dict[str, str]], idempotency_key: Optional[str] = None) -> List[str]:
+        """
+        Store messages for delivery and return their outbox ids.
+
+        Each message has to_email, subject and html_body, and optionally its
+        own idempotency_key. Otherwise the key is derived from the request
+        key, or else from the message content: re-submitting is a no-op, so
+        an identical email sent on purpose needs a new key. A message that
+        failed is queued again: as a new batch if the provider rejected it
+        (4xx), under its old batch key if it may have been delivered.
+        """
+        rows = []
+        for index, m in enumerate(messages):
+            key = m.get("idempotency_key") or (
+                f"{idempotency_key}:{index}" if idempotency_key
+                else content_key(m["to_email"], m["subject"], m["html_body"])
+            )
+            rows.append({"idempotency_key": key, "to_email": m["to_email"],
+                         "subject": m["subject"], "html": m["html_body"]})
+        ids = await asyncio.to_thread(self.store.insert, rows)
+        self._wake.set()
+        return ids
+
+    async def get(self, message_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.store.get, message_id)
+
+    async def send(self, to_email: str, subject: str, html_body: str,
+                   idempotency_key: Optional[str] = None, timeout: Optional[float] = None) -> Dict[str, str]:
+        """Enqueue one email and wait for the outcome: success, error, or queued if still pending."""
+        ids = await self.enqueue(
+            [{"to_email": to_email, "subject": subject, "html_body": html_body}], idempotency_key
+        )
+        wait = timeout if timeout is not None else float(os.getenv("OUTBOX_SEND_WAIT", 30))
+        row = (await self.wait(ids, wait))[0]
+
+        if row["status"] == SENT:
+            print(f"Resend success: {row['provider_id']}")
+            return {"status": "success", "message_id": row["id"]}
+        if row["status"] == FAILED:
+            print(f"Resend error: {row['error']}")
+            return {"status": "error", "message": row["error"], "message_id": row["id"]}
+        return {"status": "queued", "message_id": row["id"]}
+
+    async def wait(self, ids: List[str], timeout: float) -> List[dict]:
+        """Wait until the messages are sent or failed, or `timeout` passes. Returns their rows."""
+        deadline = time.monotonic() + timeout
+        async with self._changed:
+            while True:
+                rows = [await self.get(i) for i in ids]
+                remaining = deadline - time.monotonic()
+                if all(row["status"] in (SENT, FAILED) for row in rows) or remaining <= 0:
+                    return rows
+                try:
+                    await asyncio.wait_for(self._changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _bucket(self, domain: str) -> ModelBucket:
+        bucket = self.domains.get(domain)
+        if bucket is None:
+            bucket = self.domains[domain] = ModelBucket(self.domain_rpm, max(1.0, self.domain_rpm / 6))
+        return bucket
+
+    def _message(self, row: dict) -> Dict[str, Any]:
+        return {"from": self.sender, "to": [row["to_email"]], "subject": row["subject"], "html": row["html"]}
+
+    async def dispatch_once(self) -> int:
+        """Send every message that is due and allowed by its domain's throttle. Returns messages attempted."""
+        rows = [dict(r) for r in await asyncio.to_thread(self.store.due, time.time(), BATCH_LIMIT)]
+
+        # Retried batches go out exactly as before so their idempotency key still matches
+        batches: Dict[str, List[dict]] = {}
+        fresh = []
+        for row in rows:
+            if row["batch_key"]:
+                batches.setdefault(row["batch_key"], []).append(row)
+            elif self._bucket(row["domain"]).try_acquire():
+                fresh.append(row)
+        for start in range(0, len(fresh), BATCH_LIMIT):
+            batches[uuid.uuid4().hex] = fresh[start:start + BATCH_LIMIT]
+
+        await asyncio.gather(*[self._send(key, batch) for key, batch in batches.items()])
+        if batches:
+            async with self._changed:
+                self._changed.notify_all()
+        return sum(len(batch) for batch in batches.values())
+
+    async def _send(self, batch_key: str, rows: List[dict]):
+        claimed = await asyncio.to_thread(self.store.claim, [row["id"] for row in rows], batch_key, self.owner)
+        # Rows another worker process claimed first are its to send
+        rows = [row for row in rows if row["id"] in claimed]
+        if not rows:
+            return
+        ids = [row["id"] for row in rows]
+        try:
+            messages = [self._message(row) for row in rows]
+            if len(messages) == 1:
+                provider_ids = [await self.client.send(messages[0], batch_key)]
+            else:
+                provider_ids = await self.client.send_batch(messages, batch_key)
+        except Exception as e:
+            # Anything unexpected (e.g. a malformed response) is retried under the same key
+            if not isinstance(e, SendError):
+                e = SendError(str(e))
+            attempts = rows[0]["attempts"] + 1
+            if e.status == 429:
+                # Provider-wide limit: hold back every domain in this batch
+                for row in rows:
+                    self._bucket(row["domain"]).pause(e.retry_after or 60 / self.domain_rpm)
+            if e.retryable and attempts < self.retry_policy.retries:
+                delay = self.retry_policy.backoff(attempts, e.retry_after)
+                print(f"Outbox: batch of {len(ids)} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.to_thread(self.store.mark_retry, ids, str(e), time.time() + delay)
+            else:
+                print(f"Outbox: batch of {len(ids)} failed: {e}")
+                await asyncio.to_thread(self.store.mark_failed, ids, str(e), e.status)
+        else:
+            await asyncio.to_thread(self.store.mark_sent, ids, provider_ids)
+            print(f"Outbox: sent {len(ids)} message(s)")
+
+    async def _run(self):
+        recovered_at = time.monotonic()
+        while True:
+            try:
+                # Messages a dead sibling process was sending go stale while this one runs
+                if time.monotonic() - recovered_at >= self.stale_after:
+                    recovered_at = time.monotonic()
+                    await self._recover()
+                await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Outbox dispatcher error: {e}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def metrics(self) -> dict:
+        counts = await asyncio.to_thread(self.store.status_counts)
+        return {
+            "totals": counts,
+            "domains": {domain: round(bucket.tokens, 2) for domain, bucket in self.domains.items()},
+        }
+
+
+# Global outbox instance (started by the API)
+outbox = Outbox()
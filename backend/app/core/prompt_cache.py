@@ -0,0 +1,103 @@
+"""
+Provider prompt caching for the static part of agent prompts.
+
+Every agent call resends the same instructions (and tool schemas). OpenAI
+models cache a repeated prefix automatically; Anthropic models (also when
+routed through OpenRouter) only cache up to explicit cache_control
+breakpoints. For those models this module marks:
+    1. the system message - the agent's static instructions, plus the tool
+       schemas that precede it in the provider's cache order
+    2. the last user/tool message once an agent is in a tool loop, so each
+       turn reads the previous turns from the cache instead of paying for
+       them again
+
+Flows keep the static text first (instructions in the system prompt, fixed
+wording before the per-request data) so the cached prefix is shared across
+calls and requests. Providers ignore breakpoints on prefixes below their
+minimum (1024 tokens for Claude Sonnet), so short prompts are unaffected.
+
+Cached input tokens are reported per stage in the "[timing]" summaries and
+as llm_tokens_total{kind="cached_input"} (see core/metrics.py).
+
+Configuration (env):
+    PROMPT_CACHE          auto or off (default: auto)
+    PROMPT_CACHE_MODELS   Comma-separated model prefixes that need breakpoints (default: anthropic/)
+"""
+
+import json
+import os
+from typing import Any, Dict, List
+
+import httpx
+
+PROMPT_CACHE = (os.getenv("PROMPT_CACHE") or "auto").lower()
+PROMPT_CACHE_MODELS = [
+    prefix.strip() for prefix in (os.getenv("PROMPT_CACHE_MODELS") or "anthropic/").split(",") if prefix.strip()
+]
+
+EPHEMERAL = {"type": "ephemeral"}
+
+
+def needs_breakpoints(model: str) -> bool:
+    """True for models that only cache up to explicit breakpoints (also behind LiteLLM's "openai/" route prefix)."""
+    if PROMPT_CACHE == "off" or not model:
+        return False
+    return any(f"/{prefix}" in f"/{model}" for prefix in PROMPT_CACHE_MODELS)
+
+
+def _mark(message: Dict[str, Any]) -> bool:
+    content = message.get("content")
+    if isinstance(content, str) and content:
+        message["content"] = [{"type": "text", "text": content, "cache_control": EPHEMERAL}]
+        return True
+    if isinstance(content, list) and content and isinstance(content[-1], dict) and content[-1].get("type") == "text":
+        content[-1]["cache_control"] = EPHEMERAL
+        return True
+    return False
+
+
+def add_breakpoints(body: Dict[str, Any]) -> int:
+    """Mark the static prefix (and the tool-loop history) of a chat completion body. Returns the breakpoints set."""
+    messages: List[Dict[str, Any]] = body.get("messages") or []
+    if not needs_breakpoints(body.get("model", "")) or not messages:
+        return 0
+    marked = 0
+    if messages[0].get("role") in ("system", "developer"):
+        marked += _mark(messages[0])
+    if any(m.get("role") == "assistant" for m in messages) and messages[-1].get("role") in ("user", "tool"):
+        marked += _mark(messages[-1])
+    return marked
+
+
+class PromptCacheTransport(httpx.AsyncBaseTransport):
+    """Async httpx transport that adds cache breakpoints to chat completion requests."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "POST" and request.url.path.endswith("/chat/completions"):
+            try:
+                body = json.loads(request.read())
+            except ValueError:
+                body = None
+            if isinstance(body, dict) and add_breakpoints(body):
+                headers = [(k, v) for k, v in request.headers.raw if k.lower() != b"content-length"]
+                request = httpx.Request(request.method, request.url, headers=headers,
+                                        content=json.dumps(body).encode("utf-8"), extensions=request.extensions)
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def prompt_cache_transport(transport: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+    """Wrap an async transport with cache breakpoints unless PROMPT_CACHE=off."""
+    return transport if PROMPT_CACHE == "off" else PromptCacheTransport(transport)
+
+
+def litellm_cache_params(model: str) -> Dict[str, Any]:
+    """Extra LiteLLM completion params for a CrewAI LLM: the same system-message breakpoint."""
+    if not needs_breakpoints(model):
+        return {}
+    return {"cache_control_injection_points": [{"location": "message", "role": "system"}]}
@@ -0,0 +1,64 @@
+"""
+Whole-result memoization for topic-based flows (research, meeting prep).
+
+Reports are keyed by flow type, normalized topic and the current date, so
+a cached report never crosses midnight even inside the freshness window.
+Concurrent identical requests share one in-flight run (single-flight).
+
+Configuration (env):
+    REPORT_CACHE_TTL    Freshness window in seconds (default: 21600 = 6 h)
+    REPORT_CACHE_SIZE   Max in-memory reports (default: 128)
+    REPORT_CACHE_DB     Optional SQLite file to persist reports across restarts
+"""
+
+import asyncio
+import os
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from backend.app.core.cache import TTLCache, content_key, normalize_text
+
+
+class ReportCache:
+    def __init__(self, cache: TTLCache):
+        self.cache = cache
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def key(self, flow: str, topic: str) -> str:
+        return content_key(flow, normalize_text(topic), date.today().isoformat())
+
+    async def has(self, flow: str, topic: str) -> bool:
+        """True if a fresh report exists (used to skip the agent rate limit)."""
+        return await self.cache.acontains(self.key(flow, topic))
+
+    async def run(self, flow: str, topic: str, runner: Callable[[], Awaitable[Any]],
+                  force_refresh: bool = False) -> Tuple[Any, bool]:
+        """
+        Return (result, cached). Runs `runner` only if there is no fresh report
+        and no identical run already in flight.
+        """
+        key = self.key(flow, topic)
+        if not force_refresh and (cached := await self.cache.aget(key)) is not None:
+            return cached, True
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run_and_store(key, runner))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shield so one caller disconnecting does not cancel the shared run
+        return await asyncio.shield(task), False
+
+    async def _run_and_store(self, key: str, runner: Callable[[], Awaitable[Any]]) -> Any:
+        result = await runner()
+        await self.cache.aset(key, result)
+        return result
+
+
+report_cache = ReportCache(TTLCache(
+    name="reports",
+    ttl=float(os.getenv("REPORT_CACHE_TTL", 6 * 60 * 60)),
+    max_size=int(os.getenv("REPORT_CACHE_SIZE", 128)),
+    db_path=os.getenv("REPORT_CACHE_DB") or None,
+))
@@ -0,0 +1,240 @@
+"""
+Retry, fallback and circuit breaking for LLM calls.
+
+`call_with_resilience` runs one unit of work (an agent run, a crew kickoff)
+against an ordered list of models:
+
+- Exponential backoff with full jitter, never shorter than the provider's
+  Retry-After header
+- Per-call timeout. Work that runs in a thread (a CrewAI kickoff) keeps
+  running after its timeout, so such callers set `retry_timeouts=False`
+  and the timeout is raised instead of starting a second run beside it
+- Per-request fallback: after a rate limit or when the primary model's
+  circuit is open, later attempts use the next model. Nothing shared is
+  mutated, so other requests keep using the primary model.
+- A circuit breaker per model that opens after repeated failures and lets a
+  single probe call through after a cool-down; other calls keep falling back
+  until the probe succeeds (closed) or fails (open again)
+- Counters for retries, fallbacks, timeouts and open circuits
+
+Configuration (env):
+    LLM_RETRIES             Attempts per call (default: 3)
+    LLM_RETRY_BASE_DELAY    First backoff in seconds (default: 2)
+    LLM_RETRY_MAX_DELAY     Backoff cap in seconds (default: 30)
+    LLM_CALL_TIMEOUT        Per-attempt timeout in seconds (default: 180)
+    LLM_BREAKER_THRESHOLD   Consecutive failures that open a circuit (default: 5)
+    LLM_BREAKER_COOLDOWN    Seconds before a probe is allowed (default: 30)
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, TypeVar
+
+from backend.app.core.events import publish
+
+T = TypeVar("T")
+
+
+@dataclass
+class RetryPolicy:
+    retries: int = int(os.getenv("LLM_RETRIES", 3))
+    base_delay: float = float(os.getenv("LLM_RETRY_BASE_DELAY", 2))
+    max_delay: float = float(os.getenv("LLM_RETRY_MAX_DELAY", 30))
+    timeout: Optional[float] = float(os.getenv("LLM_CALL_TIMEOUT", 180))
+    # False when a timed-out attempt cannot be stopped (its thread keeps running)
+    retry_timeouts: bool = True
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, at least `retry_after`."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return max(delay, retry_after or 0.0)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when every candidate model's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `threshold` consecutive failures -> half-open after `cooldown`.
+
+    In half-open state exactly one probe is admitted. A probe that never
+    reports back (e.g. its request was cancelled) is replaced after another
+    `cooldown`.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may use this model now; in half-open state this admits the probe."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+        now = time.monotonic()
+        if self.probe_at is not None and now - self.probe_at < self.cooldown:
+            return False
+        self.probe_at = now
+        return True
+
+    def release(self):
+        """The probe ended without telling whether the model works (e.g. a non-retryable error)."""
+        self.probe_at = None
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_at = None
+
+    def record_failure(self) -> bool:
+        """Returns True if this failure opened the circuit."""
+        self.failures += 1
+        if self.state == "half_open" or (self.opened_at is None and self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+            self.probe_at = None
+            return True
+        return False
+
+
+_breaker_threshold = int(os.getenv("LLM_BREAKER_THRESHOLD", 5))
+_breaker_cooldown = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))
+breakers: Dict[str, CircuitBreaker] = defaultdict(lambda: CircuitBreaker(_breaker_threshold, _breaker_cooldown))
+
+# {model: {"calls": n, "retries": n, "fallbacks": n, "timeouts": n, "failures": n, "circuit_opened": n}}
+metrics: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+
+def model_key(model: Any) -> str:
+    """Model name for Agents SDK models, LiteLLM LLMs and plain strings."""
+    return getattr(model, "model", None) or str(model)
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None and (response := getattr(exc, "response", None)) is not None:
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    if _status_code(exc) == 429 or type(exc).__name__ == "RateLimitError":
+        return True
+    message = str(exc)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)) or is_rate_limited(exc):
+        return True
+    if type(exc).__name__ in ("APITimeoutError", "APIConnectionError", "Timeout", "ServiceUnavailableError"):
+        return True
+    status = _status_code(exc)
+    return status is not None and status >= 500
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds from the Retry-After header of the failed response, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def call_with_resilience(
+    fn: Callable[[Any], Awaitable[T]],
+    models: Sequence[Any],
+    name: str,
+    policy: Optional[RetryPolicy] = None,
+) -> T:
+    """
+    Call `fn(model)` with retries, falling back along `models` for this call only.
+
+    Args:
+        fn: Does the work with the given model (e.g. runs an agent clone)
+        models: Primary model first, then fallbacks
+        name: Label for logs and events (agent or crew name)
+        policy: Retry/timeout settings
+    """
+    policy = policy or RetryPolicy()
+    index = 0
+    last_error: Optional[BaseException] = None
+
+    attempts = max(1, policy.retries)
+    for attempt in range(attempts):
+        # Skip models whose circuit is open (or half-open with its probe in flight);
+        # stop at the first usable one so only that breaker admits a probe
+        candidate = next((i for i in range(index, len(models)) if breakers[model_key(models[i])].allow()), None)
+        if candidate is None:
+            raise CircuitOpenError(f"All models unavailable for {name}") from last_error
+        if candidate != index:
+            metrics[model_key(models[index])]["fallbacks"] += 1
+            index = candidate
+
+        model = models[index]
+        key = model_key(model)
+        metrics[key]["calls"] += 1
+        try:
+            if policy.timeout:
+                result = await asyncio.wait_for(fn(model), timeout=policy.timeout)
+            else:
+                result = await fn(model)
+            breakers[key].record_success()
+            return result
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                metrics[key]["timeouts"] += 1
+            if not is_retryable(e):
+                breakers[key].release()
+                raise
+            last_error = e
+            metrics[key]["failures"] += 1
+            if breakers[key].record_failure():
+                metrics[key]["circuit_opened"] += 1
+            if attempt == attempts - 1 or (isinstance(e, asyncio.TimeoutError) and not policy.retry_timeouts):
+                raise
+
+            # Rate limited: move this request to the next model
+            if is_rate_limited(e) and index < len(models) - 1:
+                metrics[key]["fallbacks"] += 1
+                index += 1
+
+            wait_time = policy.backoff(attempt, retry_after(e))
+            metrics[key]["retries"] += 1
+            publish(
+                "retry",
+                f"--- {name}: {type(e).__name__} on {key}. Retrying with {model_key(models[index])} "
+                f"in {wait_time:.1f}s... (Attempt {attempt + 1}/{attempts}) ---",
+                agent=name, attempt=attempt + 1, wait=wait_time, model=model_key(models[index]),
+            )
+            await asyncio.sleep(wait_time)
+
+    raise last_error
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "models": {key: dict(values) for key, values in metrics.items()},
+        "breakers": {key: {"state": b.state, "failures": b.failures} for key, b in breakers.items()},
+    }
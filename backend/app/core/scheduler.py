@@ -0,0 +1,198 @@
+"""
+Process-wide scheduler for LLM calls.
+
+Every chat completion sent through the shared AsyncOpenAI client (i.e. every
+turn of every `Runner.run`) first takes a token from the bucket of its
+model. Buckets start from a configured requests-per-minute budget and are
+then re-tuned from the provider's rate-limit response headers, so parallel
+stages start immediately when there is headroom and queue in FIFO order
+when there is not. A 429 with Retry-After pauses the model's bucket.
+
+Configuration (env):
+    LLM_DEFAULT_RPM   Requests per minute per model before headers are seen (default: 15)
+    LLM_BURST         Calls allowed back-to-back when the bucket is full (default: LLM_DEFAULT_RPM)
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Dict, Optional
+
+import httpx
+
+
+def _parse_seconds(value: Optional[str], now: float) -> Optional[float]:
+    """
+    Parse a reset/retry header into seconds from now. Accepts plain seconds,
+    epoch seconds or milliseconds (OpenRouter) and durations like "1m30s" or
+    "250ms" (OpenAI).
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+        if not parts:
+            return None
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        return sum(float(n) * scale[unit] for n, unit in parts)
+    if number > 1e12:   # epoch milliseconds
+        return max(number / 1000 - now, 0.0)
+    if number > 1e9:    # epoch seconds
+        return max(number - now, 0.0)
+    return number
+
+
+def _header(headers: httpx.Headers, *names: str) -> Optional[str]:
+    for name in names:
+        if (value := headers.get(name)) is not None:
+            return value
+    return None
+
+
+class ModelBucket:
+    """Token bucket for one model. Waiters are served in arrival order."""
+
+    def __init__(self, rpm: float, burst: float):
+        self.rate = rpm / 60
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiting = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> float:
+        """Take one token, waiting if needed. Returns seconds spent waiting."""
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self.paused_until - now
+                    if wait <= 0:
+                        if self.tokens >= 1:
+                            self.tokens -= 1
+                            return now - start
+                        wait = (1 - self.tokens) / self.rate
+                    await asyncio.sleep(wait)
+        finally:
+            self.waiting -= 1
+
+    def try_acquire(self) -> bool:
+        """Take one token if one is available right now (never waits)."""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.paused_until or self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def observe(self, limit: Optional[float], remaining: Optional[float], reset_in: Optional[float]):
+        """Re-tune the bucket from the provider's view of our quota."""
+        now = time.monotonic()
+        self._refill(now)
+        if limit:
+            # Providers report the request quota per minute
+            self.rate = limit / 60
+            self.capacity = max(1.0, limit)
+        if remaining is not None:
+            # The provider's count is authoritative (it includes other workers)
+            self.tokens = min(self.capacity, remaining)
+            if remaining < 1 and reset_in:
+                self.pause(reset_in)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class LLMScheduler:
+    def __init__(self, default_rpm: float = 15, burst: Optional[float] = None):
+        self.default_rpm = default_rpm
+        self.burst = burst if burst is not None else default_rpm
+        self.buckets: Dict[str, ModelBucket] = {}
+
+    def bucket(self, model: str) -> ModelBucket:
+        bucket = self.buckets.get(model)
+        if bucket is None:
+            bucket = self.buckets[model] = ModelBucket(self.default_rpm, self.burst)
+        return bucket
+
+    async def acquire(self, model: str) -> float:
+        return await self.bucket(model).acquire()
+
+    def observe(self, model: str, status: int, headers: httpx.Headers):
+        now = time.time()
+        bucket = self.bucket(model)
+
+        def number(*names):
+            value = _header(headers, *names)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        bucket.observe(
+            limit=number("x-ratelimit-limit-requests", "x-ratelimit-limit"),
+            remaining=number("x-ratelimit-remaining-requests", "x-ratelimit-remaining"),
+            reset_in=_parse_seconds(_header(headers, "x-ratelimit-reset-requests", "x-ratelimit-reset"), now),
+        )
+        if status == 429:
+            retry_after = _parse_seconds(headers.get("retry-after"), now)
+            bucket.pause(retry_after if retry_after is not None else 1 / bucket.rate)
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            model: {
+                "tokens": round(bucket.tokens, 2),
+                "capacity": bucket.capacity,
+                "rpm": round(bucket.rate * 60, 2),
+                "waiting": bucket.waiting,
+                "paused_for": round(max(bucket.paused_until - time.monotonic(), 0.0), 2),
+            }
+            for model, bucket in self.buckets.items()
+        }
+
+
+class ScheduledTransport(httpx.AsyncBaseTransport):
+    """httpx transport that routes chat completion requests through the scheduler."""
+
+    def __init__(self, scheduler: LLMScheduler, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.scheduler = scheduler
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        model = None
+        if request.method == "POST" and request.url.path.endswith("/chat/completions"):
+            try:
+                model = json.loads(request.content).get("model")
+            except (ValueError, AttributeError):
+                model = None
+
+        if model is None:
+            return await self.transport.handle_async_request(request)
+
+        await self.scheduler.acquire(model)
+        response = await self.transport.handle_async_request(request)
+        self.scheduler.observe(model, response.status_code, response.headers)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+llm_scheduler = LLMScheduler(
+    default_rpm=float(os.getenv("LLM_DEFAULT_RPM", 15)),
+    burst=float(os.environ["LLM_BURST"]) if os.getenv("LLM_BURST") else None,
+)
@@ -0,0 +1,119 @@
+"""
+Shared, cached access to the Tavily search API.
+
+Both the research squad's `web_search` tool and the CrewAI
+`TavilySearchTool` go through `CachedTavilyClient`, so near-identical
+queries (case, whitespace, trailing punctuation) issued by different
+planners and agents are answered from one cache.
+
+`AsyncTavilySearch` is the non-blocking path used from the event loop: one
+pooled httpx connection to the Tavily REST API, a per-call timeout and a
+semaphore bounding concurrent searches across the whole process.
+
+Configuration (env):
+    SEARCH_CACHE_TTL          Seconds a result stays fresh (default: 21600 = 6 h)
+    SEARCH_CACHE_SIZE         Max in-memory entries (default: 512)
+    SEARCH_CACHE_DB           Optional SQLite file to persist results across restarts
+    SEARCH_TIMEOUT            Per-call timeout in seconds (default: 30)
+    SEARCH_MAX_CONCURRENCY    Max in-flight searches per process (default: 5)
+    TAVILY_BASE_URL           API endpoint for both clients (default: https://api.tavily.com)
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+from tavily import TavilyClient
+from backend.app.core.cache import TTLCache, content_key, normalize_text
+from backend.app.core.cassette import cassette
+
+TAVILY_BASE_URL = (os.getenv("TAVILY_BASE_URL") or "https://api.tavily.com").rstrip("/")
+
+search_cache = TTLCache(
+    name="tavily",
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", 6 * 60 * 60)),
+    max_size=int(os.getenv("SEARCH_CACHE_SIZE", 512)),
+    db_path=os.getenv("SEARCH_CACHE_DB") or None,
+)
+
+
+def _cache_key(query: str, params: Dict[str, Any]) -> str:
+    return content_key(normalize_text(query), **params)
+
+
+class CachedTavilyClient:
+    """Drop-in wrapper for TavilyClient whose `search` is served from `search_cache`."""
+
+    def __init__(self, client: TavilyClient, cache: TTLCache = search_cache):
+        self.client = client
+        self.cache = cache
+
+    def search(self, query: str, **params: Any) -> Dict[str, Any]:
+        key = _cache_key(query, params)
+        if (cached := self.cache.get(key)) is not None:
+            return cached
+
+        response = cassette.call("tavily", {"query": query, **params}, lambda: self.client.search(query=query, **params))
+        self.cache.set(key, response)
+        return response
+
+    def __getattr__(self, name: str):
+        # Everything except search (extract, crawl, ...) goes straight to Tavily
+        return getattr(self.client, name)
+
+
+tavily = CachedTavilyClient(TavilyClient(api_key=os.getenv("TAVILY_API_KEY"), api_base_url=TAVILY_BASE_URL))
+
+
+class AsyncTavilySearch:
+    """Non-blocking Tavily search sharing `search_cache` with the sync client."""
+
+    def __init__(self, api_key: Optional[str], cache: TTLCache = search_cache,
+                 base_url: str = "https://api.tavily.com", timeout: float = 30.0, max_concurrency: int = 5):
+        self.api_key = api_key
+        self.cache = cache
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def _client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the running event loop
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=httpx.Limits(max_keepalive_connections=self.max_concurrency),
+            )
+        return self._http
+
+    async def search(self, query: str, **params: Any) -> Dict[str, Any]:
+        key = _cache_key(query, params)
+        if (cached := await self.cache.aget(key)) is not None:
+            return cached
+
+        async def fetch() -> Dict[str, Any]:
+            async with self._semaphore:
+                response = await self._client().post("/search", json={"query": query, **params})
+            response.raise_for_status()
+            return response.json()
+
+        data = await cassette.acall("tavily", {"query": query, **params}, fetch)
+        await self.cache.aset(key, data)
+        return data
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+async_tavily = AsyncTavilySearch(
+    api_key=os.getenv("TAVILY_API_KEY"),
+    base_url=TAVILY_BASE_URL,
+    timeout=float(os.getenv("SEARCH_TIMEOUT", 30)),
+    max_concurrency=int(os.getenv("SEARCH_MAX_CONCURRENCY", 5)),
+)
@@ -0,0 +1,175 @@
+"""
+Per-run index of web sources for citation and deduplication.
+
+Parallel Search Analysts often get the same pages (or syndicated copies of
+them) back from Tavily. Every result of a run goes through one SourceIndex:
+
+- URLs are normalized (scheme, www., tracking parameters, fragments,
+  trailing slashes), so the same page found by two searches is one source
+- Content is fingerprinted with MinHash over word shingles, so
+  near-identical passages under different URLs collapse into one source
+- Each unique source gets a stable citation number for the whole run
+
+Only unseen passages are passed on to the analysts; repeats are replaced by
+a reference to the existing citation number. The characters (and estimated
+tokens) that were not sent again are reported per run.
+
+Configuration (env):
+    SOURCE_DEDUP_THRESHOLD   Estimated Jaccard similarity treated as duplicate (default: 0.8)
+"""
+
+import functools
+import os
+import re
+import zlib
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+SHINGLE_SIZE = 5
+NUM_HASHES = 64
+DEDUP_THRESHOLD = float(os.getenv("SOURCE_DEDUP_THRESHOLD", 0.8))
+
+# Rough chars-per-token for English prose; good enough for savings reports
+CHARS_PER_TOKEN = 4
+
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid"}
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed coefficients so fingerprints are stable across processes
+_COEFFS = [((i * 0x9E3779B1 + 1) % _PRIME, (i * 0x85EBCA77 + 7) % _PRIME) for i in range(1, NUM_HASHES + 1)]
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL for identity checks."""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    path = re.sub(r"/+", "/", parts.path).rstrip("/")
+    # http/https variants of a page are the same source
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Overlapping word n-grams of the normalized text."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(items: Set[str]) -> Tuple[int, ...]:
+    """MinHash signature; the share of equal slots estimates Jaccard similarity."""
+    if not items:
+        return ()
+    hashes = [zlib.crc32(item.encode("utf-8")) for item in items]
+    return tuple(min((a * h + b) % _PRIME & _MAX_HASH for h in hashes) for a, b in _COEFFS)
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+@dataclass
+class Source:
+    number: int
+    url: str
+    title: str
+    content: str = field(repr=False)
+    signature: Tuple[int, ...] = field(repr=False)
+    queries: List[str] = field(default_factory=list)
+    aliases: List[str] = field(default_factory=list)
+
+
+class SourceIndex:
+    """Unique sources seen during one flow run, numbered in discovery order."""
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self.sources: List[Source] = []
+        self.by_url: Dict[str, Source] = {}
+        self.results = 0
+        self.duplicate_urls = 0
+        self.near_duplicates = 0
+        self.chars_saved = 0
+
+    def _near_duplicate(self, signature: Tuple[int, ...]) -> Optional[Source]:
+        # A run has at most a few dozen sources, so a linear scan beats LSH banding here
+        best, best_score = None, self.threshold
+        for source in self.sources:
+            score = similarity(signature, source.signature)
+            if score >= best_score:
+                best, best_score = source, score
+        return best
+
+    def add(self, result: Dict[str, Any], query: str = "") -> Tuple[Source, bool]:
+        """Index one search result. Returns (source, is_new)."""
+        self.results += 1
+        url = normalize_url(result.get("url", ""))
+        content = result.get("content") or ""
+
+        source = self.by_url.get(url)
+        if source is not None:
+            self.duplicate_urls += 1
+        else:
+            signature = minhash(shingles(content))
+            source = self._near_duplicate(signature)
+            if source is not None:
+                self.near_duplicates += 1
+                source.aliases.append(result.get("url", ""))
+                self.by_url[url] = source
+            else:
+                source = Source(len(self.sources) + 1, result.get("url", ""), result.get("title", ""), content, signature)
+                self.sources.append(source)
+                self.by_url[url] = source
+                source.queries.append(query)
+                return source, True
+
+        self.chars_saved += len(content)
+        if query not in source.queries:
+            source.queries.append(query)
+        return source, False
+
+    def citations(self) -> str:
+        """Numbered source list for the writer."""
+        return "\n".join(f"[{s.number}] {s.title} ({s.url})" for s in self.sources)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "results": self.results,
+            "unique_sources": len(self.sources),
+            "duplicate_urls": self.duplicate_urls,
+            "near_duplicates": self.near_duplicates,
+            "chars_saved": self.chars_saved,
+            "tokens_saved": self.chars_saved // CHARS_PER_TOKEN,
+        }
+
+
+_current_index: ContextVar[Optional[SourceIndex]] = ContextVar("source_index", default=None)
+
+
+def current_index() -> Optional[SourceIndex]:
+    return _current_index.get()
+
+
+def collect_sources(fn):
+    """Decorator for flow entry points: each run gets its own SourceIndex."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        token = _current_index.set(SourceIndex())
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            _current_index.reset(token)
+    return wrapper
@@ -70,26 +70,52 @@ def convert_to_html(markdown_content: str, topic: str, md_filepath: str) -> str:
         print(f"HTML conversion failed: {e}")
         return ""
 
-async def agent_run_with_retry(runner, agent, task, retries=3, delay=5):
-    """Run an agent task with basic retry logic and model fallback for 429 errors."""
-    import asyncio
+async def _run_streamed(runner, agent, task):
+    """Run an agent with token streaming, publishing each text delta as an event."""
+    from openai.types.responses import ResponseTextDeltaEvent
+    from backend.app.core.events import publish
+
+    result = runner.run_streamed(agent, task)
+    async for event in result.stream_events():
+        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+            publish("token", agent=agent.name, delta=event.data.delta)
+    return result
+
+async def agent_run_with_retry(runner, agent, task, retries=None, stream=False, fallback_models=None):
+    """Run an agent task through the resilience layer (core/resilience.py).
+
+    Retries with backoff and, on rate limits, falls back to the budget model
+    for this call only - the shared agent is never modified.
+    With stream=True and a client listening (see core/events.py), output tokens
+    are published as they arrive.
+    """
+    import time
     from backend.app.core.config import budget_model
-    
-    for i in range(retries):
-        try:
-            return await runner.run(agent, task)
-        except Exception as e:
-            error_msg = str(e)
-            if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
-                if i < retries - 1:
-                    wait_time = delay * (i + 1)
-                    print(f"--- Agent {agent.name} Rate Limit hit (429). Switching to budget model and retrying in {wait_time}s... (Attempt {i+1}/{retries}) ---")
-                    
-                    # Fallback to budget model if possible
-                    if hasattr(agent, 'model'):
-                        agent.model = budget_model
-                        
-                    await asyncio.sleep(wait_time)
-                    continue
-            raise e
+    from backend.app.core.events import bus
+    from backend.app.core.metrics import record_stage
+    from backend.app.core.resilience import RetryPolicy, call_with_resilience, model_key
+
+    models = [agent.model, *(fallback_models if fallback_models is not None else [budget_model])]
+    used = {}
+
+    async def attempt(model):
+        used["model"] = model
+        run_agent = agent if model is agent.model else agent.clone(model=model)
+        if stream and bus.streaming():
+            return await _run_streamed(runner, run_agent, task)
+        return await runner.run(run_agent, task)
+
+    policy = RetryPolicy() if retries is None else RetryPolicy(retries=retries)
+    started = time.perf_counter()
+    result = await call_with_resilience(attempt, models, agent.name, policy)
 
+    usage = getattr(getattr(result, "context_wrapper", None), "usage", None)
+    record_stage(
+        agent.name,
+        time.perf_counter() - started,
+        model=model_key(used["model"]),
+        input_tokens=getattr(usage, "input_tokens", 0) or 0,
+        output_tokens=getattr(usage, "output_tokens", 0) or 0,
+        cached_input_tokens=getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", 0) or 0,
+    )
+    return result
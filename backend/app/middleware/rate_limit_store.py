@@ -0,0 +1,253 @@
+"""
+Storage backends for the rate limiter.
+
+A store keeps sliding-window counters per (client, scope, window) and
+performs the check-and-increment for one request atomically:
+
+- MemoryRateLimitStore: process-local, for single-worker deployments
+- RedisRateLimitStore: shared across workers/instances, one round trip
+  per request via a Lua script
+
+Set RATE_LIMIT_REDIS_URL (e.g. redis://localhost:6379/0) to share limits
+between `uvicorn --workers N` processes.
+"""
+
+import math
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# (scope, window seconds, limit)
+Check = Tuple[str, int, int]
+# (scope, window seconds)
+Record = Tuple[str, int]
+
+
+def bucket_start(now: float, window: int) -> float:
+    """Start of the fixed window containing `now`."""
+    return now - (now % window)
+
+
+def overlap(now: float, window: int) -> float:
+    """Fraction of the previous fixed window still inside the trailing window."""
+    return 1 - (now - bucket_start(now, window)) / window
+
+
+def whole_count(estimate: float) -> int:
+    """Round an estimate up, ignoring float noise (e.g. 4.0000001 stays 4)."""
+    return math.ceil(round(estimate, 6))
+
+
+class SlidingWindowCounter:
+    """
+    Approximate request count over a trailing window.
+
+    Keeps only the count of the current fixed window and the one before it.
+    The estimate weights the previous bucket by how much of it still
+    overlaps the trailing window.
+    """
+
+    __slots__ = ("window", "start", "current", "previous")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.start = 0.0
+        self.current = 0
+        self.previous = 0
+
+    def _roll(self, now: float):
+        """Advance the buckets if `now` has moved into a new fixed window."""
+        start = bucket_start(now, self.window)
+        if start != self.start:
+            # Previous bucket survives only if it is the directly preceding window
+            self.previous = self.current if start - self.start == self.window else 0
+            self.current = 0
+            self.start = start
+
+    def count(self, now: float) -> float:
+        """Estimated number of requests in the trailing window."""
+        self._roll(now)
+        return self.previous * overlap(now, self.window) + self.current
+
+    def add(self, now: float, amount: int = 1):
+        self._roll(now)
+        self.current += amount
+
+
+class _KeyState:
+    """All counters for a single client plus the last time it was seen."""
+
+    __slots__ = ("counters", "last_seen")
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, int], SlidingWindowCounter] = {}
+        self.last_seen = 0.0
+
+    def counter(self, scope: str, window: int) -> SlidingWindowCounter:
+        key = (scope, window)
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = SlidingWindowCounter(window)
+        return counter
+
+
+class RateLimitStore(ABC):
+    """Interface for rate limit storage backends."""
+
+    @abstractmethod
+    async def hit(self, key: str, checks: Sequence[Check], records: Sequence[Record],
+                  now: float, amount: int = 1) -> Tuple[int, List[int]]:
+        """
+        Atomically evaluate `checks` and, if none would be exceeded by
+        `amount` more requests, increment `records` by `amount`.
+
+        Returns:
+            (violated, counts) where violated is the index of the first
+            exceeded check or -1, and counts are the current counts for the
+            evaluated checks (before this request is recorded).
+        """
+
+    @abstractmethod
+    async def counts(self, key: str, windows: Sequence[Record], now: float) -> List[int]:
+        """Current counts for the given windows without recording anything."""
+
+    async def sweep(self, now: float, idle_ttl: float) -> int:
+        """Evict clients idle for longer than `idle_ttl`. Returns number evicted."""
+        return 0
+
+    async def close(self):
+        pass
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """
+    Process-local store. Memory per client is bounded by the number of
+    configured windows, independent of request volume.
+    """
+
+    def __init__(self):
+        # Store: {client_key: _KeyState}
+        self.keys: Dict[str, _KeyState] = {}
+
+    def _count(self, state: _KeyState, scope: str, window: int, now: float) -> int:
+        return whole_count(state.counter(scope, window).count(now))
+
+    async def hit(self, key, checks, records, now, amount=1):
+        state = self.keys.get(key)
+        if state is None:
+            state = self.keys[key] = _KeyState()
+        state.last_seen = now
+
+        counts = []
+        for index, (scope, window, limit) in enumerate(checks):
+            count = self._count(state, scope, window, now)
+            counts.append(count)
+            if count + amount > limit:
+                return index, counts
+
+        for scope, window in records:
+            state.counter(scope, window).add(now, amount)
+        return -1, counts
+
+    async def counts(self, key, windows, now):
+        state = self.keys.get(key) or _KeyState()
+        return [self._count(state, scope, window, now) for scope, window in windows]
+
+    async def sweep(self, now, idle_ttl):
+        cutoff = now - idle_ttl
+        idle = [key for key, state in self.keys.items() if state.last_seen < cutoff]
+        for key in idle:
+            del self.keys[key]
+        return len(idle)
+
+
+# KEYS: [cur_1, prev_1, ..., cur_n, prev_n, record_1, ..., record_m]
+# ARGV: [n, amount, overlap_1, limit_1, ..., overlap_n, limit_n, ttl_1, ..., ttl_m]
+_HIT_SCRIPT = """
+local ncheck = tonumber(ARGV[1])
+local amount = tonumber(ARGV[2])
+local counts = {}
+for c = 1, ncheck do
+  local cur = tonumber(redis.call('GET', KEYS[2 * c - 1]) or '0')
+  local prev = tonumber(redis.call('GET', KEYS[2 * c]) or '0')
+  local weight = tonumber(ARGV[2 * c + 1])
+  local limit = tonumber(ARGV[2 * c + 2])
+  local count = math.ceil(prev * weight + cur - 0.000001)
+  counts[c] = count
+  if count + amount > limit then
+    return {c - 1, counts}
+  end
+end
+local offset = 2 * ncheck
+for r = 1, #KEYS - offset do
+  redis.call('INCRBY', KEYS[offset + r], amount)
+  redis.call('EXPIRE', KEYS[offset + r], ARGV[offset + 2 + r])
+end
+return {-1, counts}
+"""
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """
+    Shared store on any Redis-protocol server (Redis, Valkey, fakeredis).
+
+    Each fixed window bucket is a plain integer key that expires after two
+    windows, so idle clients are evicted by the server itself. The whole
+    check-and-increment runs server-side in one EVALSHA round trip.
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit"):
+        # `client` is a redis.asyncio.Redis (or compatible) instance
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(_HIT_SCRIPT)
+
+    def _key(self, key: str, scope: str, window: int, start: float) -> str:
+        return f"{self.prefix}:{key}:{scope}:{window}:{int(start)}"
+
+    async def hit(self, key, checks, records, now, amount=1):
+        keys: List[str] = []
+        args: List = [len(checks), amount]
+        for scope, window, limit in checks:
+            start = bucket_start(now, window)
+            keys += [self._key(key, scope, window, start), self._key(key, scope, window, start - window)]
+            args += [repr(overlap(now, window)), limit]
+        for scope, window in records:
+            keys.append(self._key(key, scope, window, bucket_start(now, window)))
+            args.append(2 * window)
+
+        violated, counts = await self._script(keys=keys, args=args)
+        return int(violated), [int(c) for c in counts]
+
+    async def counts(self, key, windows, now):
+        pipe = self.client.pipeline(transaction=False)
+        for scope, window in windows:
+            start = bucket_start(now, window)
+            pipe.get(self._key(key, scope, window, start))
+            pipe.get(self._key(key, scope, window, start - window))
+        values = await pipe.execute()
+
+        result = []
+        for i, (_, window) in enumerate(windows):
+            cur, prev = int(values[2 * i] or 0), int(values[2 * i + 1] or 0)
+            result.append(whole_count(prev * overlap(now, window) + cur))
+        return result
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_store(url: Optional[str] = None) -> RateLimitStore:
+    """Build the store selected by RATE_LIMIT_REDIS_URL (in-memory if unset)."""
+    url = url or os.getenv("RATE_LIMIT_REDIS_URL")
+    if not url:
+        return MemoryRateLimitStore()
+
+    try:
+        import redis.asyncio as redis
+    except ImportError as e:
+        raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the 'redis' package is not installed") from e
+
+    print(f"Rate limiter: using shared Redis store at {url.split('@')[-1]}")
+    return RedisRateLimitStore(redis.Redis.from_url(url))
@@ -5,26 +5,60 @@ Designed for portfolio demo with user-friendly limits:
 - Allows thorough testing of all features
 - Prevents API abuse and cost overruns
 - Provides clear feedback when limits are reached
+
+Each (ip, scope, window) pair is tracked with a sliding-window counter:
+two integer buckets (previous and current window) whose weighted sum
+approximates the number of requests in the trailing window. Checking and
+recording a request is a single O(1) pass and memory per IP is bounded
+by the number of configured windows, independent of request volume.
+
+Counters live in a pluggable store (see rate_limit_store.py). The default
+is in-memory; set RATE_LIMIT_REDIS_URL to share limits across workers.
+
+Batch endpoints charge the agent budget themselves, once per batch, with
+a cost set by BATCH_RATE_LIMIT_POLICY:
+    per_item   one agent request per prospect
+    per_chunk  one agent request per BATCH_CHUNK_SIZE prospects (default)
+    per_batch  one agent request per batch
+A batch costing more than the smallest agent limit could never be admitted,
+so batches are capped at max_batch_items() prospects (25 with the defaults).
 """
 
-from fastapi import Request, HTTPException
+from fastapi import Request
 from fastapi.responses import JSONResponse
-from datetime import datetime, timedelta
-from collections import defaultdict
-from typing import Dict, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import math
+import os
 import time
 
+from backend.app.middleware.rate_limit_store import RateLimitStore, create_store
+from backend.app.core.metrics import RATE_LIMIT_REJECTIONS
+
+
+# Windows in seconds
+MINUTE = 60
+QUARTER_HOUR = 15 * 60
+HOUR = 60 * 60
+DAY = 24 * 60 * 60
+
 
 class RateLimiter:
     """
-    In-memory rate limiter for demo purposes.
-    For production, consider Redis-backed solution.
+    Sliding-window rate limiter on top of a RateLimitStore.
+
+    Agent requests are counted in the "agent" scope and also in the "total"
+    scope, so general limits apply to all traffic from an IP while agent
+    limits only apply to agent runs.
     """
-    
-    def __init__(self):
-        # Store: {ip_address: [(timestamp, endpoint), ...]}
-        self.requests: Dict[str, list] = defaultdict(list)
-        
+
+    def __init__(self, store: Optional[RateLimitStore] = None,
+                 clock: Callable[[], float] = time.time, sweep_interval: int = 5 * 60):
+        self.store = store or create_store()
+        self.clock = clock
+        self.sweep_interval = sweep_interval
+        self._sweeper: Optional[asyncio.Task] = None
+
         # Rate limits optimized for thorough testing
         self.limits = {
             # Agent endpoints - allow thorough testing but prevent abuse
@@ -39,145 +73,213 @@ class RateLimiter:
                 "per_hour": 500,   # 500 requests per hour
             }
         }
-    
-    def _clean_old_requests(self, ip: str, cutoff_time: datetime):
-        """Remove requests older than cutoff time."""
-        if ip in self.requests:
-            self.requests[ip] = [
-                (ts, endpoint) for ts, endpoint in self.requests[ip]
-                if ts > cutoff_time
-            ]
-    
-    def _count_requests(self, ip: str, since: datetime, endpoint_type: str = None) -> int:
-        """Count requests from IP since given time, optionally filtered by endpoint type."""
-        if ip not in self.requests:
-            return 0
-        
-        if endpoint_type:
-            return sum(
-                1 for ts, ep in self.requests[ip]
-                if ts > since and ep == endpoint_type
-            )
-        return sum(1 for ts, _ in self.requests[ip] if ts > since)
-    
-    def check_rate_limit(self, ip: str, endpoint_type: str = "general") -> Tuple[bool, str]:
+
+        # (limit name, scope, window, message) checked in order for each endpoint type
+        self.rules: Dict[str, List[Tuple[str, str, int, str]]] = {
+            "agent": [
+                ("per_15min", "agent", QUARTER_HOUR,
+                 "Rate limit exceeded: {limit} agent requests per 15 minutes. Please wait before trying again."),
+                ("per_hour", "agent", HOUR,
+                 "Rate limit exceeded: {limit} agent requests per hour. Please try again later."),
+                ("per_day", "agent", DAY,
+                 "Daily rate limit exceeded: {limit} agent requests per day. Please try again tomorrow."),
+            ],
+            "general": [
+                ("per_minute", "total", MINUTE, "Too many requests. Please slow down."),
+                ("per_hour", "total", HOUR, "Hourly rate limit exceeded. Please try again later."),
+            ],
+        }
+
+        # Counters incremented when a request of each type is recorded
+        self.recorded_windows: Dict[str, List[Tuple[str, int]]] = {
+            "agent": [("agent", QUARTER_HOUR), ("agent", HOUR), ("agent", DAY),
+                      ("total", MINUTE), ("total", HOUR)],
+            "general": [("total", MINUTE), ("total", HOUR)],
+        }
+
+        # Keys idle for longer than the longest window hold no useful state
+        self.idle_ttl = DAY
+
+        # Async predicates; an agent request matching one is charged as general traffic
+        self.exemptions: List[Callable[[Request], Awaitable[bool]]] = []
+
+        # How many agent requests a batch of N prospects costs
+        self.batch_policy = os.getenv("BATCH_RATE_LIMIT_POLICY", "per_chunk")
+        self.batch_chunk_size = int(os.getenv("BATCH_CHUNK_SIZE", 5))
+
+    def exempt(self, predicate: Callable[[Request], Awaitable[bool]]):
+        """Register an exemption from the agent budget (usable as a decorator)."""
+        self.exemptions.append(predicate)
+        return predicate
+
+    async def is_exempt(self, request: Request) -> bool:
+        for predicate in self.exemptions:
+            if await predicate(request):
+                return True
+        return False
+
+    def _checks(self, endpoint_type: str) -> List[Tuple[str, int, int]]:
+        return [
+            (scope, window, self.limits[endpoint_type][name])
+            for name, scope, window, _ in self.rules[endpoint_type]
+        ]
+
+    def batch_cost(self, items: int) -> int:
+        """Agent requests charged for a batch of `items` prospects."""
+        if self.batch_policy == "per_item":
+            return items
+        if self.batch_policy == "per_batch":
+            return 1
+        if self.batch_policy == "per_chunk":
+            return math.ceil(items / self.batch_chunk_size)
+        raise ValueError(f"Unknown BATCH_RATE_LIMIT_POLICY: {self.batch_policy}")
+
+    def max_batch_items(self) -> Optional[int]:
+        """Largest batch whose cost fits the smallest agent limit (None if any size fits)."""
+        budget = min(self.limits["agent"].values())
+        if self.batch_policy == "per_item":
+            return budget
+        if self.batch_policy == "per_chunk":
+            return budget * self.batch_chunk_size
+        return None
+
+    async def _hit(self, ip: str, endpoint_type: str, records, amount: int = 1) -> Tuple[bool, str, Dict[str, int]]:
+        rules = self.rules[endpoint_type]
+        violated, counts = await self.store.hit(ip, self._checks(endpoint_type), records, self.clock(), amount)
+        if violated >= 0:
+            name, _, _, message = rules[violated]
+            return False, message.format(limit=self.limits[endpoint_type][name]), {}
+
+        recorded = amount if records else 0
+        remaining = {
+            name: self.limits[endpoint_type][name] - count - recorded
+            for (name, _, _, _), count in zip(rules, counts)
+        }
+        return True, "OK", remaining
+
+    async def hit(self, ip: str, endpoint_type: str = "general", amount: int = 1) -> Tuple[bool, str, Dict[str, int]]:
+        """
+        Check and record a request in a single pass (one store round trip).
+
+        `amount` charges several requests at once (used by batch endpoints);
+        nothing is recorded unless all of them fit.
+
+        Returns:
+            (allowed, message, remaining) where remaining maps each limit
+            name to the requests left after this one.
+        """
+        return await self._hit(ip, endpoint_type, self.recorded_windows[endpoint_type], amount)
+
+    async def check_rate_limit(self, ip: str, endpoint_type: str = "general") -> Tuple[bool, str]:
         """
         Check if request should be allowed.
-        
+
         Args:
             ip: Client IP address
             endpoint_type: "agent" or "general"
-            
+
         Returns:
             (allowed: bool, message: str)
         """
-        now = datetime.now()
-        
-        # Clean up old requests (older than 24 hours)
-        self._clean_old_requests(ip, now - timedelta(days=1))
-        
-        if endpoint_type == "agent":
-            limits = self.limits["agent"]
-            
-            # Check 15-minute limit
-            count_15min = self._count_requests(ip, now - timedelta(minutes=15), "agent")
-            if count_15min >= limits["per_15min"]:
-                return False, f"Rate limit exceeded: {limits['per_15min']} agent requests per 15 minutes. Please wait before trying again."
-            
-            # Check hourly limit
-            count_hour = self._count_requests(ip, now - timedelta(hours=1), "agent")
-            if count_hour >= limits["per_hour"]:
-                return False, f"Rate limit exceeded: {limits['per_hour']} agent requests per hour. Please try again later."
-            
-            # Check daily limit
-            count_day = self._count_requests(ip, now - timedelta(days=1), "agent")
-            if count_day >= limits["per_day"]:
-                return False, f"Daily rate limit exceeded: {limits['per_day']} agent requests per day. Please try again tomorrow."
-        
-        else:  # general endpoints
-            limits = self.limits["general"]
-            
-            # Check per-minute limit
-            count_minute = self._count_requests(ip, now - timedelta(minutes=1))
-            if count_minute >= limits["per_minute"]:
-                return False, "Too many requests. Please slow down."
-            
-            # Check hourly limit
-            count_hour = self._count_requests(ip, now - timedelta(hours=1))
-            if count_hour >= limits["per_hour"]:
-                return False, "Hourly rate limit exceeded. Please try again later."
-        
-        return True, "OK"
-    
-    def record_request(self, ip: str, endpoint_type: str = "general"):
+        allowed, message, _ = await self._hit(ip, endpoint_type, [])
+        return allowed, message
+
+    async def record_request(self, ip: str, endpoint_type: str = "general"):
         """Record a successful request."""
-        self.requests[ip].append((datetime.now(), endpoint_type))
-    
-    def get_usage_stats(self, ip: str) -> dict:
+        await self.store.hit(ip, [], self.recorded_windows[endpoint_type], self.clock())
+
+    async def get_usage_stats(self, ip: str) -> dict:
         """Get current usage statistics for an IP (useful for debugging/monitoring)."""
-        now = datetime.now()
-        
+        windows = [("agent", QUARTER_HOUR), ("agent", HOUR), ("agent", DAY), ("total", MINUTE), ("total", HOUR)]
+        last_15min, agent_hour, agent_day, total_minute, total_hour = await self.store.counts(ip, windows, self.clock())
+
         return {
             "agent_requests": {
-                "last_15min": self._count_requests(ip, now - timedelta(minutes=15), "agent"),
-                "last_hour": self._count_requests(ip, now - timedelta(hours=1), "agent"),
-                "last_day": self._count_requests(ip, now - timedelta(days=1), "agent"),
+                "last_15min": last_15min,
+                "last_hour": agent_hour,
+                "last_day": agent_day,
             },
             "total_requests": {
-                "last_minute": self._count_requests(ip, now - timedelta(minutes=1)),
-                "last_hour": self._count_requests(ip, now - timedelta(hours=1)),
+                "last_minute": total_minute,
+                "last_hour": total_hour,
             },
             "limits": self.limits
         }
 
+    async def sweep(self) -> int:
+        """Evict clients that have been idle longer than the longest window."""
+        return await self.store.sweep(self.clock(), self.idle_ttl)
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            evicted = await self.sweep()
+            if evicted:
+                print(f"Rate limiter: evicted {evicted} idle clients")
+
+    def start_sweeper(self):
+        """Start the background sweeper on the running event loop (idempotent)."""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_forever())
+
+    async def close(self):
+        """Stop the sweeper and release the store's connections."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        await self.store.close()
+
 
 # Global rate limiter instance
 rate_limiter = RateLimiter()
 
 
+def rate_limit_response(message: str, endpoint_type: str) -> JSONResponse:
+    """429 response for a rejected request."""
+    RATE_LIMIT_REJECTIONS.inc(type=endpoint_type)
+    return JSONResponse(
+        status_code=429,
+        content={
+            "error": "Rate limit exceeded",
+            "message": message,
+            "type": endpoint_type,
+            "hint": "This is a demo application with usage limits to prevent abuse. Thank you for understanding!"
+        }
+    )
+
+
 async def rate_limit_middleware(request: Request, call_next):
     """
     Middleware to apply rate limiting to all requests.
     """
     # Get client IP
     client_ip = request.client.host
-    
+
     # Determine endpoint type
     path = request.url.path
     endpoint_type = "agent" if any(x in path for x in ["/api/sales/", "/api/research", "/api/meeting-prep"]) else "general"
-    
+
     # Skip rate limiting for health checks and static files
-    if path in ["/", "/health", "/api/config/auth-enabled"]:
+    if path in ["/", "/health", "/metrics", "/api/config/auth-enabled"]:
         return await call_next(request)
-    
-    # Check rate limit
-    allowed, message = rate_limiter.check_rate_limit(client_ip, endpoint_type)
-    
+
+    # Agent requests that will not run agents (e.g. cached reports) count as general traffic
+    if endpoint_type == "agent" and await rate_limiter.is_exempt(request):
+        endpoint_type = "general"
+
+    # Check and record the request in one pass
+    allowed, message, remaining = await rate_limiter.hit(client_ip, endpoint_type)
+
     if not allowed:
-        return JSONResponse(
-            status_code=429,
-            content={
-                "error": "Rate limit exceeded",
-                "message": message,
-                "type": endpoint_type,
-                "hint": "This is a demo application with usage limits to prevent abuse. Thank you for understanding!"
-            }
-        )
-    
-    # Record the request
-    rate_limiter.record_request(client_ip, endpoint_type)
-    
+        return rate_limit_response(message, endpoint_type)
+
     # Continue with the request
     response = await call_next(request)
-    
+
     # Add rate limit headers for transparency
-    stats = rate_limiter.get_usage_stats(client_ip)
     if endpoint_type == "agent":
-        response.headers["X-RateLimit-Remaining-15min"] = str(
-            rate_limiter.limits["agent"]["per_15min"] - stats["agent_requests"]["last_15min"]
-        )
-        response.headers["X-RateLimit-Remaining-Day"] = str(
-            rate_limiter.limits["agent"]["per_day"] - stats["agent_requests"]["last_day"]
-        )
-    
+        response.headers["X-RateLimit-Remaining-15min"] = str(remaining["per_15min"])
+        response.headers["X-RateLimit-Remaining-Day"] = str(remaining["per_day"])
+
     return response
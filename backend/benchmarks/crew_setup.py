@@ -0,0 +1,57 @@
+"""
+Per-request setup cost of the Meeting Prep crew.
+
+Compares building a fresh MeetingPrepCrew for every request (YAML parsing,
+three Agents, the Tavily tool and the Crew) with copying the prebuilt
+template from `crew_factory`. No LLM or search calls are made.
+
+Usage:
+    python -m backend.benchmarks.crew_setup [iterations]
+"""
+
+import os
+import statistics
+import sys
+import time
+
+# Construction only - dummy keys are enough
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+
+from backend.app.agents.meeting_prep.src.meeting_prep.crew import MeetingPrepCrew, CrewFactory
+from backend.app.core.config import crew_llm
+
+
+def measure(build, iterations: int) -> dict:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        build()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": round(statistics.mean(samples), 2),
+        "p50_ms": round(samples[len(samples) // 2], 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 2),
+    }
+
+
+def main(iterations: int = 50):
+    factory = CrewFactory()
+
+    started = time.perf_counter()
+    factory.warm([crew_llm])
+    warm_ms = (time.perf_counter() - started) * 1000
+
+    before = measure(lambda: MeetingPrepCrew(llm=crew_llm).crew(), iterations)
+    after = measure(lambda: factory.crew(crew_llm), iterations)
+
+    print(f"One-time template build: {warm_ms:.2f} ms")
+    print(f"{'':<28}{'mean':>10}{'p50':>10}{'p95':>10}")
+    for name, stats in (("rebuild per request", before), ("copy prebuilt template", after)):
+        print(f"{name:<28}{stats['mean_ms']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}")
+    print(f"Speed-up: {before['mean_ms'] / after['mean_ms']:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,389 @@
+"""
+Local stand-in for the external APIs the flows call, for benchmarks.
+
+One server plays three upstreams:
+    /v1/chat/completions   OpenAI-compatible endpoint (OPENAI_BASE_URL=<root>/v1),
+                           used by the Agents SDK client and LiteLLM/CrewAI
+    /tavily/search         Tavily search (TAVILY_BASE_URL=<root>/tavily)
+    /resend/emails[/batch] Resend (RESEND_BASE_URL=<root>/resend)
+
+Replies are shaped the way the flows need them: JSON matching the requested
+response_format or forced tool schema, one call to the first offered tool
+before answering (Agents SDK tools and CrewAI's ReAct "Action:" format),
+SSE chunks for stream=True, token usage and x-ratelimit-* headers.
+Usage reports a repeated prompt prefix as cached tokens: up to the last
+cache_control breakpoint, or the system message for models that cache
+automatically.
+
+Each upstream has its own profile: a latency distribution plus the share of
+calls answered with 500 or with 429 + Retry-After. Latency specs:
+    fixed:0.5            always 0.5 s
+    uniform:0.2,1.5      uniform between 0.2 and 1.5 s
+    lognormal:0.8,0.5    median 0.8 s, sigma 0.5 (long right tail, like real LLMs)
+
+Usage:
+    python -m backend.benchmarks.fake_upstream --port 8900 --llm-latency lognormal:1,0.5 --llm-429 0.05
+
+GET /_stats returns calls per upstream and status.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "team growth pipeline customers revenue platform insight launch quarter strategy market partner "
+    "product value results data automation workflow outreach meeting research trend report analysis"
+).split()
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Sampler (seconds) for a latency spec: fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: random.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+@dataclass
+class Profile:
+    """Behaviour of one upstream."""
+    latency: str = "fixed:0"
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+
+    def __post_init__(self):
+        self.sample = parse_latency(self.latency)
+
+    def outcome(self) -> int:
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return 200
+
+
+# --- Generated content ---
+
+def message_text(message: Dict[str, Any]) -> str:
+    """Text of a chat message; content may be a string or a list of parts."""
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def words(count: int) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(count)).capitalize() + "."
+
+
+def from_schema(schema: Dict[str, Any], defs: Dict[str, Any], name: str = "", items: int = 3) -> Any:
+    """Minimal instance of a JSON schema (resolving $ref/anyOf) with filler values."""
+    if "$ref" in schema:
+        return from_schema(defs[schema["$ref"].rsplit("/", 1)[-1]], defs, name, items)
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            options = [s for s in schema[key] if s.get("type") != "null"] or schema[key]
+            return from_schema(options[0], defs, name, items)
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    kind = schema.get("type", "object" if "properties" in schema else "string")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind == "object":
+        return {key: from_schema(sub, defs, key, items) for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        count = max(schema.get("minItems", 0), min(items, schema.get("maxItems", items)))
+        return [from_schema(schema.get("items", {}), defs, name, items) for _ in range(count)]
+    if kind == "integer":
+        return int(schema.get("minimum", 1))
+    if kind == "number":
+        return float(schema.get("minimum", 0.5))
+    if kind == "boolean":
+        return True
+    if kind == "null":
+        return None
+    if "email" in name.lower():
+        return "prospect@example.com"
+    if "url" in name.lower() or "link" in name.lower():
+        return f"https://example.com/{uuid.uuid4().hex[:8]}"
+    return words(8)
+
+
+def schema_instance(schema: Dict[str, Any], items: int) -> Any:
+    return from_schema(schema, {**schema.get("definitions", {}), **schema.get("$defs", {})}, items=items)
+
+
+class FakeLLM:
+    """Decides what a chat completion request gets back."""
+
+    def __init__(self, answer_words: int = 120, list_items: int = 3):
+        self.answer_words = answer_words
+        self.list_items = list_items
+
+    def reply(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """{"content": str | None, "tool_calls": [...]} for one request."""
+        messages = body.get("messages", [])
+        prompt = "\n".join(message_text(m) for m in messages)
+        tools = body.get("tools") or []
+        tool_choice = body.get("tool_choice")
+        used_tool = any(m.get("role") == "tool" for m in messages)
+        # CrewAI appends its Action and the tool's Observation as an assistant turn
+        acted = any(m.get("role") == "assistant" for m in messages)
+
+        # 1. A forced function call (e.g. structured output via tools)
+        if isinstance(tool_choice, dict) and tool_choice.get("function"):
+            name = tool_choice["function"]["name"]
+            tool = next((t for t in tools if t["function"]["name"] == name), {"function": {"parameters": {}}})
+            return self._tool_call(name, tool["function"].get("parameters", {}))
+
+        # 2. Native tools: call the first one once, then answer
+        if tools and not used_tool and tool_choice != "none":
+            function = tools[0]["function"]
+            return self._tool_call(function["name"], function.get("parameters", {}))
+
+        # 3. CrewAI ReAct prompt: one Action, then the Final Answer
+        if "Final Answer:" in prompt:
+            names = re.search(r"only one name of \[(.*?)\]", prompt)
+            if names and not acted:
+                tool = names.group(1).split(",")[0].strip()
+                return {"content": f'Thought: I should search first\nAction: {tool}\nAction Input: {{"query": "{words(4)}"}}'}
+            return {"content": f"Thought: I now can give a great answer\nFinal Answer: {self._answer(body)}"}
+
+        return {"content": self._answer(body)}
+
+    def _answer(self, body: Dict[str, Any]) -> str:
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            return json.dumps(schema_instance(response_format["json_schema"].get("schema", {}), self.list_items))
+        if response_format.get("type") == "json_object":
+            return json.dumps({"result": words(12)})
+        paragraphs = [words(max(1, self.answer_words // 3)) for _ in range(3)]
+        return "\n\n".join(paragraphs)
+
+    def _tool_call(self, name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        arguments = json.dumps(schema_instance(parameters, self.list_items) if parameters else {})
+        return {"content": None, "tool_calls": [{
+            "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+            "function": {"name": name, "arguments": arguments},
+        }]}
+
+
+# Prompt prefixes seen so far (provider-side prompt cache)
+_prefixes: set = set()
+
+
+def cached_prefix(messages: List[Dict[str, Any]]) -> int:
+    """Characters of the prompt a provider would serve from its cache."""
+    marked = [i for i, m in enumerate(messages)
+              if isinstance(m.get("content"), list) and any("cache_control" in part for part in m["content"])]
+    end = marked[-1] + 1 if marked else (1 if messages and messages[0].get("role") == "system" else 0)
+    if not end:
+        return 0
+    prefix = json.dumps([message_text(m) for m in messages[:end]])
+    if prefix in _prefixes:
+        return sum(len(message_text(m)) for m in messages[:end])
+    _prefixes.add(prefix)
+    return 0
+
+
+def usage(body: Dict[str, Any], reply: Dict[str, Any]) -> Dict[str, Any]:
+    # ~4 characters per token is close enough for cost reports
+    messages = body.get("messages", [])
+    prompt = sum(len(message_text(m)) for m in messages) // 4 + 1
+    completion = len(json.dumps(reply)) // 4 + 1
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion,
+            "prompt_tokens_details": {"cached_tokens": cached_prefix(messages) // 4}}
+
+
+def completion_json(body: Dict[str, Any], reply: Dict[str, Any]) -> Dict[str, Any]:
+    message = {"role": "assistant", "content": reply["content"]}
+    if reply.get("tool_calls"):
+        message["tool_calls"] = reply["tool_calls"]
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:16]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "message": message,
+                     "finish_reason": "tool_calls" if reply.get("tool_calls") else "stop"}],
+        "usage": usage(body, reply),
+    }
+
+
+async def completion_chunks(body: Dict[str, Any], reply: Dict[str, Any], token_delay: float):
+    """The same reply as OpenAI-style SSE chunks."""
+    base = {"id": f"chatcmpl-{uuid.uuid4().hex[:16]}", "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": body.get("model", "fake")}
+
+    def chunk(delta: Dict[str, Any], finish: Optional[str] = None, **extra) -> str:
+        return "data: " + json.dumps({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}], **extra}) + "\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+    if reply.get("tool_calls"):
+        for i, call in enumerate(reply["tool_calls"]):
+            yield chunk({"tool_calls": [{"index": i, **call}]})
+    else:
+        for piece in re.findall(r"\S+\s*", reply["content"]):
+            yield chunk({"content": piece})
+            await asyncio.sleep(token_delay)
+    yield chunk({}, "tool_calls" if reply.get("tool_calls") else "stop")
+    if (body.get("stream_options") or {}).get("include_usage"):
+        yield "data: " + json.dumps({**base, "choices": [], "usage": usage(body, reply)}) + "\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def create_app(llm: Profile, search: Profile, email: Profile, llm_rpm: int = 0,
+               answer_words: int = 120, list_items: int = 3, token_delay: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake upstreams")
+    fake_llm = FakeLLM(answer_words, list_items)
+    stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    window = {"start": time.monotonic(), "count": 0}
+
+    async def gate(service: str, profile: Profile) -> Optional[JSONResponse]:
+        """Apply the profile: sleep, then maybe fail. Returns the failure response, if any."""
+        await asyncio.sleep(max(0.0, profile.sample()))
+        status = profile.outcome()
+        stats[service][str(status)] += 1
+        if status == 429:
+            return JSONResponse({"error": {"message": "Rate limit exceeded (fake)"}}, status_code=429,
+                                headers={"retry-after": str(profile.retry_after)})
+        if status == 500:
+            return JSONResponse({"error": {"message": "Internal error (fake)"}}, status_code=500)
+        return None
+
+    def rate_headers() -> Dict[str, str]:
+        # Advertise a provider budget so the LLM scheduler re-tunes its buckets
+        if not llm_rpm:
+            return {}
+        now = time.monotonic()
+        if now - window["start"] >= 60:
+            window.update(start=now, count=0)
+        window["count"] += 1
+        return {
+            "x-ratelimit-limit-requests": str(llm_rpm),
+            "x-ratelimit-remaining-requests": str(max(0, llm_rpm - window["count"])),
+            "x-ratelimit-reset-requests": f"{60 - (now - window['start']):.1f}s",
+        }
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if failure := await gate("llm", llm):
+            return failure
+        reply = fake_llm.reply(body)
+        if body.get("stream"):
+            return StreamingResponse(completion_chunks(body, reply, token_delay),
+                                     media_type="text/event-stream", headers=rate_headers())
+        return JSONResponse(completion_json(body, reply), headers=rate_headers())
+
+    @app.post("/tavily/search")
+    async def tavily_search(request: Request):
+        body = await request.json()
+        if failure := await gate("search", search):
+            return failure
+        count = int(body.get("max_results", 5))
+        return {
+            "query": body.get("query", ""),
+            "results": [
+                {
+                    "title": words(6),
+                    "url": f"https://example.com/{uuid.uuid4().hex[:10]}",
+                    "content": words(80),
+                    "score": round(random.random(), 3),
+                }
+                for _ in range(count)
+            ],
+            "response_time": 0.0,
+        }
+
+    @app.post("/resend/emails")
+    async def resend_email(request: Request):
+        await request.body()
+        if failure := await gate("email", email):
+            return failure
+        return {"id": str(uuid.uuid4())}
+
+    @app.post("/resend/emails/batch")
+    async def resend_batch(request: Request):
+        emails = await request.json()
+        if failure := await gate("email", email):
+            return failure
+        return {"data": [{"id": str(uuid.uuid4())} for _ in emails]}
+
+    @app.get("/_stats")
+    async def upstream_stats():
+        return stats
+
+    return app
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """--{llm,search,email}-{latency,errors,429} options shared with the load harness."""
+    defaults = {"llm": "lognormal:0.8,0.5", "search": "lognormal:0.4,0.3", "email": "fixed:0.1"}
+    for service, latency in defaults.items():
+        parser.add_argument(f"--{service}-latency", default=latency, help=f"{service} latency spec (default: {latency})")
+        parser.add_argument(f"--{service}-errors", type=float, default=0.0, help=f"share of {service} calls answered 500")
+        parser.add_argument(f"--{service}-429", type=float, default=0.0, help=f"share of {service} calls answered 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--llm-rpm", type=int, default=0, help="requests/minute advertised in x-ratelimit headers (0: none)")
+    parser.add_argument("--answer-words", type=int, default=120, help="words in free-text LLM answers")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+
+
+def upstream_argv(args: argparse.Namespace) -> List[str]:
+    """The options from add_profile_arguments as command-line flags (to start this server)."""
+    argv = []
+    for service in ("llm", "search", "email"):
+        for option, attr in (("latency", "latency"), ("errors", "errors"), ("429", "429")):
+            argv += [f"--{service}-{option}", str(getattr(args, f"{service}_{attr}"))]
+    for option in ("retry_after", "llm_rpm", "answer_words", "token_delay"):
+        argv += ["--" + option.replace("_", "-"), str(getattr(args, option))]
+    return argv
+
+
+def profiles(args: argparse.Namespace) -> Dict[str, Profile]:
+    return {
+        service: Profile(getattr(args, f"{service}_latency"), getattr(args, f"{service}_errors"),
+                         getattr(args, f"{service}_429"), args.retry_after)
+        for service in ("llm", "search", "email")
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    app = create_app(**profiles(args), llm_rpm=args.llm_rpm, answer_words=args.answer_words, token_delay=args.token_delay)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+"""
+Load test and latency benchmark of the API against local fake upstreams.
+
+Starts two processes:
+    1. fake_upstream.py - OpenAI-compatible LLM, Tavily and Resend stand-ins
+       with configurable latency, 500 and 429 distributions
+    2. the API (uvicorn, this module with --serve-api) pointed at them, with
+       .env loading disabled, throwaway SQLite files, the IP rate limits
+       lifted (--keep-rate-limits to measure them too) and an event-loop
+       probe that records how late the loop wakes up
+
+then drives concurrent load against a weighted mix of all endpoints
+(sync, SSE stream, batch, background job, send/outbox and GET routes) and
+reports:
+    - throughput and p50/p95/p99 latency per endpoint (plus first event
+      for SSE streams), errors by kind
+    - p50/p95/p99 per flow stage, from the API's "[timing]" run summaries
+    - event-loop lag and total blocked time (with LOOP_MONITOR=1 in the
+      environment, also the functions that blocked it)
+    - calls and injected failures per upstream
+
+Throttles inside the API (LLM_DEFAULT_RPM, OUTBOX_DOMAIN_RPM) default to
+high values so the fakes' profiles decide the pacing; set them in the
+environment, or advertise a provider budget with --llm-rpm, to include them.
+
+Usage:
+    python -m backend.benchmarks.load --duration 60 --concurrency 8
+    python -m backend.benchmarks.load --mix sales=3,sales_stream=1 --llm-429 0.1 --json results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from backend.benchmarks.fake_upstream import add_profile_arguments, upstream_argv
+from backend.benchmarks.startup import free_port
+
+PIN = "benchmark"
+ROOT = Path(__file__).resolve().parents[2]
+JOB_POLL_INTERVAL = 0.25
+
+DEFAULT_MIX = {
+    "health": 4, "metrics": 1, "cache_stats": 1, "job_metrics": 1, "outbox_metrics": 1,
+    "sales": 3, "sales_stream": 2, "sales_batch": 1, "sales_job": 1,
+    "send": 2, "send_batch": 1,
+    "research": 1, "research_stream": 1, "research_job": 1,
+    "meeting_prep": 1, "meeting_prep_stream": 1, "meeting_prep_job": 1,
+}
+
+
+# --- Event-loop probe (runs inside the API process) ---
+
+class LoopProbe:
+    """Measures how late the event loop wakes up from short sleeps."""
+
+    def __init__(self, interval: float = 0.01, threshold: float = 0.005):
+        self.interval = interval
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self.lags: deque = deque(maxlen=100_000)
+        self.blocked = 0.0
+        self.events = 0
+
+    async def run(self):
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - before - self.interval)
+            self.lags.append(lag)
+            if lag > self.threshold:
+                self.blocked += lag
+                self.events += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        lags = sorted(self.lags)
+        return {
+            "window_s": round(time.perf_counter() - self.started, 3),
+            "samples": len(lags),
+            "lag_p50_ms": round(percentile(lags, 50) * 1000, 2),
+            "lag_p99_ms": round(percentile(lags, 99) * 1000, 2),
+            "lag_max_ms": round((lags[-1] if lags else 0.0) * 1000, 2),
+            "blocked_s": round(self.blocked, 3),
+            "blocking_events": self.events,
+            "threshold_ms": self.threshold * 1000,
+        }
+
+
+def serve_api(port: int, keep_rate_limits: bool):
+    """Entry point of the API process: the real app plus the loop probe."""
+    import uvicorn
+    from backend.app.api import app
+    from backend.app.middleware.rate_limiter import rate_limiter
+
+    if not keep_rate_limits:
+        for limits in rate_limiter.limits.values():
+            for name in limits:
+                limits[name] = 10 ** 9
+
+    probe = LoopProbe()
+
+    async def start_probe():
+        app.state.loop_probe = asyncio.create_task(probe.run())
+
+    async def loop_stats(reset: bool = False):
+        from backend.app.core.loop_monitor import loop_monitor
+
+        stats = probe.snapshot()
+        if loop_monitor.enabled:
+            stats["offenders"] = loop_monitor.snapshot()["offenders"]
+        if reset:
+            probe.reset()
+            loop_monitor.reset()
+        return stats
+
+    app.on_event("startup")(start_probe)
+    app.add_api_route("/_bench/loop", loop_stats, methods=["GET"])
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+# --- Requests ---
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class RequestFailed(Exception):
+    pass
+
+
+def prospect(n: int) -> Dict[str, str]:
+    # Spread recipients over a few domains, like a real send queue
+    return {
+        "contact_name": f"Alex {n}",
+        "company_name": f"Company {n}",
+        "prospect_email": f"lead{n}@example{n % 4}.com",
+        "sender_name": "Sami",
+        "product_description": "AI-assisted sales research",
+    }
+
+
+def topic(n: int) -> str:
+    # Unique per request so the report and search caches never answer
+    return f"Benchmark topic {n} {uuid.uuid4().hex[:6]}"
+
+
+def check(response: httpx.Response):
+    if response.status_code >= 400:
+        raise RequestFailed(f"HTTP {response.status_code}")
+
+
+class LoadRunner:
+    """Issues benchmark requests and records their latencies."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.counter = 0
+        self.recording = True
+        self.endpoints: Dict[str, Callable[[int], Awaitable[None]]] = {
+            "health": lambda n: self.get("/health"),
+            "metrics": lambda n: self.get("/metrics"),
+            "cache_stats": lambda n: self.get("/api/cache/stats"),
+            "job_metrics": lambda n: self.get("/api/jobs/metrics"),
+            "outbox_metrics": lambda n: self.get("/api/outbox/metrics"),
+            "sales": lambda n: self.post("/api/sales/draft", prospect(n)),
+            "sales_stream": lambda n: self.stream("sales_stream", "/api/sales/draft/stream", prospect(n)),
+            "sales_batch": lambda n: self.batch([prospect(n * 100 + i) for i in range(3)]),
+            "sales_job": lambda n: self.job("/api/sales/draft/jobs", prospect(n)),
+            "send": lambda n: self.post("/api/sales/send", self.email(n)),
+            "send_batch": lambda n: self.post("/api/sales/send/batch",
+                                              {"messages": [self.email(n * 100 + i) for i in range(5)]}),
+            "research": lambda n: self.post("/api/research", {"topic": topic(n)}),
+            "research_stream": lambda n: self.stream("research_stream", "/api/research/stream", {"topic": topic(n)}),
+            "research_job": lambda n: self.job("/api/research/jobs", {"topic": topic(n)}),
+            "meeting_prep": lambda n: self.post("/api/meeting-prep", {"topic": topic(n)}),
+            "meeting_prep_stream": lambda n: self.stream("meeting_prep_stream", "/api/meeting-prep/stream",
+                                                         {"topic": topic(n)}),
+            "meeting_prep_job": lambda n: self.job("/api/meeting-prep/jobs", {"topic": topic(n)}),
+        }
+
+    @staticmethod
+    def email(n: int) -> Dict[str, str]:
+        return {"to_email": f"lead{n}@example{n % 4}.com", "subject": f"Benchmark {n}",
+                "html_body": "<p>Hello from the benchmark</p>", "idempotency_key": uuid.uuid4().hex}
+
+    async def get(self, path: str):
+        check(await self.client.get(path))
+
+    async def post(self, path: str, body: Dict[str, Any]):
+        check(await self.client.post(path, json=body))
+
+    async def stream(self, name: str, path: str, body: Dict[str, Any]):
+        started = time.perf_counter()
+        last_event = None
+        async with self.client.stream("POST", path, json=body) as response:
+            check(response)
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    if last_event is None and self.recording:
+                        self.latencies[f"{name} (first event)"].append(time.perf_counter() - started)
+                    last_event = line[len("event: "):]
+        if last_event != "result":
+            raise RequestFailed(f"stream ended with {last_event}")
+
+    async def batch(self, prospects: List[Dict[str, str]]):
+        async with self.client.stream("POST", "/api/sales/draft/batch", json=prospects) as response:
+            check(response)
+            lines = [json.loads(line) async for line in response.aiter_lines() if line.strip()]
+        summary = lines[-1].get("summary", {}) if lines else {}
+        if summary.get("failed", 1):
+            raise RequestFailed(f"{summary.get('failed', '?')} batch items failed")
+
+    async def job(self, path: str, body: Dict[str, Any]):
+        response = await self.client.post(path, json=body)
+        check(response)
+        job_id = response.json()["job_id"]
+        while True:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            status = await self.client.get(f"/api/jobs/{job_id}")
+            check(status)
+            state = status.json()["status"]
+            if state == "succeeded":
+                return
+            if state == "failed":
+                raise RequestFailed("job failed")
+
+    async def call(self, name: str) -> bool:
+        self.counter += 1
+        started = time.perf_counter()
+        try:
+            await self.endpoints[name](self.counter)
+        except Exception as e:
+            if self.recording:
+                kind = str(e) if isinstance(e, RequestFailed) else type(e).__name__
+                self.errors[name][kind] += 1
+            return False
+        if self.recording:
+            self.latencies[name].append(time.perf_counter() - started)
+        return True
+
+    async def worker(self, mix: Dict[str, int], deadline: float):
+        names, weights = list(mix), list(mix.values())
+        while time.perf_counter() < deadline:
+            await self.call(random.choices(names, weights)[0])
+
+
+# --- Processes ---
+
+class TimingCollector:
+    """Reads the API's stdout, keeping "[timing]" run summaries and logging the rest."""
+
+    def __init__(self, stream, log_path: Path):
+        self.runs: List[Dict[str, Any]] = []
+        self.recording = False
+        self._thread = threading.Thread(target=self._read, args=(stream, log_path), daemon=True)
+        self._thread.start()
+
+    def _read(self, stream, log_path: Path):
+        with open(log_path, "w", encoding="utf-8") as log:
+            for line in stream:
+                log.write(line)
+                if self.recording and line.startswith("[timing] "):
+                    try:
+                        self.runs.append(json.loads(line[len("[timing] "):]))
+                    except ValueError:
+                        pass
+
+    def stages(self) -> Dict[str, List[float]]:
+        samples: Dict[str, List[float]] = defaultdict(list)
+        for run in self.runs:
+            samples[f"{run['flow']} / total"].append(run["total_s"])
+            for stage in run["stages"]:
+                samples[f"{run['flow']} / {stage['stage']}"].append(stage["seconds"])
+        return samples
+
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float = 120):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def api_environment(upstream: str, workdir: Path) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        # Never pick up real keys or endpoints from .env
+        "PYTHON_DOTENV_DISABLED": "1",
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")])),
+        "PYTHONUNBUFFERED": "1",
+        "OPENAI_BASE_URL": f"{upstream}/v1",
+        "OPENROUTER_API_KEY": "benchmark",
+        "OPENAI_API_KEY": "benchmark",
+        "TAVILY_BASE_URL": f"{upstream}/tavily",
+        "TAVILY_API_KEY": "benchmark",
+        "RESEND_BASE_URL": f"{upstream}/resend",
+        "RESEND_API_KEY": "benchmark",
+        "APP_PIN": PIN,
+        "JOB_DB_PATH": str(workdir / "jobs.db"),
+        "OUTBOX_DB_PATH": str(workdir / "outbox.db"),
+        "SEARCH_CACHE_DB": "",
+        "REPORT_CACHE_DB": "",
+    })
+    env.pop("RATE_LIMIT_REDIS_URL", None)
+    # LiteLLM would otherwise download its model price map on import
+    env.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+    env.setdefault("LLM_DEFAULT_RPM", "100000")
+    env.setdefault("OUTBOX_DOMAIN_RPM", "100000")
+    return env
+
+
+# --- Report ---
+
+def latency_table(title: str, samples: Dict[str, List[float]], errors: Optional[Dict[str, Dict[str, int]]] = None,
+                  duration: Optional[float] = None) -> List[Dict[str, Any]]:
+    rows = []
+    for name in sorted(set(samples) | set(errors or {})):
+        values = sorted(samples.get(name, []))
+        row = {
+            "name": name,
+            "count": len(values),
+            "errors": sum((errors or {}).get(name, {}).values()),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "max_ms": round((values[-1] if values else 0.0) * 1000, 1),
+        }
+        if duration:
+            row["rps"] = round(len(values) / duration, 2)
+        rows.append(row)
+
+    print(f"\n{title}")
+    header = f"{'':<34}{'count':>7}{'err':>6}" + (f"{'req/s':>8}" if duration else "")
+    print(header + f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for row in rows:
+        line = f"{row['name'][:33]:<34}{row['count']:>7}{row['errors']:>6}" + (f"{row['rps']:>8}" if duration else "")
+        print(line + f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+    return rows
+
+
+def report(runner: LoadRunner, stages: Dict[str, List[float]], loop: Dict[str, Any],
+           upstream: Dict[str, Any], duration: float, concurrency: int) -> Dict[str, Any]:
+    completed = sum(len(v) for k, v in runner.latencies.items() if not k.endswith("(first event)"))
+    failed = sum(sum(kinds.values()) for kinds in runner.errors.values())
+    print(f"\n{completed} requests ok, {failed} failed in {duration:.1f}s with {concurrency} clients "
+          f"({completed / duration:.2f} req/s)")
+
+    endpoints = latency_table("Endpoints", runner.latencies, runner.errors, duration)
+    stage_rows = latency_table("Flow stages (from [timing] run summaries)", stages)
+
+    print("\nEvent loop")
+    print(f"  lag p50 {loop['lag_p50_ms']} ms   p99 {loop['lag_p99_ms']} ms   max {loop['lag_max_ms']} ms")
+    print(f"  blocked {loop['blocked_s']}s of {loop['window_s']}s "
+          f"({loop['blocking_events']} stalls over {loop['threshold_ms']:.0f} ms)")
+    for offender in loop.get("offenders", [])[:10]:
+        print(f"  {offender['blocked_s']:>7.3f}s {offender['stalls']:>5}x  {offender['function']}")
+
+    print("\nUpstream calls by status")
+    for service, statuses in sorted(upstream.items()):
+        print(f"  {service:<8}" + "  ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+
+    if runner.errors:
+        print("\nErrors")
+        for name, kinds in sorted(runner.errors.items()):
+            for kind, count in sorted(kinds.items()):
+                print(f"  {name:<24}{count:>5}  {kind}")
+
+    return {
+        "duration_s": round(duration, 3),
+        "concurrency": concurrency,
+        "throughput_rps": round(completed / duration, 3),
+        "endpoints": endpoints,
+        "stages": stage_rows,
+        "event_loop": loop,
+        "upstream": upstream,
+        "errors": {name: dict(kinds) for name, kinds in runner.errors.items()},
+    }
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r} (choose from {', '.join(DEFAULT_MIX)})")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+async def run_load(args: argparse.Namespace, api: str, collector: TimingCollector) -> Dict[str, Any]:
+    mix = args.mix or DEFAULT_MIX
+    timeout = httpx.Timeout(args.request_timeout)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=api, headers={"X-API-PIN": PIN}, timeout=timeout, limits=limits) as client:
+        runner = LoadRunner(client)
+
+        # 1. Warm-up: one request per endpoint loads the flows and catches setup errors early
+        if not args.no_warmup:
+            print("Warm-up: one request per endpoint...")
+            runner.recording = False
+            results = await asyncio.gather(*[runner.call(name) for name in mix])
+            runner.recording = True
+            if broken := [name for name, ok in zip(mix, results) if not ok]:
+                print(f"  warning: failed during warm-up: {', '.join(broken)} (see {args.api_log})")
+
+        # 2. Measured window
+        await client.get("/_bench/loop", params={"reset": True})
+        collector.recording = True
+        print(f"Running {args.concurrency} clients for {args.duration}s...")
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*[runner.worker(mix, deadline) for _ in range(args.concurrency)])
+        duration = time.perf_counter() - started
+        loop = (await client.get("/_bench/loop")).json()
+        collector.recording = False
+
+        upstream = (await client.get(f"{args.upstream_url}/_stats")).json()
+        return report(runner, collector.stages(), loop, upstream, duration, args.concurrency)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds (default: 30)")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent clients (default: 4)")
+    parser.add_argument("--mix", type=parse_mix, help="weighted endpoints, e.g. sales=3,research=1 (default: all)")
+    parser.add_argument("--request-timeout", type=float, default=300)
+    parser.add_argument("--keep-rate-limits", action="store_true", help="keep the API's per-IP rate limits")
+    parser.add_argument("--no-warmup", action="store_true")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--api-log", help="API process output (default: in the temporary work dir)")
+    parser.add_argument("--serve-api", type=int, help=argparse.SUPPRESS)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.serve_api:
+        return serve_api(args.serve_api, args.keep_rate_limits)
+
+    with tempfile.TemporaryDirectory(prefix="agentsquad-bench-") as tmp:
+        workdir = Path(tmp)
+        args.api_log = args.api_log or str(workdir / "api.log")
+        upstream_port, api_port = free_port(), free_port()
+        args.upstream_url = f"http://127.0.0.1:{upstream_port}"
+        api_url = f"http://127.0.0.1:{api_port}"
+
+        upstream = subprocess.Popen(
+            [sys.executable, "-m", "backend.benchmarks.fake_upstream", "--port", str(upstream_port), *upstream_argv(args)],
+            cwd=ROOT,
+        )
+        api_argv = [sys.executable, "-m", "backend.benchmarks.load", "--serve-api", str(api_port)]
+        if args.keep_rate_limits:
+            api_argv.append("--keep-rate-limits")
+        # No stdin, as under a process manager (CrewAI would otherwise wait on an interactive prompt)
+        api = subprocess.Popen(api_argv, cwd=workdir, env=api_environment(args.upstream_url, workdir),
+                               stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        collector = TimingCollector(api.stdout, Path(args.api_log))
+        try:
+            wait_for(f"{args.upstream_url}/_stats", upstream)
+            wait_for(f"{api_url}/health", api)
+            results = asyncio.run(run_load(args, api_url, collector))
+        finally:
+            for process in (api, upstream):
+                process.terminate()
+                process.wait()
+
+        if args.json:
+            Path(args.json).write_text(json.dumps(results, indent=2))
+            print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
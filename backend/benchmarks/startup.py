@@ -0,0 +1,104 @@
+"""
+API cold start: time-to-first-/health and import cost per module.
+
+Default mode starts `uvicorn backend.app.api:app` on a free port, polls
+/health until it answers 200 and reports the time from process spawn,
+over several runs. Set WARM_FLOWS in the environment to see that
+background warm-up does not delay the first /health.
+
+--imports runs `python -X importtime -c "import backend.app.api"` and
+reports the most expensive modules and the cumulative cost per top-level
+package, so new heavy imports on the startup path show up immediately.
+
+Usage:
+    python -m backend.benchmarks.startup [runs]
+    python -m backend.benchmarks.startup --imports [top]
+"""
+
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+HEALTH_TIMEOUT = 60
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_health(env: dict) -> float:
+    """Seconds from spawning uvicorn until /health returns 200."""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.api:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        while time.perf_counter() - started < HEALTH_TIMEOUT:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited:\n{server.stderr.read().decode()}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError(f"/health not ready after {HEALTH_TIMEOUT}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def health_benchmark(runs: int = 5):
+    env = dict(os.environ)
+    samples = [time_to_health(env) * 1000 for _ in range(runs)]
+    print(f"WARM_FLOWS={env.get('WARM_FLOWS', '') or '(none)'}")
+    print(f"Time to first /health over {runs} runs:")
+    print(f"  min {min(samples):.0f} ms   median {statistics.median(samples):.0f} ms   max {max(samples):.0f} ms")
+
+
+def import_profile(top: int = 25):
+    # 1. Let the interpreter time every import of the API module
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.app.api"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+    # 2. Parse "import time: self [us] | cumulative | imported package"
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    # 3. Self time summed per top-level package
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split(".")[0]] += self_us
+    total = next(cumulative for name, _, cumulative in modules if name == "backend.app.api")
+
+    print(f"Importing backend.app.api took {total / 1000:.0f} ms ({len(modules)} modules)\n")
+    print(f"{'package':<32}{'ms':>10}")
+    for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"{name:<32}{us / 1000:>10.1f}")
+    print(f"\n{'module (cumulative)':<48}{'ms':>10}")
+    for name, _, cumulative in sorted(modules, key=lambda m: -m[2])[:top]:
+        print(f"{name:<48}{cumulative / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--imports":
+        import_profile(int(sys.argv[2]) if len(sys.argv) > 2 else 25)
+    else:
+        health_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5)